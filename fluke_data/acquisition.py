@@ -0,0 +1,435 @@
+# fluke_data/acquisition.py
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .compression import MeasureAggregator, MeasureCompressor
+from .fanout import LiveReading, get_live_fanout, instrument_group, named_group, sensor_group
+from .instrument_executor import get_instrument_executor
+from .latest_values import get_latest_value_store
+from .measurement_writer import get_measurement_writer
+from .models import MeasuresModel, SensorModel, ThermohygrometerModel
+from .visa_communication import AsyncInstrument, Instrument
+
+
+class InstrumentAcquisition:
+    """
+    Owns the connection to a single thermohygrometer and polls it on behalf of
+    every consumer subscribed to it.
+
+    Readings are broadcast through the LiveFanout to the instrument group
+    (DataConsumer), to the per-sensor listener groups and to the general
+    listener group, so the query rate of the device does not depend on how
+    many viewers are connected.
+    """
+
+    POLL_INTERVAL = 5  # seconds between two reads of the instrument
+    MAX_READ_FAILURES = 3  # reads in a row without data after which the link is considered lost
+
+    def __init__(self, thermohygrometer_id):
+        self.thermohygrometer_id = thermohygrometer_id
+        self.thermo = None
+        self.instrument = None
+        self.sensors = []
+        self.subscribers = 0
+        self.running = False
+        self.task = None
+        self.group_name = None
+        self.last_saved_time = {}  # Track last saved time for each sensor
+        self.compressors = {}  # MeasureCompressor of each sensor with a compression storage mode
+        self.aggregators = {}  # MeasureAggregator of each sensor with the interval aggregate storage mode
+        self.thermo_info = {}  # Static thermo_info block of each sensor, built once per session
+        self.read_failures = 0  # Reads in a row that returned no data
+        self.sensors_changed = False  # Set by AcquisitionManager.reload_sensors
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """Connects to the instrument and starts the polling task if not running yet."""
+        async with self._lock:
+            if self.running:
+                return True
+            try:
+                self.thermo = await sync_to_async(ThermohygrometerModel.objects.get)(id=self.thermohygrometer_id)
+                self.instrument = await self.open_instrument()
+                if self.instrument and self.instrument.instrument and not self.instrument.fast_reconnected:
+                    await sync_to_async(self.save_identity)()
+                self.sensors = await sync_to_async(list)(
+                    SensorModel.objects.filter(instrument=self.thermo).select_related('calibration_certificate')
+                )
+                self.thermo_info = {}
+                self.read_failures = 0
+            except Exception as e:
+                print(f"acquisition.start: Error connecting to thermohygrometer {self.thermohygrometer_id}: {str(e)}")
+                self.instrument = None
+
+            if not self.instrument or not self.instrument.instrument:
+                await sync_to_async(self.update_connection_status)(False)
+                return False
+
+            self.group_name = f"thermohygrometer_{self.instrument.GROUP_NAME}"
+            self.running = True
+            await sync_to_async(self.update_connection_status)(True)
+            self.task = asyncio.create_task(self.acquisition_loop())
+            return True
+
+    async def stop(self):
+        """Stops the polling task and releases the instrument connection."""
+        async with self._lock:
+            self.running = False
+            if self.task:
+                self.task.cancel()
+                self.task = None
+            if self.instrument and hasattr(self.instrument, 'disconnect'):
+                if self.is_async_transport:
+                    await self.instrument.disconnect()
+                else:
+                    await get_instrument_executor().run(self.thermohygrometer_id, self.instrument.disconnect)
+                get_instrument_executor().forget(self.thermohygrometer_id)
+            self.instrument = None
+            await sync_to_async(self.update_connection_status)(False)
+            # The last reading of each compressed trend closes it
+            for sensor in self.sensors:
+                compressor = self.compressors.pop(sensor.id, None)
+                for reading in compressor.flush() if compressor else []:
+                    self.save_data_to_db(reading, sensor)
+                # A partial interval is still summarized
+                aggregator = self.aggregators.pop(sensor.id, None)
+                summary = aggregator.flush() if aggregator else None
+                if summary:
+                    self.save_summary_to_db(summary, sensor)
+                # Only sensors being acquired have a current value
+                get_latest_value_store().discard(sensor.id)
+        await get_measurement_writer().flush()
+
+    async def acquisition_loop(self):
+        while self.running:
+            try:
+                if not self.sensors or self.sensors_changed:
+                    # Try to fetch sensors again if list is empty or they were edited
+                    self.sensors_changed = False
+                    self.sensors = await sync_to_async(list)(
+                        SensorModel.objects.filter(instrument=self.thermo).select_related('calibration_certificate')
+                    )
+                    self.thermo_info = {}
+                    if not self.sensors:
+                        raise Exception("No sensors found for this thermohygrometer")
+
+                # Get data from all channels
+                try:
+                    data_all_channels = await self.read_all_channels()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"acquisition.acquisition_loop: Error reading thermohygrometer {self.thermohygrometer_id}: {str(e)}")
+                    data_all_channels = None
+                if not data_all_channels:
+                    # An empty read also follows a clock adjustment, only a run of them means the link is down
+                    self.read_failures += 1
+                    if self.read_failures >= self.MAX_READ_FAILURES:
+                        await self.link_lost()
+                        return
+                else:
+                    self.read_failures = 0
+                    # Process and broadcast data for each sensor/channel
+                    for sensor in self.sensors:
+                        channel = sensor.channel
+                        if channel in data_all_channels:
+                            channel_data = dict(data_all_channels[channel])
+                            processed_data = await sync_to_async(self.process_measurement_data_from_instrument)(
+                                channel_data, sensor
+                            )
+                            get_latest_value_store().update(
+                                self.thermo.id, processed_data, self.get_thermo_info(sensor)
+                            )
+                            await self.broadcast_data(processed_data, sensor)
+                            await self.check_and_save_data(processed_data, sensor)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self.broadcast_error(f'acquisition.acquisition_loop: {str(e)}')
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def link_lost(self):
+        """
+        Stops the acquisition after MAX_READ_FAILURES reads without data, so the
+        connection is opened again (with the memory backfill) by the next
+        subscriber or by InstrumentConnectionManager.
+        """
+        print(f"acquisition.link_lost: Lost the connection to thermohygrometer {self.thermohygrometer_id} "
+              f"after {self.read_failures} reads without data")
+        await self.broadcast_error('acquisition.link_lost: Connection to the instrument lost')
+        # Called from the polling task itself, which stop() must not cancel
+        self.task = None
+        await self.stop()
+        # Imported here, connection_manager depends on this module
+        from .connection_manager import InstrumentConnectionManager
+        await InstrumentConnectionManager.release(self.thermohygrometer_id)
+
+    @property
+    def is_async_transport(self):
+        return isinstance(self.instrument, AsyncInstrument)
+
+    async def open_instrument(self):
+        ip_address = self.thermo.ip_address
+        identity = self.cached_identity()
+        if getattr(settings, 'THERMOHYGROMETER_TRANSPORT', 'visa') == 'asyncio':
+            return await AsyncInstrument.open(ip_address, identity=identity)
+        # Blocking pyvisa calls run on the instrument I/O executor, never on the ORM thread
+        return await get_instrument_executor().run(self.thermohygrometer_id, Instrument, ip_address, identity=identity)
+
+    def cached_identity(self):
+        """Identity saved on the last full handshake, or None if it is incomplete."""
+        if not (self.thermo.pn and self.thermo.sn and self.thermo.instrument_name) or self.thermo.timestamp_format_enabled is None:
+            return None
+        return {
+            'pn': self.thermo.pn,
+            'sn': self.thermo.sn,
+            'instrument_name': self.thermo.instrument_name,
+            'format_data': self.thermo.timestamp_format_enabled,
+        }
+
+    def save_identity(self):
+        """
+        Stores what the full handshake learned so the next connection can skip it.
+        group_name is left alone, it is the group configured by the user.
+        """
+        identity = {
+            'pn': self.instrument.PN,
+            'sn': self.instrument.SN,
+            'instrument_name': self.instrument.INSTRUMENT_NAME,
+            'timestamp_format_enabled': self.instrument._format_data,
+        }
+        ThermohygrometerModel.objects.filter(id=self.thermohygrometer_id).update(**identity)
+        for field, value in identity.items():
+            setattr(self.thermo, field, value)
+
+    async def call_instrument(self, method_name, *args):
+        """Calls an instrument method on the right transport, in this instrument's lane."""
+        method = getattr(self.instrument, method_name)
+        if self.is_async_transport:
+            return await method(*args)
+        return await get_instrument_executor().run(self.thermohygrometer_id, method, *args)
+
+    async def read_all_channels(self):
+        return await self.call_instrument('get_live_data_all_channels')
+
+    def get_thermo_info(self, sensor):
+        """Instrument and sensor details sent with every reading; they do not change while connected."""
+        info = self.thermo_info.get(sensor.id)
+        if info is None:
+            info = self.thermo_info[sensor.id] = {
+                'sn': self.instrument.SN,
+                'pn': self.instrument.PN,
+                'instrument_name': self.instrument.INSTRUMENT_NAME,
+                'instrument_location': self.thermo.equipment_fisical_location,
+                'group_name': self.instrument.GROUP_NAME,
+                'sensor_id': sensor.id,
+                'sensor_name': sensor.sensor_name,
+                'location': sensor.location,
+                'channel': sensor.channel,
+                'min_temperature': sensor.min_temperature or self.thermo.min_temperature,
+                'max_temperature': sensor.max_temperature or self.thermo.max_temperature,
+                'min_humidity': sensor.min_humidity or self.thermo.min_humidity,
+                'max_humidity': sensor.max_humidity or self.thermo.max_humidity,
+            }
+        return info
+
+    async def broadcast_data(self, data, sensor):
+        info = self.get_thermo_info(sensor)
+        data.setdefault('thermo_info', info)
+
+        # The reading is encoded once and the same frame is handed to every subscriber
+        message = json.dumps(data)
+        fanout = get_live_fanout()
+
+        # Send data to the DataConsumers subscribed to this instrument, wrapped as {"data": ...}
+        fanout.publish((self.group_name,), f'{{"data": {message}}}', key=sensor.id)
+
+        # Forward the data to the listeners of the specific sensor, to the listeners who
+        # want all sensors of the thermohygrometer and to those of its instrument group
+        groups = [sensor_group(self.thermohygrometer_id, sensor.id), instrument_group(self.thermohygrometer_id)]
+        if self.thermo.group_name:
+            groups.append(named_group(self.thermo.group_name))
+        fanout.publish(groups, LiveReading(data, info, message), key=sensor.id)
+
+    async def broadcast_error(self, error):
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send(
+            self.group_name,
+            {
+                'type': 'thermo_data',
+                'error': error,
+            }
+        )
+
+    async def check_and_save_data(self, data, sensor):
+        current_time = datetime.strptime(data['date'], '%Y/%m/%d %H:%M:%S')
+        time_interval = self.thermo.time_interval_to_save_measures
+
+        if sensor.storage_mode in MeasureCompressor.MODES:
+            compressor = self.compressors.get(sensor.id)
+            if compressor is None:
+                compressor = self.compressors[sensor.id] = MeasureCompressor(
+                    sensor.storage_mode,
+                    (sensor.temperature_tolerance, sensor.humidity_tolerance),
+                    timedelta(minutes=time_interval),
+                )
+            # Excursions are kept whole: the limit state is part of what is compared
+            state = (data['temperature_style'], data['humidity_style'],
+                     data['corrected_temperature_style'], data['corrected_humidity_style'])
+            for reading in compressor.add(current_time, (data['temperature'], data['humidity']), state, data):
+                self.save_data_to_db(reading, sensor)
+            return
+
+        if sensor.storage_mode == 'aggregate':
+            aggregator = self.aggregators.get(sensor.id)
+            if aggregator is None:
+                aggregator = self.aggregators[sensor.id] = MeasureAggregator(
+                    ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity'),
+                    timedelta(minutes=time_interval),
+                )
+            has_calibration = hasattr(sensor, 'calibration_certificate') and sensor.calibration_certificate
+            summary = aggregator.add(current_time, (
+                data['temperature'],
+                data['humidity'],
+                data['corrected_temperature'] if has_calibration else None,
+                data['corrected_humidity'] if has_calibration else None,
+            ))
+            if summary:
+                self.save_summary_to_db(summary, sensor)
+            return
+
+        if sensor.id not in self.last_saved_time or current_time >= self.last_saved_time[sensor.id] + timedelta(minutes=time_interval):
+            self.save_data_to_db(data, sensor)
+            self.last_saved_time[sensor.id] = current_time
+
+    def save_data_to_db(self, data, sensor):
+        # Written in batches by the shared measurement writer
+        has_calibration = hasattr(sensor, 'calibration_certificate') and sensor.calibration_certificate
+        get_measurement_writer().add(MeasuresModel(
+            instrument=self.thermo,
+            sensor=sensor,
+            temperature=data['temperature'],
+            corrected_temperature=data['corrected_temperature'] if has_calibration else None,
+            humidity=data['humidity'],
+            corrected_humidity=data['corrected_humidity'] if has_calibration else None,
+            date=datetime.strptime(data['date'], '%Y/%m/%d %H:%M:%S')
+        ))
+
+    def save_summary_to_db(self, summary, sensor):
+        # Means, extremes and count of the readings of one interval, see MeasureAggregator
+        get_measurement_writer().add(MeasuresModel(instrument=self.thermo, sensor=sensor, **summary))
+
+    def update_connection_status(self, status):
+        ThermohygrometerModel.objects.filter(id=self.thermohygrometer_id).update(is_connected=status)
+
+    def correct_measures(self, data, sensor):
+        # Check if the sensor has a calibration certificate
+        if hasattr(sensor, 'calibration_certificate') and sensor.calibration_certificate:
+            data['corrected_temperature'] = self.instrument.apply_correction(
+                sensor.calibration_certificate, 'temperature', data['temperature']
+            )
+            data['corrected_humidity'] = self.instrument.apply_correction(
+                sensor.calibration_certificate, 'humidity', data['humidity']
+            )
+        else:
+            data['corrected_temperature'] = 'No Calibration Certificate'
+            data['corrected_humidity'] = 'No Calibration Certificate'
+
+        return data
+
+    def define_measures_style_based_on_limits(self, data, sensor):
+        min_temp = sensor.min_temperature or self.thermo.min_temperature
+        max_temp = sensor.max_temperature or self.thermo.max_temperature
+        min_humidity = sensor.min_humidity or self.thermo.min_humidity
+        max_humidity = sensor.max_humidity or self.thermo.max_humidity
+
+        data['temperature_style'] = 'black'
+        data['humidity_style'] = 'black'
+        data['corrected_temperature_style'] = 'black'
+        data['corrected_humidity_style'] = 'black'
+
+        if data['temperature'] < min_temp or data['temperature'] > max_temp:
+            data['temperature_style'] = 'red'
+        if data['humidity'] < min_humidity or data['humidity'] > max_humidity:
+            data['humidity_style'] = 'red'
+
+        has_calibration = hasattr(sensor, 'calibration_certificate') and sensor.calibration_certificate
+        if has_calibration:
+            if data['corrected_temperature'] < min_temp or data['corrected_temperature'] > max_temp:
+                data['corrected_temperature_style'] = 'red'
+            if data['corrected_humidity'] < min_humidity or data['corrected_humidity'] > max_humidity:
+                data['corrected_humidity_style'] = 'red'
+        else:
+            data['corrected_temperature_style'] = 'red'
+            data['corrected_humidity_style'] = 'red'
+
+        return data
+
+    def process_measurement_data_from_instrument(self, data, sensor):
+        # Add sensor information to the data
+        data['sensor_id'] = sensor.id
+        data['sensor_name'] = sensor.sensor_name
+        data['location'] = sensor.location
+        data['channel'] = sensor.channel
+
+        data = self.correct_measures(data, sensor)
+        data = self.define_measures_style_based_on_limits(data, sensor)
+
+        return data
+
+
+class AcquisitionManager:
+    """
+    Process-wide registry with one InstrumentAcquisition per ThermohygrometerModel.
+
+    The acquisition is started by the first subscriber and stopped when the
+    last one leaves, so every consumer shares the same instrument session.
+    """
+    _acquisitions = {}
+
+    @staticmethod
+    async def subscribe(thermohygrometer_id):
+        # Consumers pass the id from the URL, InstrumentConnectionManager the model's
+        thermohygrometer_id = int(thermohygrometer_id)
+        acquisition = AcquisitionManager._acquisitions.get(thermohygrometer_id)
+        if acquisition is None:
+            acquisition = InstrumentAcquisition(thermohygrometer_id)
+            AcquisitionManager._acquisitions[thermohygrometer_id] = acquisition
+        acquisition.subscribers += 1
+
+        if await acquisition.start():
+            return acquisition
+
+        await AcquisitionManager.unsubscribe(thermohygrometer_id)
+        return None
+
+    @staticmethod
+    async def unsubscribe(thermohygrometer_id):
+        thermohygrometer_id = int(thermohygrometer_id)
+        acquisition = AcquisitionManager._acquisitions.get(thermohygrometer_id)
+        if acquisition is None:
+            return
+        acquisition.subscribers -= 1
+        if acquisition.subscribers <= 0:
+            AcquisitionManager._acquisitions.pop(thermohygrometer_id, None)
+            await acquisition.stop()
+
+    @staticmethod
+    def reload_sensors(thermohygrometer_id=None):
+        """
+        Makes the running acquisitions, or the one of thermohygrometer_id, load
+        their sensors and calibration certificates again before the next poll.
+        """
+        for acquisition in list(AcquisitionManager._acquisitions.values()):
+            if thermohygrometer_id is None or acquisition.thermohygrometer_id == thermohygrometer_id:
+                acquisition.sensors_changed = True
+
+    @staticmethod
+    def get(thermohygrometer_id):
+        return AcquisitionManager._acquisitions.get(int(thermohygrometer_id))
@@ -20,7 +20,7 @@ admin.site.register(SensorModel)
 class MeasuresModelAdmin(admin.ModelAdmin):
     list_display = ['date', 'instrument', 'sensor', 'temperature', 'corrected_temperature', 'humidity', 'corrected_humidity', 'pn', 'sn', 'get_sensor_sn', 'get_sensor_pn']
     list_filter = ['date', 'instrument', 'sensor']
-    search_fields = ['instrument__name', 'pn', 'sn', 'sensor__sensor_name', 'sensor__location']
+    search_fields = ['instrument__name', 'identity__pn', 'identity__sn', 'sensor__sensor_name', 'sensor__location']
     ordering = ['-date']
     
     def get_sensor_sn(self, obj):
@@ -5,6 +5,9 @@ from .views import (
     CertificateViewSet,
     ExportDataViewSet,
     EnvironmentalAnalysisViewSet,
+    LatestValuesViewSet,
+    MeasuresViewSet,
+    MetricsViewSet,
     ThermohygrometerViewSet
 )
 from fluke_data.api.views.sensor import SensorViewSet
@@ -36,6 +39,21 @@ router_v1.register(
     SensorViewSet,
     basename='sensors'
 )
+router_v1.register(
+    r'measures',
+    MeasuresViewSet,
+    basename='api-measures'
+)
+router_v1.register(
+    r'latest-values',
+    LatestValuesViewSet,
+    basename='api-latest-values'
+)
+router_v1.register(
+    r'metrics',
+    MetricsViewSet,
+    basename='api-metrics'
+)
 
 # API URLs with versioning
 urlpatterns = [
@@ -7,11 +7,17 @@ importing and exposing them from their respective modules.
 from .certificate import CertificateViewSet
 from .export_data import ExportDataViewSet
 from .environmental_analysis import EnvironmentalAnalysisViewSet
+from .latest_values import LatestValuesViewSet
+from .measures import MeasuresViewSet
+from .metrics import MetricsViewSet
 from .thermohygrometer import ThermohygrometerViewSet
 
 __all__ = [
     'CertificateViewSet',
     'ExportDataViewSet',
     'EnvironmentalAnalysisViewSet',
+    'LatestValuesViewSet',
+    'MeasuresViewSet',
+    'MetricsViewSet',
     'ThermohygrometerViewSet',
 ]
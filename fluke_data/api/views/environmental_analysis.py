@@ -8,7 +8,7 @@ import json
 from collections import defaultdict
 from datetime import datetime, timedelta
 
-from django.db.models import Q
+from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, viewsets
@@ -21,7 +21,10 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.versioning import URLPathVersioning
 
-from fluke_data.models import MeasuresModel, ThermohygrometerModel
+from fluke_data.compression import limit_value, resample, time_out_of_limits
+from fluke_data.models import SensorModel, ThermohygrometerModel
+from fluke_data.partitions import iterate_measures
+from fluke_data.rollups import rollup_stats
 
 
 class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
@@ -63,6 +66,12 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
         - Coleta dados apenas de dias úteis (segunda a sexta)
         - Considera os limites configurados para cada instrumento
         - Retorna dados de temperatura e umidade separadamente
+        - O tempo fora dos limites e as séries são reconstruídos por interpolação
+          linear das medições armazenadas, inclusive de sensores com compressão
+        - Por padrão, as linhas agregadas por intervalo são comparadas aos limites
+          pela média das leituras. Com use_extremes=true, usa-se o mínimo ou o
+          máximo do intervalo quando estiver fora dos limites, o que conta as
+          excursões escondidas pela média e pode aumentar o percentual fora dos limites
         """,
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -76,6 +85,11 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
                 'instruments': openapi.Schema(
                     type=openapi.TYPE_ARRAY,
                     items=openapi.Schema(type=openapi.TYPE_INTEGER)
+                ),
+                'use_extremes': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN,
+                    default=False,
+                    description="Compara as linhas agregadas pelo mínimo ou máximo do intervalo em vez da média"
                 )
             }
         ),
@@ -116,6 +130,7 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
             request.data['start_time'], '%H:%M').time()
         end_time = datetime.strptime(request.data['end_time'], '%H:%M').time()
         instrument_ids = request.data['instruments']
+        use_extremes = str(request.data.get('use_extremes', False)).lower() in ('1', 'true')
 
         instruments = ThermohygrometerModel.objects.filter(
             id__in=instrument_ids  # type: ignore
@@ -141,32 +156,53 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
         total_time_available = len(
             weekdays) * ((end_time.hour - start_time.hour) + (end_time.minute - start_time.minute) / 60)
 
+        # Weekday windows of the analysis, in which out-of-limits time is counted
+        windows = [
+            (timezone.make_aware(datetime.combine(day, start_time)), timezone.make_aware(datetime.combine(day, end_time)))
+            for day in weekdays
+        ]
+
         for instrument in instruments:
-            measures = MeasuresModel.objects.filter(
-                instrument=instrument,  # type: ignore
-                date__range=(start_datetime, end_datetime),
-                date__week_day__gte=2,
-                date__week_day__lte=6,
-                date__time__gte=start_time,
-                date__time__lte=end_time
-            ).order_by('date')
-
-            temp_out = measures.filter(
-                corrected_temperature__isnull=False
-            ).filter(
-                Q(corrected_temperature__lt=instrument.min_temperature) |
-                Q(corrected_temperature__gt=instrument.max_temperature)
-            ).count()
-
-            humidity_out = measures.filter(
-                corrected_humidity__isnull=False
-            ).filter(
-                Q(corrected_humidity__lt=instrument.min_humidity) |
-                Q(corrected_humidity__gt=instrument.max_humidity)
-            ).count()
-
-            total_time_out = ((temp_out + humidity_out) *
-                              instrument.time_interval_to_save_measures) / 60
+            # Sensors may store a reading only when the signal changes (see fluke_data.compression),
+            # so times come from interpolating the stored readings rather than from counting rows
+            interval = timedelta(minutes=max(instrument.time_interval_to_save_measures, 1))
+            max_gap = 2 * interval
+            points = defaultdict(lambda: {'corrected_temperature': [], 'corrected_humidity': []})
+            rows = iterate_measures(
+                timezone.make_aware(start_datetime) - max_gap, timezone.make_aware(end_datetime) + max_gap,
+                instrument_id=instrument.id,
+                fields=('sensor_id', 'date', 'sample_count',
+                        'corrected_temperature', 'corrected_temperature_min', 'corrected_temperature_max',
+                        'corrected_humidity', 'corrected_humidity_min', 'corrected_humidity_max'),
+            )
+            limits = {
+                'corrected_temperature': (instrument.min_temperature, instrument.max_temperature),
+                'corrected_humidity': (instrument.min_humidity, instrument.max_humidity),
+            }
+            for sensor_id, date, sample_count, *values in rows:
+                for field, (value, minimum, maximum) in zip(limits, (values[:3], values[3:])):
+                    if value is None:
+                        continue
+                    if use_extremes:
+                        # Rows of the interval aggregate storage mode count with their extremes when out of limits
+                        value = limit_value(value, minimum, maximum, *limits[field], sample_count=sample_count)
+                    points[sensor_id][field].append((date, value))
+
+            time_out = timedelta(0)
+            temperature_series = []
+            humidity_series = []
+            for series in points.values():
+                time_out += time_out_of_limits(
+                    series['corrected_temperature'], instrument.min_temperature, instrument.max_temperature, windows, max_gap
+                )
+                time_out += time_out_of_limits(
+                    series['corrected_humidity'], instrument.min_humidity, instrument.max_humidity, windows, max_gap
+                )
+                for window_start, window_end in windows:
+                    temperature_series += resample(series['corrected_temperature'], window_start, window_end, interval, max_gap)
+                    humidity_series += resample(series['corrected_humidity'], window_start, window_end, interval, max_gap)
+
+            total_time_out = time_out.total_seconds() / 3600
             percent_out_of_limits = (
                 total_time_out / total_time_available) * 100 if total_time_available > 0 else 0
 
@@ -175,20 +211,13 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
                 'percent_out_of_limits': percent_out_of_limits,
             })
 
-            for measure in measures:
-                timestamp = measure.date.strftime('%Y-%m-%d %H:%M')
-                timestamps.add(timestamp)
-
-                if measure.corrected_temperature is not None:
-                    temperature_data[instrument.instrument_name].append({
-                        'timestamp': timestamp,
-                        'value': measure.corrected_temperature
-                    })
-
-                if measure.corrected_humidity is not None:
-                    humidity_data[instrument.instrument_name].append({
+            for series, chart_data in ((temperature_series, temperature_data), (humidity_series, humidity_data)):
+                for date, value in sorted((point for point in series if point[1] is not None), key=lambda point: point[0]):
+                    timestamp = date.strftime('%Y-%m-%d %H:%M')
+                    timestamps.add(timestamp)
+                    chart_data[instrument.instrument_name].append({
                         'timestamp': timestamp,
-                        'value': measure.corrected_humidity
+                        'value': value
                     })
 
         context = {
@@ -201,3 +230,65 @@ class EnvironmentalAnalysisViewSet(viewsets.ViewSet):
         }
 
         return Response(self.get_versioned_response(request, context))
+
+    @swagger_auto_schema(
+        operation_description="""
+        Retorna mínimo, máximo e média de temperatura e umidade (lidas e corrigidas)
+        de cada sensor no período informado.
+
+        As estatísticas são calculadas a partir das tabelas de agregados por minuto,
+        hora e dia, sem percorrer todas as medições do período.
+        """,
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['start_date', 'end_date', 'sensors'],
+            properties={
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'start_time': openapi.Schema(type=openapi.TYPE_STRING, format='time', default='00:00'),
+                'end_time': openapi.Schema(type=openapi.TYPE_STRING, format='time', default='23:59'),
+                'sensors': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER)
+                )
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description="Estatísticas por sensor",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'analysis_period': openapi.Schema(type=openapi.TYPE_STRING),
+                        'data': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                    }
+                )
+            ),
+            400: 'Dados inválidos'
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='statistics')
+    def statistics(self, request):
+        try:
+            start_datetime = datetime.strptime(
+                f"{request.data['start_date']} {request.data.get('start_time', '00:00')}", '%Y-%m-%d %H:%M')
+            end_datetime = datetime.strptime(
+                f"{request.data['end_date']} {request.data.get('end_time', '23:59')}", '%Y-%m-%d %H:%M')
+            sensor_ids = list(request.data['sensors'])
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Invalid sensors, date or time format.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = []
+        for sensor in SensorModel.objects.filter(id__in=sensor_ids).select_related('instrument'):
+            data.append({
+                'sensor_id': sensor.id,
+                'sensor_name': sensor.sensor_name,
+                'instrument_name': sensor.instrument.instrument_name,
+                **rollup_stats(sensor, start_datetime, end_datetime),
+            })
+
+        context = {
+            'analysis_period': f"{start_datetime.strftime('%d/%m/%Y %H:%M')} - {end_datetime.strftime('%d/%m/%Y %H:%M')}",
+            'data': data,
+        }
+        return Response(self.get_versioned_response(request, context))
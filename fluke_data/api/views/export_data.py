@@ -7,6 +7,7 @@ currently supporting CSV exports with filtering by date range and sensor.
 import csv
 
 from django.http import HttpResponse
+from django.utils.dateparse import parse_datetime
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets
@@ -17,7 +18,11 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.versioning import URLPathVersioning
 
-from fluke_data.models import MeasuresModel, SensorModel
+from fluke_data.models import SensorModel
+from fluke_data.partitions import EXTREME_FIELDS, iterate_measures
+
+# CSV headers of the extremes of EXTREME_FIELDS, in the same order
+EXTREME_LABELS = ('Temperature (°C)', 'Humidity (%)', 'Corrected Temperature (°C)', 'Corrected Humidity (%)')
 
 
 class ExportDataViewSet(viewsets.ViewSet):
@@ -66,14 +71,19 @@ class ExportDataViewSet(viewsets.ViewSet):
                 )
 
             selected_sensor = SensorModel.objects.get(id=sensor_id)
-            start_datetime = f"{start_date} {start_time}"
-            end_datetime = f"{end_date} {end_time}"
+            start_datetime = parse_datetime(f"{start_date} {start_time}")
+            end_datetime = parse_datetime(f"{end_date} {end_time}")
+            if not start_datetime or not end_datetime:
+                return Response(
+                    self.get_versioned_response(
+                        request, {'error': 'Invalid date or time format'}),
+                    status=400
+                )
 
-            # Query data by sensor directly
-            data = MeasuresModel.objects.filter(
-                sensor=selected_sensor,
-                date__range=[start_datetime, end_datetime]
-            ).order_by('-date')
+            # Query data by sensor directly, across the monthly partitions
+            data = iterate_measures(
+                start_datetime, end_datetime, sensor_id=selected_sensor.id, order='-date'
+            )
 
             # Create filename based on sensor info
             filename = f"measured_data_{selected_sensor.sensor_name}_{start_date}_{end_date}.csv"
@@ -87,16 +97,22 @@ class ExportDataViewSet(viewsets.ViewSet):
                 'Temperature (°C)', 
                 'Corrected Temperature (°C)',
                 'Humidity (%)', 
-                'Corrected Humidity (%)'
+                'Corrected Humidity (%)',
+                'Samples',
+                *(f"{label} {bound}" for label in EXTREME_LABELS for bound in ('Min', 'Max')),
             ])
 
             for measure in data:
+                # Rows of the interval aggregate storage mode hold means: their extremes follow
+                aggregated = measure.sample_count is not None and measure.sample_count > 1
                 writer.writerow([
                     measure.date.strftime("%d/%m/%Y %H:%M"),
                     measure.temperature,
                     measure.corrected_temperature,
                     measure.humidity,
-                    measure.corrected_humidity
+                    measure.corrected_humidity,
+                    measure.sample_count or 1,
+                    *(getattr(measure, field) if aggregated else '' for field in EXTREME_FIELDS),
                 ])
 
             return response
@@ -0,0 +1,112 @@
+"""
+Views for the current state of the sensors.
+This module serves the latest reading of every sensor kept in memory by
+the acquisition loops, so dashboards and integrations can poll the whole
+fleet with one cheap request instead of a WebSocket or a database query.
+"""
+
+import time
+
+from django.utils import timezone
+from django.utils.http import parse_etags
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status, viewsets
+from rest_framework.authentication import (BasicAuthentication,
+                                           SessionAuthentication)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.versioning import URLPathVersioning
+
+from fluke_data.latest_values import get_latest_value_store
+
+
+class LatestValuesViewSet(viewsets.ViewSet):
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    versioning_class = URLPathVersioning
+
+    def get_versioned_response(self, request, data):
+        if request.version == 'v1':
+            return data
+        return data
+
+    @swagger_auto_schema(
+        operation_description="""
+        Retorna a última leitura de todos os sensores em aquisição.
+
+        Cada sensor traz os valores medidos e corrigidos, a data da leitura, os
+        limites e quais valores estão fora deles, e a idade da leitura em
+        segundos. Os valores vêm da memória do servidor, atualizada a cada
+        leitura do instrumento, sem consulta ao banco de dados.
+
+        A resposta tem um ETag fraco que muda a cada nova leitura: enviado em
+        If-None-Match, o servidor responde 304 enquanto nada mudou. A idade das
+        leituras pode então ser calculada pelo cliente a partir de received_at.
+        """,
+        manual_parameters=[
+            openapi.Parameter(
+                'If-None-Match',
+                openapi.IN_HEADER,
+                description="ETag de uma resposta anterior",
+                type=openapi.TYPE_STRING,
+                required=False
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Última leitura de cada sensor",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'generated_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                        'sensors': openapi.Schema(
+                            type=openapi.TYPE_ARRAY,
+                            items=openapi.Schema(
+                                type=openapi.TYPE_OBJECT,
+                                properties={
+                                    'sensor_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'sensor_name': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'location': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'channel': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'thermohygrometer_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    'instrument_name': openapi.Schema(type=openapi.TYPE_STRING),
+                                    'temperature': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                    'humidity': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                    'corrected_temperature': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                                    'corrected_humidity': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                                    'calibrated': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                                    'date': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                                    'received_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                                    'age_seconds': openapi.Schema(type=openapi.TYPE_NUMBER),
+                                    'limits': openapi.Schema(type=openapi.TYPE_OBJECT),
+                                    'out_of_limits': openapi.Schema(type=openapi.TYPE_OBJECT),
+                                }
+                            )
+                        ),
+                    }
+                )
+            ),
+            304: 'Nenhuma leitura nova desde o ETag enviado'
+        }
+    )
+    def list(self, request):
+        version, entries = get_latest_value_store().snapshot()
+        etag = f'W/"{version}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        # Weak comparison, as required for If-None-Match
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = parse_etags(if_none_match)
+            if '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        now = time.time()
+        sensors = []
+        for entry in entries:
+            sensor = dict(entry)
+            sensor['age_seconds'] = round(now - sensor.pop('received_at_epoch'), 3)
+            sensors.append(sensor)
+        data = {'generated_at': timezone.now().isoformat(), 'sensors': sensors}
+        return Response(self.get_versioned_response(request, data), headers=headers)
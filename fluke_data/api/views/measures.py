@@ -0,0 +1,138 @@
+"""
+Views for measurement ingest.
+This module lets integrations and CSV re-imports write batches of
+measurements. Each (sensor, date) is stored once, so a batch can be
+retried or replayed without duplicating history.
+"""
+
+from datetime import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status, viewsets
+from rest_framework.authentication import (BasicAuthentication,
+                                           SessionAuthentication)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.versioning import URLPathVersioning
+
+from thermohygrometer.calibration import get_compiled_calibration
+
+from fluke_data.ingest import upsert_measures
+from fluke_data.models import MeasuresModel, SensorModel
+
+
+class MeasuresViewSet(viewsets.ViewSet):
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    versioning_class = URLPathVersioning
+
+    def get_versioned_response(self, request, data):
+        if request.version == 'v1':
+            return data
+        return data
+
+    @swagger_auto_schema(
+        operation_description="""
+        Grava um lote de medições.
+
+        Cada sensor tem no máximo uma medição por data (em segundos inteiros):
+        uma medição já existente tem seus valores substituídos, e reenviar o
+        mesmo lote não grava nada. Medições de meses já arquivados em Parquet
+        não são substituídas.
+
+        Os valores corrigidos, quando omitidos, são calculados pelo certificado
+        de calibração do sensor.
+        """,
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['measures'],
+            properties={
+                'measures': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=['sensor_id', 'date', 'temperature', 'humidity'],
+                        properties={
+                            'sensor_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'date': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                            'temperature': openapi.Schema(type=openapi.TYPE_NUMBER),
+                            'humidity': openapi.Schema(type=openapi.TYPE_NUMBER),
+                            'corrected_temperature': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                            'corrected_humidity': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                        }
+                    )
+                )
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description="Resultado da gravação",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'created': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'updated': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'unchanged': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'skipped': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    }
+                )
+            ),
+            400: 'Dados inválidos',
+            404: 'Sensor não encontrado',
+            500: 'Erro ao gravar as medições'
+        }
+    )
+    def create(self, request):
+        items = request.data.get('measures') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response(self.get_versioned_response(request, {'error': 'measures must be a non-empty list'}),
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_batch = getattr(settings, 'MEASUREMENT_INGEST_MAX_BATCH', 10000)
+        if len(items) > max_batch:
+            return Response(self.get_versioned_response(request, {'error': f'At most {max_batch} measures per request'}),
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            sensor_ids = {int(item['sensor_id']) for item in items}
+        except (KeyError, TypeError, ValueError):
+            return Response(self.get_versioned_response(request, {'error': 'Invalid sensor_id'}),
+                            status=status.HTTP_400_BAD_REQUEST)
+        sensors = SensorModel.objects.select_related('calibration_certificate').in_bulk(sensor_ids)
+        missing = sorted(sensor_ids - set(sensors))
+        if missing:
+            return Response(self.get_versioned_response(request, {'error': f'Sensors not found: {missing}'}),
+                            status=status.HTTP_404_NOT_FOUND)
+
+        measures = []
+        for index, item in enumerate(items):
+            try:
+                date = datetime.fromisoformat(str(item['date']).replace('Z', '+00:00'))
+                sensor = sensors[int(item['sensor_id'])]
+                measure = MeasuresModel(
+                    instrument_id=sensor.instrument_id,
+                    sensor=sensor,
+                    temperature=float(item['temperature']),
+                    humidity=float(item['humidity']),
+                    date=date if timezone.is_aware(date) else timezone.make_aware(date),
+                )
+                for field, measurement_type in (('corrected_temperature', 'temperature'), ('corrected_humidity', 'humidity')):
+                    value = item.get(field)
+                    if value is None and sensor.calibration_certificate:
+                        calibration = get_compiled_calibration(sensor.calibration_certificate)
+                        value = calibration.correct(measurement_type, getattr(measure, measurement_type))
+                    setattr(measure, field, None if value is None else float(value))
+            except (KeyError, TypeError, ValueError) as e:
+                return Response(self.get_versioned_response(request, {'error': f'Invalid measure at index {index}: {str(e)}'}),
+                                status=status.HTTP_400_BAD_REQUEST)
+            measures.append(measure)
+
+        try:
+            result = upsert_measures(measures)
+        except Exception as e:
+            print(f"measures.create: Error writing {len(measures)} measures: {str(e)}")
+            return Response(self.get_versioned_response(request, {'error': str(e)}),
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(self.get_versioned_response(request, result))
@@ -0,0 +1,73 @@
+"""
+Views for runtime metrics.
+This module exposes the internal counters of the acquisition pipeline,
+such as the instrument I/O executor queue depth and wait times,
+the throughput of the memory backfill, the reconnect scheduler state,
+the batch sizes and flush latency of the measurement writer and the lag
+of each live WebSocket client.
+"""
+
+from asgiref.sync import async_to_sync
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import viewsets
+from rest_framework.authentication import (BasicAuthentication,
+                                           SessionAuthentication)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.versioning import URLPathVersioning
+
+from fluke_data.backfill import MemoryBackfill
+from fluke_data.connection_manager import InstrumentConnectionManager
+from fluke_data.fanout import get_live_fanout
+from fluke_data.instrument_executor import get_instrument_executor
+from fluke_data.measurement_writer import get_measurement_writer
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    versioning_class = URLPathVersioning
+
+    def get_versioned_response(self, request, data):
+        if request.version == 'v1':
+            return data
+        return data
+
+    @swagger_auto_schema(
+        operation_description="Retorna as métricas de execução do pipeline de aquisição",
+        responses={
+            200: openapi.Response(
+                description="Métricas de execução",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'instrument_io': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'backfill': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'reconnect': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'measurement_writer': openapi.Schema(type=openapi.TYPE_OBJECT),
+                        'live_clients': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    }
+                )
+            )
+        }
+    )
+    def list(self, request):
+        # The view runs in a worker thread, while the event loop keeps updating these counters
+        data = async_to_sync(self.event_loop_metrics)()
+        data['measurement_writer'] = get_measurement_writer().stats()
+        return Response(self.get_versioned_response(request, data))
+
+    @staticmethod
+    async def event_loop_metrics():
+        """
+        Snapshot of the state owned by the event loop, taken on the loop so no
+        dict or set of it changes size while it is read.
+        """
+        scheduler = InstrumentConnectionManager.scheduler
+        return {
+            'instrument_io': get_instrument_executor().stats(),
+            'backfill': {key: dict(stats) for key, stats in MemoryBackfill.stats.items()},
+            'reconnect': scheduler.stats() if scheduler else None,
+            'live_clients': get_live_fanout().stats(),
+        }
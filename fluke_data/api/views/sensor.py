@@ -1,3 +1,7 @@
+from datetime import datetime, time
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status, viewsets
@@ -72,6 +76,9 @@ class SensorViewSet(viewsets.ViewSet):
                         'max_temperature': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
                         'min_humidity': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
                         'max_humidity': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                        'storage_mode': openapi.Schema(type=openapi.TYPE_STRING),
+                        'temperature_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
+                        'humidity_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
                         'thermohygrometer_id': openapi.Schema(type=openapi.TYPE_INTEGER),
                         'thermohygrometer_name': openapi.Schema(type=openapi.TYPE_STRING),
                     }
@@ -97,6 +104,9 @@ class SensorViewSet(viewsets.ViewSet):
                 'thermohygrometer_id': sensor.instrument.id,
                 'thermohygrometer_name': sensor.instrument.instrument_name,
                 'calibration_certificate_id': sensor.calibration_certificate.id if sensor.calibration_certificate else None,
+                'storage_mode': sensor.storage_mode,
+                'temperature_tolerance': sensor.temperature_tolerance,
+                'humidity_tolerance': sensor.humidity_tolerance,
             }
             return Response(self.get_versioned_response(request, data))
         except SensorModel.DoesNotExist:
@@ -122,6 +132,9 @@ class SensorViewSet(viewsets.ViewSet):
                 'sensor_sn': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                 'sensor_pn': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                 'calibration_certificate_id': openapi.Schema(type=openapi.TYPE_INTEGER, nullable=True),
+                'storage_mode': openapi.Schema(type=openapi.TYPE_STRING, enum=[choice[0] for choice in SensorModel.STORAGE_MODE_CHOICES]),
+                'temperature_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
+                'humidity_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
             }
         ),
         responses={
@@ -144,7 +157,7 @@ class SensorViewSet(viewsets.ViewSet):
                 )
             
             # Create new sensor
-            sensor = SensorModel.objects.create(
+            sensor = SensorModel(
                 instrument=thermohygrometer,
                 sensor_name=request.data.get('sensor_name'),
                 location=request.data.get('location'),
@@ -155,6 +168,9 @@ class SensorViewSet(viewsets.ViewSet):
                 max_humidity=request.data.get('max_humidity'),
                 sensor_sn=request.data.get('sensor_sn'),
                 sensor_pn=request.data.get('sensor_pn'),
+                storage_mode=request.data.get('storage_mode', 'interval'),
+                temperature_tolerance=request.data.get('temperature_tolerance', 0.1),
+                humidity_tolerance=request.data.get('humidity_tolerance', 0.5),
             )
             
             # Add calibration certificate if provided
@@ -164,10 +180,12 @@ class SensorViewSet(viewsets.ViewSet):
                 try:
                     certificate = CalibrationCertificateModel.objects.get(id=calibration_certificate_id)
                     sensor.calibration_certificate = certificate
-                    sensor.save()
                 except CalibrationCertificateModel.DoesNotExist:
                     pass  # Ignore if certificate doesn't exist
             
+            # The acquisition uses the limits and tolerances as numbers, the storage mode as a choice
+            sensor.full_clean()
+            sensor.save()
             return Response(
                 self.get_versioned_response(request, {'id': sensor.id, 'message': 'Sensor created successfully'}),
                 status=status.HTTP_201_CREATED
@@ -177,6 +195,11 @@ class SensorViewSet(viewsets.ViewSet):
                 self.get_versioned_response(request, {'error': 'Thermohygrometer not found'}),
                 status=status.HTTP_404_NOT_FOUND
             )
+        except ValidationError as e:
+            return Response(
+                self.get_versioned_response(request, {'error': e.message_dict}),
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 self.get_versioned_response(request, {'error': str(e)}),
@@ -197,6 +220,9 @@ class SensorViewSet(viewsets.ViewSet):
                 'sensor_sn': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                 'sensor_pn': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                 'calibration_certificate_id': openapi.Schema(type=openapi.TYPE_INTEGER, nullable=True),
+                'storage_mode': openapi.Schema(type=openapi.TYPE_STRING, enum=[choice[0] for choice in SensorModel.STORAGE_MODE_CHOICES]),
+                'temperature_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
+                'humidity_tolerance': openapi.Schema(type=openapi.TYPE_NUMBER),
             }
         ),
         responses={
@@ -226,6 +252,12 @@ class SensorViewSet(viewsets.ViewSet):
                 sensor.sensor_sn = request.data.get('sensor_sn')
             if 'sensor_pn' in request.data:
                 sensor.sensor_pn = request.data.get('sensor_pn')
+            if 'storage_mode' in request.data:
+                sensor.storage_mode = request.data.get('storage_mode')
+            if 'temperature_tolerance' in request.data:
+                sensor.temperature_tolerance = request.data.get('temperature_tolerance')
+            if 'humidity_tolerance' in request.data:
+                sensor.humidity_tolerance = request.data.get('humidity_tolerance')
             
             # Update calibration certificate if provided
             if 'calibration_certificate_id' in request.data:
@@ -240,6 +272,7 @@ class SensorViewSet(viewsets.ViewSet):
                 else:
                     sensor.calibration_certificate = None
             
+            sensor.full_clean()
             sensor.save()
             return Response(
                 self.get_versioned_response(request, {'message': 'Sensor updated successfully'}),
@@ -250,6 +283,11 @@ class SensorViewSet(viewsets.ViewSet):
                 self.get_versioned_response(request, {'error': 'Sensor not found'}),
                 status=status.HTTP_404_NOT_FOUND
             )
+        except ValidationError as e:
+            return Response(
+                self.get_versioned_response(request, {'error': e.message_dict}),
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 self.get_versioned_response(request, {'error': str(e)}),
@@ -320,3 +358,100 @@ class SensorViewSet(viewsets.ViewSet):
                 self.get_versioned_response(request, {'error': 'Thermohygrometer not found'}),
                 status=status.HTTP_404_NOT_FOUND
             )
+
+    @staticmethod
+    def _serialize_recompute_job(job):
+        from fluke_data.recompute import CorrectionRecompute
+
+        return {
+            'id': job.id,
+            'sensor_id': job.sensor_id,
+            'start_date': job.start_date,
+            'end_date': job.end_date,
+            'status': job.status,
+            'rows_done': job.rows_done,
+            'rows_total': job.rows_total,
+            'progress': round(job.rows_done / job.rows_total * 100, 1) if job.rows_total else None,
+            'resumable': CorrectionRecompute.is_resumable(job),
+            'error': job.error,
+            'created_at': job.created_at,
+            'updated_at': job.updated_at,
+        }
+
+    @swagger_auto_schema(
+        method='get',
+        operation_description="Lista as recomputações de correção do sensor e seu progresso",
+        responses={
+            200: "Lista de recomputações",
+            404: "Sensor não encontrado"
+        }
+    )
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Reaplica o certificado de calibração atual do sensor às medições já salvas",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'start_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'end_date': openapi.Schema(type=openapi.TYPE_STRING, format='date'),
+                'resume_job_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+            }
+        ),
+        responses={
+            202: "Recomputação iniciada",
+            400: "Dados inválidos",
+            404: "Sensor não encontrado"
+        }
+    )
+    @action(detail=True, methods=['get', 'post'], url_path='recompute-corrections')
+    def recompute_corrections(self, request, pk=None):
+        from fluke_data.models import CorrectionRecomputeJobModel
+        from fluke_data.recompute import CorrectionRecompute
+
+        try:
+            sensor = SensorModel.objects.get(id=pk)
+        except SensorModel.DoesNotExist:
+            return Response(
+                self.get_versioned_response(request, {'error': 'Sensor not found'}),
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if request.method == 'GET':
+            jobs = CorrectionRecomputeJobModel.objects.filter(sensor=sensor)
+            data = [self._serialize_recompute_job(job) for job in jobs]
+            return Response(self.get_versioned_response(request, data))
+
+        if request.data.get('resume_job_id'):
+            try:
+                job = CorrectionRecomputeJobModel.objects.get(id=request.data['resume_job_id'], sensor=sensor)
+            except CorrectionRecomputeJobModel.DoesNotExist:
+                return Response(
+                    self.get_versioned_response(request, {'error': 'Job not found'}),
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            # A 'running' job left by a stopped process is resumed
+            if not CorrectionRecompute.is_resumable(job):
+                return Response(
+                    self.get_versioned_response(request, {'error': f'Job is {job.status}'}),
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            try:
+                start_date = request.data.get('start_date')
+                end_date = request.data.get('end_date')
+                if start_date:
+                    start_date = timezone.make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
+                if end_date:
+                    end_date = timezone.make_aware(datetime.combine(datetime.strptime(end_date, '%Y-%m-%d').date(), time.max))
+            except ValueError as e:
+                return Response(
+                    self.get_versioned_response(request, {'error': str(e)}),
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            job = CorrectionRecompute.create_job(sensor, start_date=start_date, end_date=end_date)
+
+        CorrectionRecompute.start_in_background(job)
+        return Response(
+            self.get_versioned_response(request, self._serialize_recompute_job(job)),
+            status=status.HTTP_202_ACCEPTED
+        )
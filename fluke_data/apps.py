@@ -1,10 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FlukeDataConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fluke_data'
 
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(signals.update_measure_storage, sender=self)
+
     # def ready(self):
     #     # Avoid running this code in manage.py migrate
     #     import sys
@@ -0,0 +1,326 @@
+# fluke_data/archive.py
+
+import glob
+import operator
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MeasurePartitionModel, MeasuresModel, SensorModel
+from .partitions import COLUMNS, CORRECTIONS, EXTREME_FIELDS, add_months, get_partition_model, month_bounds, month_of
+
+# Row type of archived measurements, with the attribute names of MeasuresModel
+ArchivedMeasure = namedtuple('ArchivedMeasure', COLUMNS)
+
+COMPRESSION = 'zstd'
+# Rows are sorted by date, so the row group statistics let date ranges skip most of a file
+ROW_GROUP_SIZE = 50_000
+
+_DTYPES = {
+    'id': 'int64',
+    'instrument_id': 'Int64',
+    'sensor_id': 'Int64',
+    'temperature': 'float64',
+    'corrected_temperature': 'float64',
+    'humidity': 'float64',
+    'corrected_humidity': 'float64',
+    'identity_id': 'Int64',
+    'sample_count': 'Int64',
+    **{column: 'float64' for column in EXTREME_FIELDS},
+}
+
+
+def get_archive_dir():
+    return str(getattr(settings, 'MEASUREMENT_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def month_dir(month):
+    return os.path.join(get_archive_dir(), f"{month:%Y-%m}")
+
+
+def sensor_file(month, sensor_id):
+    return os.path.join(month_dir(month), f"sensor-{'none' if sensor_id is None else sensor_id}.parquet")
+
+
+def _aware(date):
+    if isinstance(date, datetime) and timezone.is_naive(date):
+        return timezone.make_aware(date)
+    return date
+
+
+def _to_frame(rows):
+    frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    frame['date'] = pd.to_datetime(frame['date'], utc=True)
+    return frame.astype(_DTYPES)
+
+
+def _write_frame(frame, path):
+    temporary = f"{path}.tmp"
+    frame.to_parquet(temporary, engine='pyarrow', compression=COMPRESSION, index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(temporary, path)
+    return os.path.getsize(path)
+
+
+def archive_partition(partition):
+    """
+    Writes a sealed partition to one Parquet file per sensor, then drops its
+    table. Returns the size of the files.
+    """
+    if partition.archived_at:
+        return partition.archive_bytes
+    model = get_partition_model(partition.month)
+    os.makedirs(month_dir(partition.month), exist_ok=True)
+
+    archive_bytes = 0
+    rows = 0
+    for sensor_id in model.objects.order_by().values_list('sensor_id', flat=True).distinct():
+        queryset = model.objects.filter(sensor_id=sensor_id) if sensor_id is not None else model.objects.filter(sensor_id__isnull=True)
+        frame = _to_frame(list(queryset.order_by('date', 'id').values_list(*COLUMNS)))
+        archive_bytes += _write_frame(frame, sensor_file(partition.month, sensor_id))
+        rows += len(frame)
+
+    # The table is dropped in the same transaction that marks the partition archived
+    with connection.schema_editor() as editor:
+        editor.delete_model(model)
+        partition.archived_at = timezone.now()
+        partition.archive_bytes = archive_bytes
+        partition.row_count = rows
+        partition.save()
+    return archive_bytes
+
+
+def append_to_archive(partition):
+    """Moves rows of an archived month that reached MeasuresModel late into its Parquet files."""
+    start, end = month_bounds(partition.month)
+    queryset = MeasuresModel.objects.filter(date__gte=start, date__lt=end)
+    rows = list(queryset.order_by('id').values_list(*COLUMNS))
+    if not rows:
+        return 0
+    os.makedirs(month_dir(partition.month), exist_ok=True)
+    frame = _to_frame(rows)
+    for sensor_id, group in frame.groupby('sensor_id', dropna=False):
+        path = sensor_file(partition.month, None if pd.isna(sensor_id) else int(sensor_id))
+        if os.path.exists(path):
+            group = pd.concat([pd.read_parquet(path, engine='pyarrow'), group], ignore_index=True)
+        # A measurement of the sensor already archived at the same date is kept, see fluke_data.ingest
+        group = group.drop_duplicates('date', keep='first')
+        _write_frame(group.sort_values(['date', 'id'], ignore_index=True), path)
+
+    with transaction.atomic():
+        # Rows written meanwhile have higher ids and wait for the next run
+        queryset.filter(id__lte=rows[-1][0]).delete()
+        partition.row_count += len(rows)
+        partition.archive_bytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(month_dir(partition.month), '*.parquet')))
+        partition.save()
+    return len(rows)
+
+
+def archive_closed_partitions(archive_after_months=None, today=None):
+    """
+    Archives the sealed partitions older than archive_after_months
+    (MEASUREMENT_ARCHIVE_AFTER_MONTHS, unset or 0 never archives).
+    """
+    if archive_after_months is None:
+        archive_after_months = getattr(settings, 'MEASUREMENT_ARCHIVE_AFTER_MONTHS', None)
+    if not archive_after_months:
+        return {}
+    cutoff = add_months(month_of(today or timezone.now()), -archive_after_months)
+    archived = {}
+    for partition in MeasurePartitionModel.objects.filter(archived_at__isnull=True, month__lt=cutoff):
+        archived[partition.month] = archive_partition(partition)
+    return archived
+
+
+def remove_archive(month):
+    shutil.rmtree(month_dir(month), ignore_errors=True)
+
+
+def delete_archived_measures(sensor_id):
+    for partition in MeasurePartitionModel.objects.filter(archived_at__isnull=False):
+        path = sensor_file(partition.month, sensor_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def convert_legacy_archive():
+    """
+    Replaces the pn and sn columns of files archived before the compact format
+    with identity_id, and adds the columns added to MeasuresModel since.
+    Does nothing once every file is converted.
+    """
+    from .models import InstrumentIdentityModel
+
+    converted = 0
+    for path in glob.glob(os.path.join(get_archive_dir(), '*', '*.parquet')):
+        if set(pq.read_schema(path).names) >= set(COLUMNS):
+            continue
+        frame = pd.read_parquet(path, engine='pyarrow')
+        if 'pn' in frame.columns:
+            identities = {}
+            for pn, sn in frame.loc[frame['pn'].notna(), ['pn', 'sn']].drop_duplicates().itertuples(index=False):
+                identities[(pn, sn)] = InstrumentIdentityModel.objects.get_or_create(pn=pn, sn=sn)[0].id
+            frame['identity_id'] = [identities.get((pn, sn)) if pd.notna(pn) else None for pn, sn in zip(frame['pn'], frame['sn'])]
+        frame = frame.reindex(columns=list(COLUMNS))
+        _write_frame(frame.astype(_DTYPES), path)
+        converted += 1
+    if converted:
+        print(f"archive.convert_legacy_archive: {converted} archive files converted to the current format")
+    return converted
+
+
+_COMPARISONS = {'lt': operator.lt, 'lte': operator.le, 'gt': operator.gt, 'gte': operator.ge}
+
+
+def _lookup_fields(*args, **filters):
+    fields = {lookup.split('__')[0] for lookup in filters}
+    for q in args:
+        for child in q.children:
+            fields |= _lookup_fields(child) if isinstance(child, Q) else {child[0].split('__')[0]}
+    return fields
+
+
+def _condition(frame, lookup, value):
+    """Boolean mask of the Django lookups used by the history queries."""
+    field, *parts = lookup.split('__')
+    column = frame[field]
+    if field == 'date':
+        # week_day and time are evaluated in the current time zone, like Django does
+        column = column.dt.tz_convert(timezone.get_current_timezone())
+        if parts and parts[0] == 'week_day':
+            parts.pop(0)
+            column = (column.dt.dayofweek + 1) % 7 + 1
+        elif parts and parts[0] == 'time':
+            parts.pop(0)
+            column = column.dt.time
+        elif isinstance(value, (list, tuple)):
+            value = [pd.Timestamp(_aware(item)) for item in value]
+        elif isinstance(value, datetime):
+            value = pd.Timestamp(_aware(value))
+
+    lookup_type = parts[0] if parts else 'exact'
+    if lookup_type == 'exact':
+        return column.isna() if value is None else column == value
+    if lookup_type == 'in':
+        return column.isin(list(value))
+    if lookup_type == 'isnull':
+        return column.isna() if value else column.notna()
+    if lookup_type == 'range':
+        return (column >= value[0]) & (column <= value[1])
+    if lookup_type in _COMPARISONS:
+        return _COMPARISONS[lookup_type](column, value).fillna(False).astype(bool)
+    raise ValueError(f"Lookup not supported on archived measurements: {lookup}")
+
+
+def _q_mask(frame, q):
+    masks = [_q_mask(frame, child) if isinstance(child, Q) else _condition(frame, *child) for child in q.children]
+    mask = reduce((lambda a, b: a | b) if q.connector == Q.OR else (lambda a, b: a & b), masks)
+    return ~mask if q.negated else mask
+
+
+def _filter_sensor_ids(filters):
+    """Sensors whose files can match, None when every file must be read."""
+    if filters.get('sensor_id') is not None:
+        return [filters['sensor_id']]
+    if 'sensor_id__in' in filters:
+        return list(filters['sensor_id__in'])
+    if filters.get('instrument_id') is not None:
+        return list(SensorModel.objects.filter(instrument_id=filters['instrument_id']).values_list('id', flat=True))
+    return None
+
+
+def read_archive(start=None, end=None, *args, columns=None, **filters):
+    """
+    Archived measurements with start <= date <= end matching the lookups, as a
+    DataFrame sorted by date. Only the months, sensors, row groups and columns
+    the query needs are read.
+    """
+    columns = list(columns or COLUMNS)
+    partitions = MeasurePartitionModel.objects.filter(archived_at__isnull=False)
+    if start:
+        partitions = partitions.filter(month__gte=month_of(start))
+    if end:
+        partitions = partitions.filter(month__lte=month_of(end))
+    months = list(partitions.values_list('month', flat=True))
+    if not months:
+        return pd.DataFrame({column: pd.Series(dtype=_DTYPES.get(column, 'datetime64[us, UTC]')) for column in columns})
+
+    read_columns = sorted(set(columns) | _lookup_fields(*args, **filters) | {'date'}, key=COLUMNS.index)
+    date_filters = []
+    if start:
+        date_filters.append(('date', '>=', pd.Timestamp(_aware(start))))
+    if end:
+        date_filters.append(('date', '<=', pd.Timestamp(_aware(end))))
+    sensor_ids = _filter_sensor_ids(filters)
+
+    frames = []
+    for month in months:
+        if sensor_ids is None:
+            paths = sorted(glob.glob(os.path.join(month_dir(month), '*.parquet')))
+        else:
+            paths = [sensor_file(month, sensor_id) for sensor_id in sensor_ids]
+        for path in paths:
+            if os.path.exists(path):
+                frames.append(pd.read_parquet(path, engine='pyarrow', columns=read_columns, filters=date_filters or None))
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=_DTYPES.get(column, 'datetime64[us, UTC]')) for column in columns})
+
+    frame = pd.concat(frames, ignore_index=True)
+    mask = pd.Series(True, index=frame.index)
+    for q in args:
+        mask &= _q_mask(frame, q)
+    for lookup, value in filters.items():
+        mask &= _condition(frame, lookup, value)
+    return frame.loc[mask, columns].sort_values('date', kind='stable', ignore_index=True) if 'date' in columns \
+        else frame.loc[mask, columns].reset_index(drop=True)
+
+
+def iterate_archive(start=None, end=None, *args, order='date', fields=None, **filters):
+    """Rows of read_archive in date order, as ArchivedMeasure or as tuples of fields."""
+    frame = read_archive(start, end, *args, columns=fields or COLUMNS, **filters)
+    if order.startswith('-'):
+        frame = frame.iloc[::-1]
+    frame = frame.astype(object).where(frame.notna(), None)
+    rows = frame.itertuples(index=False, name=None)
+    return rows if fields else (ArchivedMeasure._make(row) for row in rows)
+
+
+def rewrite_corrections(sensor_id, calibration, start=None, end=None):
+    """
+    Recomputes the corrected values of a sensor in the archived months of
+    [start, end] with a compiled calibration (None clears them).
+    """
+    rows = 0
+    partitions = MeasurePartitionModel.objects.filter(archived_at__isnull=False)
+    if start:
+        partitions = partitions.filter(month__gte=month_of(start))
+    if end:
+        partitions = partitions.filter(month__lte=month_of(end))
+    for partition in partitions:
+        path = sensor_file(partition.month, sensor_id)
+        if not os.path.exists(path):
+            continue
+        frame = pd.read_parquet(path, engine='pyarrow')
+        selected = np.ones(len(frame), dtype=bool)
+        if start:
+            selected &= (frame['date'] >= pd.Timestamp(_aware(start))).to_numpy()
+        if end:
+            selected &= (frame['date'] <= pd.Timestamp(_aware(end))).to_numpy()
+        for measurement_type, column, corrected_column in CORRECTIONS:
+            if calibration:
+                frame.loc[selected, corrected_column] = calibration.correct_array(measurement_type, frame.loc[selected, column].to_numpy())
+            else:
+                frame.loc[selected, corrected_column] = np.nan
+        _write_frame(frame, path)
+        rows += int(selected.sum())
+    return rows
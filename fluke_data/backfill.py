@@ -0,0 +1,150 @@
+# fluke_data/backfill.py
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max
+from django.utils import timezone
+
+from thermohygrometer.calibration import get_compiled_calibration
+
+from .ingest import upsert_measures
+from .models import MeasuresModel, SensorModel
+from .partitions import measure_querysets
+
+
+class MemoryBackfill:
+    """
+    Fills the gaps in MeasuresModel with the readings stored in the DewK 1620A
+    memory while the server or the network was down.
+
+    Records are read from the newest to the oldest in chunks, each chunk being
+    one pipelined exchange in the instrument lane, so live polling keeps its
+    turn between two chunks. Reading stops as soon as a chunk reaches history
+    that is already in the database.
+    """
+    CHUNK_SIZE = 100
+    BATCH_SIZE = 500
+
+    _running = {}
+    stats = {}
+
+    def __init__(self, acquisition):
+        self.acquisition = acquisition
+        self.thermohygrometer_id = acquisition.thermohygrometer_id
+
+    @staticmethod
+    def start(acquisition):
+        """Starts a backfill for the acquisition unless one is already running."""
+        task = MemoryBackfill._running.get(acquisition.thermohygrometer_id)
+        if task and not task.done():
+            return task
+        task = asyncio.create_task(MemoryBackfill(acquisition).run())
+        MemoryBackfill._running[acquisition.thermohygrometer_id] = task
+        return task
+
+    async def run(self):
+        started_at = time.monotonic()
+        scanned = 0
+        inserted = 0
+        try:
+            sensors = await sync_to_async(list)(
+                SensorModel.objects.filter(instrument_id=self.thermohygrometer_id).select_related('calibration_certificate')
+            )
+            if not sensors:
+                return
+            cutoff = await sync_to_async(self.get_last_saved_date)(sensors)
+            index = await self.acquisition.call_instrument('get_stored_record_count')
+
+            while index >= 1 and self.acquisition.running:
+                first_index = max(1, index - self.CHUNK_SIZE + 1)
+                raw_records = await self.acquisition.call_instrument(
+                    'read_stored_records', first_index, index - first_index + 1
+                )
+                records = self.parse_records(raw_records)
+                scanned += len(raw_records)
+
+                new_records = [record for record in records if cutoff is None or record['date'] > cutoff]
+                inserted += await sync_to_async(self.save_records)(new_records, sensors)
+
+                if len(new_records) < len(records):
+                    break  # Reached readings that were already saved
+                index = first_index - 1
+        except Exception as e:
+            print(f"backfill.run: Error backfilling thermohygrometer {self.thermohygrometer_id}: {str(e)}")
+        finally:
+            elapsed = time.monotonic() - started_at
+            records_per_second = round(scanned / elapsed, 1) if elapsed > 0 else 0.0
+            MemoryBackfill.stats[str(self.thermohygrometer_id)] = {
+                'finished_at': timezone.now().isoformat(),
+                'records_scanned': scanned,
+                'records_inserted': inserted,
+                'elapsed_s': round(elapsed, 2),
+                'records_per_second': records_per_second,
+            }
+            print(f"backfill.run: Thermohygrometer {self.thermohygrometer_id}: {scanned} records scanned, "
+                  f"{inserted} inserted, {records_per_second} records/s")
+
+    def parse_records(self, raw_records):
+        records = []
+        for raw_record in raw_records:
+            record = self.acquisition.instrument._parse_stored_record(raw_record)
+            if record:
+                record['date'] = timezone.make_aware(record['date'])
+                records.append(record)
+        return records
+
+    @staticmethod
+    def get_last_saved_date(sensors):
+        dates = [
+            queryset.aggregate(last=Max('date'))['last']
+            for queryset in measure_querysets(sensor_id__in=[sensor.id for sensor in sensors])
+        ]
+        return max((date for date in dates if date), default=None)
+
+    def save_records(self, records, sensors):
+        if not records:
+            return 0
+        first_date = min(record['date'] for record in records)
+        last_date = max(record['date'] for record in records)
+        measures = []
+
+        for sensor in sensors:
+            existing_dates = set(
+                date
+                for queryset in measure_querysets(first_date, last_date, sensor_id=sensor.id)
+                for date in queryset.values_list('date', flat=True)
+            )
+            rows = [
+                (record['date'], record[sensor.channel]['temperature'], record[sensor.channel]['humidity'])
+                for record in records
+                if record.get(sensor.channel) and record['date'] not in existing_dates
+            ]
+            if not rows:
+                continue
+            dates, temperatures, humidities = zip(*rows)
+            certificate = sensor.calibration_certificate
+            if certificate:
+                # The whole chunk is corrected at once with the compiled curves
+                calibration = get_compiled_calibration(certificate)
+                corrected_temperatures = calibration.correct_array('temperature', temperatures).tolist()
+                corrected_humidities = calibration.correct_array('humidity', humidities).tolist()
+            else:
+                corrected_temperatures = corrected_humidities = [None] * len(rows)
+            measures.extend(
+                MeasuresModel(
+                    instrument_id=self.thermohygrometer_id,
+                    sensor=sensor,
+                    temperature=temperature,
+                    corrected_temperature=corrected_temperature,
+                    humidity=humidity,
+                    corrected_humidity=corrected_humidity,
+                    date=date,
+                )
+                for date, temperature, corrected_temperature, humidity, corrected_humidity
+                in zip(dates, temperatures, corrected_temperatures, humidities, corrected_humidities)
+            )
+
+        # The live acquisition may have saved some of the same readings meanwhile
+        return upsert_measures(measures, batch_size=self.BATCH_SIZE)['created']
@@ -0,0 +1,255 @@
+# fluke_data/compression.py
+
+from datetime import timedelta
+
+
+class MeasureCompressor:
+    """
+    Decides which of the readings polled from one sensor are stored.
+
+    Every reading is offered with add(); the readings to store are returned.
+    A reading is stored when the signal leaves the stored trend by more than
+    the tolerance of one of its values:
+
+    - deadband: the trend is the last stored value, held flat;
+    - swinging_door: the trend is a line from the last stored reading, kept
+      as long as one line fits every reading since within the tolerances.
+
+    When a reading changes the limit state (inside/outside the configured
+    limits), the reading before it and the reading itself are always
+    stored, so an excursion keeps its boundaries. A reading is also stored
+    when max_interval has passed without any, so a steady signal is not
+    mistaken for missing data.
+
+    Linear interpolation between the stored readings (see resample)
+    reconstructs the signal to about the tolerances.
+    """
+
+    MODES = ('deadband', 'swinging_door')
+
+    def __init__(self, mode, tolerances, max_interval):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown compression mode: {mode}")
+        self.mode = mode
+        self.tolerances = tuple(tolerances)
+        self.max_interval = max_interval
+        self.stored = None  # (date, values) of the last stored reading
+        self.previous = None  # (date, values, state, reading) of the last reading offered
+        self.previous_stored = False
+        self.upper = None
+        self.lower = None
+
+    def add(self, date, values, state, reading):
+        """Offers a reading; returns the readings to store, oldest first."""
+        values = tuple(values)
+        if self.stored is None:
+            return self._store(date, values, state, reading)
+
+        to_store = []
+        if self._leaves_trend(date, values):
+            if self.previous_stored:
+                return self._store(date, values, state, reading)
+            # The reading before the departure ends the trend and starts the next one
+            to_store.append(self.previous[3])
+            self._restart(self.previous[0], self.previous[1])
+            self.previous_stored = True
+            if self._leaves_trend(date, values):
+                return to_store + self._store(date, values, state, reading)
+
+        if state != self.previous[2]:
+            if not self.previous_stored:
+                to_store.append(self.previous[3])
+            return to_store + self._store(date, values, state, reading)
+        if date - self.stored[0] >= self.max_interval:
+            return to_store + self._store(date, values, state, reading)
+
+        self.previous = (date, values, state, reading)
+        self.previous_stored = False
+        return to_store
+
+    def flush(self):
+        """The last reading if it was not stored, e.g. when the acquisition stops."""
+        if self.previous is None or self.previous_stored:
+            return []
+        self.previous_stored = True
+        return [self.previous[3]]
+
+    def _store(self, date, values, state, reading):
+        self._restart(date, values)
+        self.previous = (date, values, state, reading)
+        self.previous_stored = True
+        return [reading]
+
+    def _restart(self, date, values):
+        self.stored = (date, values)
+        self.upper = [float('inf')] * len(values)
+        self.lower = [float('-inf')] * len(values)
+
+    def _leaves_trend(self, date, values):
+        stored_date, stored_values = self.stored
+        if self.mode == 'deadband':
+            return any(
+                value is not None and origin is not None and abs(value - origin) > tolerance
+                for value, origin, tolerance in zip(values, stored_values, self.tolerances)
+            )
+
+        elapsed = (date - stored_date).total_seconds()
+        if elapsed <= 0:
+            return False
+        closed = False
+        for i, (value, origin, tolerance) in enumerate(zip(values, stored_values, self.tolerances)):
+            if value is None or origin is None:
+                continue
+            # Narrow the slopes that keep every reading within the tolerance
+            self.upper[i] = min(self.upper[i], (value + tolerance - origin) / elapsed)
+            self.lower[i] = max(self.lower[i], (value - tolerance - origin) / elapsed)
+            closed = closed or self.lower[i] > self.upper[i]
+        return closed
+
+
+def _interpolate(points, dates, max_gap=None):
+    points = iter(points)
+    before = after = next(points, None)
+    for date in dates:
+        while after is not None and after[0] < date:
+            before, after = after, next(points, None)
+        if after is None or before[0] > date:
+            yield None
+        elif after[0] == date:
+            yield after[1]
+        elif max_gap is not None and after[0] - before[0] > max_gap:
+            yield None
+        else:
+            fraction = (date - before[0]) / (after[0] - before[0])
+            yield before[1] + (after[1] - before[1]) * fraction
+
+
+def resample(points, start, end, step, max_gap):
+    """
+    Stored points (date, value) reconstructed every step from start to end.
+    Steps inside a gap longer than max_gap between stored points give None.
+    """
+    dates = []
+    date = start
+    while date <= end:
+        dates.append(date)
+        date += step
+    return list(zip(dates, _interpolate(points, dates, max_gap)))
+
+
+def time_out_of_limits(points, low, high, windows, max_gap):
+    """
+    Time the linear interpolation of the stored points (date, value) spends
+    below low or above high (either may be None) inside the sorted, non
+    overlapping windows (start, end). Gaps longer than max_gap between stored
+    points count as no data.
+    """
+    out = timedelta(0)
+    windows = list(windows)
+    first_window = 0
+    previous = None
+    for point in points:
+        if previous is not None and timedelta(0) < point[0] - previous[0] <= max_gap:
+            while first_window < len(windows) and windows[first_window][1] <= previous[0]:
+                first_window += 1
+            for window_start, window_end in windows[first_window:]:
+                if window_start >= point[0]:
+                    break
+                start = max(previous[0], window_start)
+                end = min(point[0], window_end)
+                if end > start:
+                    out += (end - start) * _fraction_out(
+                        _value_at(previous, point, start), _value_at(previous, point, end), low, high
+                    )
+        previous = point
+    return out
+
+
+def limit_value(value, minimum, maximum, low, high, sample_count=None):
+    """
+    Value of a stored row to compare with the limits [low, high]. A row
+    summarizing several readings (see MeasureAggregator) holds their mean,
+    which hides an excursion: its minimum or maximum is used instead when it
+    is out of the limits.
+    """
+    if sample_count is None or sample_count <= 1:
+        return value
+    if low is not None and minimum is not None and minimum < low:
+        return minimum
+    if high is not None and maximum is not None and maximum > high:
+        return maximum
+    return value
+
+
+def _value_at(before, after, date):
+    return before[1] + (after[1] - before[1]) * ((date - before[0]) / (after[0] - before[0]))
+
+
+def _fraction_out(first, last, low, high):
+    """Fraction of a linear segment from first to last outside [low, high]."""
+    fraction = 0.0
+    if first == last:
+        return 1.0 if (low is not None and first < low) or (high is not None and first > high) else 0.0
+    if low is not None:
+        crossing = min(max((low - first) / (last - first), 0.0), 1.0)
+        fraction += crossing if last > first else 1.0 - crossing
+    if high is not None:
+        crossing = min(max((high - first) / (last - first), 0.0), 1.0)
+        fraction += 1.0 - crossing if last > first else crossing
+    return fraction
+
+
+class MeasureAggregator:
+    """
+    Running statistics of the readings polled from one sensor during a save
+    interval, summarized in one stored row when the interval closes.
+
+    Only the count, minimum, maximum and sum of each value and the date of
+    the last reading are kept, so memory does not grow with the poll rate.
+    Values given as None (e.g. corrected values without a calibration
+    certificate) are left out of their statistics.
+    """
+
+    def __init__(self, fields, interval):
+        self.fields = tuple(fields)
+        self.interval = interval
+        self.start = None
+        self._reset()
+
+    def add(self, date, values):
+        """Offers a reading; returns the summary of the interval when the reading closes it."""
+        if self.start is None:
+            self.start = date
+        self.count += 1
+        self.last = date
+        for field, value in zip(self.fields, values):
+            if value is None:
+                continue
+            stats = self.stats[field]
+            stats[0] += 1
+            stats[1] = value if stats[1] is None else min(stats[1], value)
+            stats[2] = value if stats[2] is None else max(stats[2], value)
+            stats[3] += value
+        if date - self.start < self.interval:
+            return None
+        summary = self.flush()
+        self.start = date
+        return summary
+
+    def flush(self):
+        """Summary of the readings of the open interval, if any, e.g. when the acquisition stops."""
+        if not self.count:
+            return None
+        summary = {'date': self.last, 'sample_count': self.count}
+        for field, (count, low, high, total) in self.stats.items():
+            summary[field] = total / count if count else None
+            summary[f"{field}_min"] = low
+            summary[f"{field}_max"] = high
+        self.start = None
+        self._reset()
+        return summary
+
+    def _reset(self):
+        self.count = 0
+        self.last = None
+        self.stats = {field: [0, None, None, 0.0] for field in self.fields}
@@ -1,65 +1,306 @@
 import asyncio
+import random
+import time
 
 from asgiref.sync import sync_to_async
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.utils import timezone
 
+from .acquisition import AcquisitionManager
+from .backfill import MemoryBackfill
 from .models import ThermohygrometerModel
-from .visa_communication import Instrument
 
 
 class InstrumentConnectionManager:
+    # Instruments kept alive by the manager, independent of WebSocket viewers
+    _held_instruments = set()
+    scheduler = None
+    _task = None
+
     @staticmethod
     async def connect_to_instrument(thermo):
+        if thermo.id in InstrumentConnectionManager._held_instruments:
+            return AcquisitionManager.get(thermo.id)
+        attempted_at = timezone.now()
         try:
-            instrument = await sync_to_async(Instrument)(thermo.ip_address)
-            if instrument.instrument:
-                await sync_to_async(thermo.save)()
+            acquisition = await AcquisitionManager.subscribe(thermo.id)
+            if acquisition:
+                InstrumentConnectionManager._held_instruments.add(thermo.id)
                 await sync_to_async(ThermohygrometerModel.objects.filter(id=thermo.id).update)(
                     is_connected=True,
-                    last_connection_attempt=timezone.now()
+                    last_connection_attempt=attempted_at
                 )
                 channel_layer = get_channel_layer()
+                # The group of the DataConsumers, named after the instrument and not the configured group_name
                 await channel_layer.group_send(
-                    f"thermohygrometer_{thermo.group_name}",
+                    acquisition.group_name,
                     {"type": "instrument_connected", "thermohygrometer_id": thermo.id}
                 )
                 print(f"InstrumentConnectionManager.connect_to_instrument: Connected to {thermo.instrument_name}")
-                asyncio.create_task(InstrumentConnectionManager.send_data_loop(instrument, thermo))
-                return instrument
+                # Recover the readings stored by the instrument while it was unreachable
+                MemoryBackfill.start(acquisition)
+                return acquisition
         except Exception as e:
             print(f"connection_manager.connect_to_instrument: Error connecting to {thermo.instrument_name}: {str(e)}")
+        await sync_to_async(ThermohygrometerModel.objects.filter(id=thermo.id).update)(
+            is_connected=False,
+            last_connection_attempt=attempted_at
+        )
         return None
 
     @staticmethod
-    async def send_data_loop(instrument, thermo):
-        channel_layer = get_channel_layer()
-        while True:
-            try:
-                data = await sync_to_async(instrument.get_data)()
-                if data:
-                    await channel_layer.group_send(
-                        f'thermo_{thermo.id}',
-                        {
-                            "type": "send_data_to_listeners",
-                            "message": data
-                        }
-                    )
-            except Exception as e:
-                print(f"connection_manager.send_data_loop: Error getting data from {thermo.instrument_name}: {str(e)}")
-                break
-            await asyncio.sleep(1)  # Adjust the interval as needed
+    async def disconnect_instrument(thermo):
+        if thermo.id in InstrumentConnectionManager._held_instruments:
+            InstrumentConnectionManager._held_instruments.discard(thermo.id)
+            await AcquisitionManager.unsubscribe(thermo.id)
+
+    @staticmethod
+    async def release(thermohygrometer_id):
+        """
+        Called by the acquisition when the link of an instrument is lost: the hold
+        is dropped and the instrument goes back to the scheduler's backoff.
+        """
+        if thermohygrometer_id not in InstrumentConnectionManager._held_instruments:
+            return
+        InstrumentConnectionManager._held_instruments.discard(thermohygrometer_id)
+        scheduler = InstrumentConnectionManager.scheduler
+        if scheduler:
+            await scheduler.save_failures(thermohygrometer_id, scheduler.record_link_lost(thermohygrometer_id))
+        await AcquisitionManager.unsubscribe(thermohygrometer_id)
 
     @staticmethod
     async def connect_all_instruments():
-        from pyvisa import errors as visa_errors
+        InstrumentConnectionManager.scheduler = ReconnectScheduler()
+        await InstrumentConnectionManager.scheduler.run()
+
+    @staticmethod
+    def start():
+        """
+        Runs connect_all_instruments on the running event loop, once per
+        process, when AUTO_CONNECT_ON_STARTUP is set. Called by
+        ConnectionManagerMiddleware, so the scheduler shares the loop of the
+        acquisitions and the consumers.
+        """
+        if InstrumentConnectionManager._task is not None or not getattr(settings, 'AUTO_CONNECT_ON_STARTUP', False):
+            return
+        task = InstrumentConnectionManager._task = asyncio.get_running_loop().create_task(
+            InstrumentConnectionManager.connect_all_instruments()
+        )
+        task.add_done_callback(InstrumentConnectionManager._stopped)
+
+    @staticmethod
+    def _stopped(task):
+        # The next request starts the scheduler again
+        InstrumentConnectionManager._task = None
+        InstrumentConnectionManager.scheduler = None
+        if not task.cancelled() and task.exception():
+            print(f"connection_manager.connect_all_instruments: Error: {task.exception()}")
+
+
+class ConnectionManagerMiddleware:
+    """ASGI middleware that starts the instrument connection manager with the server."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        InstrumentConnectionManager.start()
+        return await self.inner(scope, receive, send)
+
+
+class ReconnectState:
+    """Backoff and circuit-breaker state of one instrument."""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, next_attempt):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.next_attempt = next_attempt
+
+    def as_dict(self, now):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'next_attempt_in_s': round(max(0.0, self.next_attempt - now), 1),
+        }
+
+
+class ReconnectScheduler:
+    """
+    Keeps every registered thermohygrometer connected.
+
+    Attempts run concurrently, at most `max_concurrency` at a time, so one dead
+    IP never delays the others. Each failure doubles the wait before the next
+    attempt (with jitter, so the fleet does not retry in lockstep). After
+    FAILURE_THRESHOLD failures in a row the circuit opens and the instrument is
+    only probed every OPEN_DELAY seconds. Meanwhile one open circuit is probed
+    every CANARY_INTERVAL seconds; when an instrument that was failing connects
+    again the network is probably back, so every open circuit is probed right
+    away instead of waiting for its own timer.
+
+    The time of each attempt is persisted in last_connection_attempt and the
+    failures in a row in connection_failures, so after a restart each
+    instrument resumes its backoff or open circuit (see restore_state)
+    instead of the whole fleet being probed at once. A held instrument whose
+    link is lost (see InstrumentAcquisition.link_lost) comes back here as a
+    failure.
+    """
+    SCAN_INTERVAL = 1  # seconds between two checks for due attempts
+    REFRESH_INTERVAL = 60  # seconds between two reloads of the instrument list
+    BASE_DELAY = 2
+    MAX_DELAY = 120
+    FAILURE_THRESHOLD = 5
+    OPEN_DELAY = 300
+    CANARY_INTERVAL = 5  # seconds between two early probes of an open circuit
+    RECOVERY_SPREAD = 2  # seconds over which open circuits are probed after a recovery
+
+    def __init__(self, max_concurrency=None):
+        if max_concurrency is None:
+            max_concurrency = getattr(settings, 'INSTRUMENT_RECONNECT_CONCURRENCY', 50)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.states = {}
+        self.tasks = {}
+        self.thermos = []
+        self.attempts = 0
+        self.successes = 0
+        self.links_lost = 0
+
+    async def run(self):
+        next_refresh = 0
+        next_canary = 0
         while True:
-            thermos = await sync_to_async(list)(ThermohygrometerModel.objects.all())
-            
-            for thermo in thermos:
-                try:
-                    await InstrumentConnectionManager.connect_to_instrument(thermo)
-                except visa_errors.VisaIOError:
-                    print(f'{thermo} already connected.')
-            await asyncio.sleep(60)  # Wait for 1 minute before the next connection attempt
+            now = time.monotonic()
+            if now >= next_refresh:
+                self.thermos = await sync_to_async(list)(ThermohygrometerModel.objects.all())
+                registered = {thermo.id for thermo in self.thermos}
+                for thermohygrometer_id in list(self.states):
+                    if thermohygrometer_id not in registered:
+                        del self.states[thermohygrometer_id]
+                next_refresh = now + self.REFRESH_INTERVAL
+            if now >= next_canary:
+                self.probe_canary(now)
+                next_canary = now + self.CANARY_INTERVAL
+            self.schedule_due_attempts(now)
+            await asyncio.sleep(self.SCAN_INTERVAL)
+
+    def schedule_due_attempts(self, now):
+        for thermo in self.thermos:
+            if thermo.id in InstrumentConnectionManager._held_instruments or thermo.id in self.tasks:
+                continue
+            state = self.states.get(thermo.id)
+            if state is None:
+                state = self.states[thermo.id] = self.restore_state(thermo, now)
+            if state.next_attempt <= now:
+                self.tasks[thermo.id] = asyncio.create_task(self.attempt(thermo, state))
+
+    def restore_state(self, thermo, now):
+        """
+        State of an instrument seen for the first time. The failures saved by
+        a previous run put it back in its backoff or open circuit, counted
+        from its last attempt; the others are attempted within SCAN_INTERVAL,
+        spread so a large fleet does not connect in one burst.
+        """
+        state = ReconnectState(now + random.uniform(0, self.SCAN_INTERVAL))
+        state.failures = thermo.connection_failures
+        if state.failures and thermo.last_connection_attempt:
+            elapsed = (timezone.now() - thermo.last_connection_attempt).total_seconds()
+            state.next_attempt = max(state.next_attempt, now + self.backoff(state) - elapsed)
+        return state
+
+    async def attempt(self, thermo, state):
+        failures = state.failures
+        try:
+            async with self.semaphore:
+                if state.state == ReconnectState.OPEN:
+                    state.state = ReconnectState.HALF_OPEN
+                self.attempts += 1
+                acquisition = await InstrumentConnectionManager.connect_to_instrument(thermo)
+            if acquisition:
+                self.record_success(state)
+            else:
+                self.record_failure(state)
+        except Exception as e:
+            print(f"connection_manager.attempt: Error reconnecting {thermo.instrument_name}: {str(e)}")
+            self.record_failure(state)
+        finally:
+            self.tasks.pop(thermo.id, None)
+        if state.failures != failures:
+            await self.save_failures(thermo.id, state)
+
+    @staticmethod
+    async def save_failures(thermohygrometer_id, state):
+        try:
+            await sync_to_async(ThermohygrometerModel.objects.filter(id=thermohygrometer_id).update)(
+                connection_failures=state.failures
+            )
+        except Exception as e:
+            print(f"connection_manager.save_failures: Error saving the failures of {thermohygrometer_id}: {str(e)}")
+
+    def record_success(self, state):
+        recovered = state.failures > 0
+        self.successes += 1
+        state.state = ReconnectState.CLOSED
+        state.failures = 0
+        if recovered:
+            self.probe_open_circuits()
+
+    def record_failure(self, state):
+        state.failures += 1
+        state.next_attempt = time.monotonic() + self.backoff(state)
+
+    def backoff(self, state):
+        """Seconds from a failed attempt to the next one; opens the circuit once it is due."""
+        if state.state == ReconnectState.HALF_OPEN or state.failures >= self.FAILURE_THRESHOLD:
+            state.state = ReconnectState.OPEN
+            delay = self.OPEN_DELAY
+        else:
+            delay = min(self.MAX_DELAY, self.BASE_DELAY * 2 ** (state.failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def record_link_lost(self, thermohygrometer_id):
+        # A lost link counts as a failed attempt, the reconnection backs off from there
+        self.links_lost += 1
+        state = self.states.get(thermohygrometer_id)
+        if state is None:
+            state = self.states[thermohygrometer_id] = ReconnectState(time.monotonic())
+        self.record_failure(state)
+        return state
+
+    def probe_canary(self, now):
+        """Brings forward the open circuit that has waited the longest."""
+        open_states = [
+            state for thermohygrometer_id, state in self.states.items()
+            if state.state == ReconnectState.OPEN and thermohygrometer_id not in self.tasks
+        ]
+        if open_states:
+            min(open_states, key=lambda state: state.next_attempt).next_attempt = now
+
+    def probe_open_circuits(self):
+        now = time.monotonic()
+        for state in self.states.values():
+            if state.failures and state.next_attempt > now + self.RECOVERY_SPREAD:
+                state.next_attempt = now + random.uniform(0, self.RECOVERY_SPREAD)
 
+    def stats(self):
+        # Reads the scheduler state unlocked: call it on the event loop
+        now = time.monotonic()
+        states = [state.state for state in self.states.values()]
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_progress': len(self.tasks),
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'links_lost': self.links_lost,
+            'connected': len(InstrumentConnectionManager._held_instruments),
+            'closed': states.count(ReconnectState.CLOSED),
+            'open': states.count(ReconnectState.OPEN),
+            'half_open': states.count(ReconnectState.HALF_OPEN),
+            'instruments': {
+                str(thermohygrometer_id): state.as_dict(now)
+                for thermohygrometer_id, state in self.states.items() if state.failures
+            },
+        }
@@ -0,0 +1,370 @@
+# fluke_data/fanout.py
+
+import asyncio
+import functools
+import json
+import struct
+import time
+from datetime import datetime
+
+from django.utils import timezone
+
+# WebSocket subprotocol a client offers to receive readings as binary frames
+BINARY_SUBPROTOCOL = 'fluke.binary.v1'
+
+# Binary reading, little-endian: frame type (1), flags, sensor id, epoch seconds, then
+# temperature, humidity, corrected temperature and corrected humidity in hundredths
+BINARY_READING = struct.Struct('<BBIIhhhh')
+BINARY_READING_TYPE = 1
+NO_VALUE = -32768  # Corrected values without a calibration certificate
+# Flags: the value is outside its limits (its style is 'red'); no calibration certificate
+FLAG_STYLES = (
+    (0x01, 'temperature_style'),
+    (0x02, 'humidity_style'),
+    (0x04, 'corrected_temperature_style'),
+    (0x08, 'corrected_humidity_style'),
+)
+FLAG_NO_CALIBRATION = 0x10
+
+# Scope key of the send callable of the server, see TransportSendMiddleware
+TRANSPORT_SEND_SCOPE_KEY = 'fluke.transport_send'
+
+
+class LiveFanout:
+    """
+    Process-wide fanout of the live readings to the WebSocket consumers.
+
+    InstrumentAcquisition encodes each reading once and publishes the frame
+    to groups; every subscriber of those groups is handed the same string
+    or LiveReading.
+    Readings do not go through the channel layer, whose in-memory backend
+    copies each message once per channel and scans every channel of the
+    process on each send and receive, so the cost of a reading grows with
+    the number of open sockets rather than with its subscribers.
+
+    The acquisition and its consumers live in the same process (see
+    AcquisitionManager), so no cross-process delivery is lost.
+    """
+
+    def __init__(self):
+        self.groups = {}  # group name -> set of subscribers
+
+    def subscribe(self, group, subscriber):
+        self.groups.setdefault(group, set()).add(subscriber)
+
+    def unsubscribe(self, group, subscriber):
+        subscribers = self.groups.get(group)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.groups[group]
+
+    def publish(self, groups, frame, key=None):
+        """
+        Hands frame once to every subscriber of any of the groups, also to one
+        subscribed to several of them; returns how many got it. The cost
+        depends on these subscribers only.
+
+        A frame with a key (the sensor id for readings) supersedes the frame
+        with the same key a subscriber has not sent yet.
+        """
+        subscribers = [self.groups[group] for group in groups if group in self.groups]
+        if len(subscribers) > 1:
+            subscribers = [set().union(*subscribers)]
+        count = 0
+        for group_subscribers in subscribers:
+            for subscriber in group_subscribers:
+                subscriber.deliver(frame, key)
+                count += 1
+        return count
+
+    def stats(self):
+        # Reads the subscribers and their queues unlocked: call it on the event loop
+        subscribers = set().union(*self.groups.values())
+        clients = sorted((subscriber.frame_lag() for subscriber in subscribers),
+                         key=lambda client: client['lag_seconds'], reverse=True)
+        return {
+            'groups': len(self.groups),
+            'subscribers': len(subscribers),
+            'pending_frames': sum(client['pending'] for client in clients),
+            'clients': clients,
+        }
+
+
+class LiveReading:
+    """
+    A reading published to the listener groups. Each format is encoded at most
+    once, when the first subscriber that needs it sends it: text is the JSON
+    frame, binary the BINARY_READING frame and metadata the JSON text frame
+    {"sensor": thermo_info} that describes the sensor to binary clients.
+    """
+    __slots__ = ('data', 'info', '_text', '_binary', '_metadata')
+
+    def __init__(self, data, info, text=None):
+        self.data = data
+        self.info = info
+        self._text = text
+        self._binary = None
+        self._metadata = None
+
+    @property
+    def sensor_id(self):
+        return self.info['sensor_id']
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = json.dumps(self.data)
+        return self._text
+
+    @property
+    def binary(self):
+        if self._binary is None:
+            data = self.data
+            flags = 0
+            for flag, style in FLAG_STYLES:
+                if data.get(style) == 'red':
+                    flags |= flag
+            corrected = [data.get('corrected_temperature'), data.get('corrected_humidity')]
+            if not all(isinstance(value, (int, float)) for value in corrected):
+                flags |= FLAG_NO_CALIBRATION
+            date = timezone.make_aware(datetime.strptime(data['date'], '%Y/%m/%d %H:%M:%S'))
+            values = [
+                round(value * 100) if isinstance(value, (int, float)) else NO_VALUE
+                for value in [data['temperature'], data['humidity']] + corrected
+            ]
+            self._binary = BINARY_READING.pack(BINARY_READING_TYPE, flags, self.sensor_id, int(date.timestamp()), *values)
+        return self._binary
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = json.dumps({'sensor': self.info})
+        return self._metadata
+
+
+class TransportSendMiddleware:
+    """
+    Outermost middleware of the WebSocket stack: keeps the send callable of
+    the server in the scope, before other middlewares (e.g. the session one
+    of AuthMiddlewareStack) wrap it, so FrameSubscriber can register
+    TransportFlowControl on the connection behind it.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def __call__(self, scope, receive, send):
+        return await self.inner(dict(scope, **{TRANSPORT_SEND_SCOPE_KEY: send}), receive, send)
+
+
+class TransportFlowControl:
+    """
+    Streaming push producer registered on the transport of a WebSocket client.
+
+    daphne's send() returns as soon as the frame is written to the Twisted
+    transport, which buffers whatever the socket does not take. The
+    transport calls pauseProducing() once its buffer is over bufferSize and
+    resumeProducing() when it has drained; writable follows these calls.
+    Twisted runs on daphne's asyncio loop, so they come from the loop too.
+
+    daphne leaves the HTTP channel of the upgrade request registered as the
+    producer of the transport (it stops reading from a client whose buffer
+    is full); it is replaced, and still gets the same calls.
+    """
+
+    def __init__(self, transport, previous=None):
+        self.transport = transport
+        self.previous = previous
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.pauses = 0
+
+    @classmethod
+    def register(cls, send):
+        """
+        Registers flow control on the transport behind an ASGI send callable,
+        daphne's partial(handle_reply, protocol); returns None for servers whose
+        send already waits for the socket, or when it cannot be registered.
+        """
+        connection = send.args[0] if isinstance(send, functools.partial) and send.args else None
+        transport = getattr(connection, 'transport', None)
+        if not callable(getattr(transport, 'registerProducer', None)):
+            return None
+        previous = getattr(transport, 'producer', None)
+        flow_control = cls(transport, previous)
+        try:
+            if previous is not None:
+                transport.unregisterProducer()
+            transport.registerProducer(flow_control, True)
+        except Exception as e:
+            print(f"fanout.TransportFlowControl.register: Error registering flow control: {str(e)}")
+            return None
+        return flow_control
+
+    def unregister(self):
+        if getattr(self.transport, 'producer', None) is self:
+            self.transport.unregisterProducer()
+            if self.previous is not None and not getattr(self.transport, 'disconnected', False):
+                self.transport.registerProducer(self.previous, True)
+        self.writable.set()
+
+    def pauseProducing(self):
+        if self.writable.is_set():
+            self.pauses += 1
+        self.writable.clear()
+        if self.previous is not None:
+            self.previous.pauseProducing()
+
+    def resumeProducing(self):
+        self.writable.set()
+        if self.previous is not None:
+            self.previous.resumeProducing()
+
+    def stopProducing(self):
+        # The connection is lost, the consumer's disconnect stops the frames
+        self.writable.set()
+        if self.previous is not None:
+            self.previous.stopProducing()
+
+
+class FrameSubscriber:
+    """
+    Consumer side of LiveFanout: frames are queued by deliver() and sent in
+    order by a task of the consumer, so a publish never waits for a socket
+    and a slow client never delays the others.
+
+    A frame is only sent when the connection has room for it: while the
+    transport buffer of the client is full (see TransportFlowControl) the
+    frames stay queued. A client that falls behind only gets the latest
+    value of each sensor: a frame delivered while another of the same key is
+    still pending replaces it, keeping its place in the queue. So the queue
+    holds at most one frame per sensor, and never more than MAX_PENDING
+    frames; the oldest are dropped first. frame_lag() reports how far behind
+    the client is.
+
+    Clients that offer the BINARY_SUBPROTOCOL at connect time get LiveReading
+    frames as BINARY_READING bytes, preceded by the metadata text frame the
+    first time a sensor is sent and whenever its thermo_info changes; the
+    others get the JSON text.
+    """
+    MAX_PENDING = 1000
+
+    async def accept_frames(self):
+        """Accepts the connection, negotiating the frame format, and starts sending frames."""
+        self.binary_frames = BINARY_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        self.described = {}  # sensor id -> thermo_info last sent to a binary client
+        await self.accept(subprotocol=BINARY_SUBPROTOCOL if self.binary_frames else None)
+        self.start_frames()
+
+    def start_frames(self):
+        self.pending = {}  # key -> (frame, monotonic time since a frame of the key is pending)
+        self.frame_stats = {
+            'delivered': 0,
+            'sent': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'last_lag_seconds': 0.0,
+            'max_lag_seconds': 0.0,
+        }
+        self.frames_ready = asyncio.Event()
+        scope = getattr(self, 'scope', {})
+        self.flow_control = TransportFlowControl.register(scope.get(TRANSPORT_SEND_SCOPE_KEY, getattr(self, 'base_send', None)))
+        self.frames_task = asyncio.create_task(self.send_frames())
+
+    async def stop_frames(self):
+        task = getattr(self, 'frames_task', None)
+        if task:
+            task.cancel()
+            self.frames_task = None
+        if getattr(self, 'flow_control', None):
+            self.flow_control.unregister()
+            self.flow_control = None
+
+    def deliver(self, frame, key=None):
+        stats = self.frame_stats
+        stats['delivered'] += 1
+        if key is None:
+            key = object()  # Never superseded
+        queued = self.pending.get(key)
+        if queued is not None:
+            self.pending[key] = (frame, queued[1])
+            stats['coalesced'] += 1
+        else:
+            if len(self.pending) >= self.MAX_PENDING:
+                del self.pending[next(iter(self.pending))]
+                stats['dropped'] += 1
+            self.pending[key] = (frame, time.monotonic())
+        self.frames_ready.set()
+
+    async def send_frames(self):
+        stats = self.frame_stats
+        while True:
+            await self.frames_ready.wait()
+            self.frames_ready.clear()
+            while self.pending:
+                if self.flow_control and not self.flow_control.writable.is_set():
+                    # Frames delivered meanwhile are coalesced with the pending ones
+                    await self.flow_control.writable.wait()
+                    continue
+                frame, pending_since = self.pending.pop(next(iter(self.pending)))
+                try:
+                    await self.send_frame(frame)
+                except Exception as e:
+                    print(f"fanout.send_frames: Error sending frame: {str(e)}")
+                    continue
+                lag = time.monotonic() - pending_since
+                stats['sent'] += 1
+                stats['last_lag_seconds'] = round(lag, 3)
+                stats['max_lag_seconds'] = max(stats['max_lag_seconds'], round(lag, 3))
+
+    def frame_lag(self):
+        """Frame counters of the client; lag_seconds is how long its oldest pending frame has waited."""
+        scope = getattr(self, 'scope', {})
+        oldest = next(iter(self.pending.values()), None)
+        flow_control = getattr(self, 'flow_control', None)
+        return {
+            'consumer': type(self).__name__,
+            'path': scope.get('path'),
+            'client': ':'.join(str(part) for part in scope.get('client') or ()) or None,
+            'pending': len(self.pending),
+            'lag_seconds': round(time.monotonic() - oldest[1], 3) if oldest else 0.0,
+            # None when the server gives no flow control
+            'transport_paused': not flow_control.writable.is_set() if flow_control else None,
+            'transport_pauses': flow_control.pauses if flow_control else None,
+            **self.frame_stats,
+        }
+
+    async def send_frame(self, frame):
+        if isinstance(frame, str):
+            await self.send(text_data=frame)
+        elif getattr(self, 'binary_frames', False):
+            if self.described.get(frame.sensor_id) is not frame.info:
+                await self.send(text_data=frame.metadata)
+                self.described[frame.sensor_id] = frame.info
+            await self.send(bytes_data=frame.binary)
+        else:
+            await self.send(text_data=frame.text)
+
+
+def sensor_group(thermohygrometer_id, sensor_id):
+    return f'thermo_{thermohygrometer_id}_sensor_{sensor_id}'
+
+
+def instrument_group(thermohygrometer_id):
+    return f'thermo_{thermohygrometer_id}'
+
+
+def named_group(group_name):
+    # ThermohygrometerModel.group_name, shared by several instruments
+    return f'thermo_group_{group_name}'
+
+
+_live_fanout = None
+
+
+def get_live_fanout():
+    global _live_fanout
+    if _live_fanout is None:
+        _live_fanout = LiveFanout()
+    return _live_fanout
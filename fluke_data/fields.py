@@ -0,0 +1,99 @@
+# fluke_data/fields.py
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.core import exceptions
+from django.db import models
+from django.db.models import IntegerField, TimeField, Transform
+
+
+class ScaledIntegerField(models.Field):
+    """
+    Float stored as an integer count of 1/scale units (hundredths by default).
+
+    Lookups take floats, and Min, Max, Sum and Avg come back as floats, since
+    the database value is only converted on the way in and out.
+    """
+    description = "Float stored as a scaled integer"
+
+    def __init__(self, *args, scale=100, **kwargs):
+        self.scale = scale
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.scale != 100:
+            kwargs['scale'] = self.scale
+        return name, path, args, kwargs
+
+    def get_internal_type(self):
+        # Expressions convert IntegerField results with int(), which would truncate Avg
+        return 'FloatField'
+
+    def db_type(self, connection):
+        return connection.data_types['IntegerField']
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else value / self.scale
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError(f"'{value}' value must be a float.", code='invalid')
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return None if value is None else round(self.to_python(value) * self.scale)
+
+
+class EpochDateTimeField(models.DateTimeField):
+    """
+    Aware datetime stored as whole seconds since the epoch (UTC).
+
+    It stays a DateTimeField for forms and the admin. Of the transforms,
+    only week_day and time are supported. They are evaluated in UTC, which
+    is the project's TIME_ZONE.
+    """
+    description = "Date and time stored as epoch seconds"
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+    def to_python(self, value):
+        if isinstance(value, int):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        return super().to_python(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return None if value is None else int(value.timestamp() // 1)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        return value if prepared else self.get_prep_value(value)
+
+
+@EpochDateTimeField.register_lookup
+class EpochWeekDay(Transform):
+    """1 (Sunday) to 7 (Saturday), like DateTimeField's week_day."""
+    lookup_name = 'week_day'
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.lhs)
+        return f"(CAST(strftime('%%w', {sql}, 'unixepoch') AS INTEGER) + 1)", params
+
+
+@EpochDateTimeField.register_lookup
+class EpochTime(Transform):
+    lookup_name = 'time'
+    output_field = TimeField()
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.lhs)
+        return f"time({sql}, 'unixepoch')", params
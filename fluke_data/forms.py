@@ -229,6 +229,7 @@ class SensorForm(forms.ModelForm):
             'sensor_pn', 'sensor_sn', 'calibration_certificate',
             'min_temperature', 'max_temperature',
             'min_humidity', 'max_humidity',
+            'storage_mode', 'temperature_tolerance', 'humidity_tolerance',
         ]
         widgets = {
             'sensor_name': forms.TextInput(attrs={'class': 'form-control'}),
@@ -241,4 +242,7 @@ class SensorForm(forms.ModelForm):
             'max_temperature': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
             'min_humidity': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
             'max_humidity': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
+            'storage_mode': forms.Select(attrs={'class': 'form-control'}),
+            'temperature_tolerance': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'humidity_tolerance': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
         }
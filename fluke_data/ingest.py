@@ -0,0 +1,95 @@
+# fluke_data/ingest.py
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .archive import iterate_archive
+from .models import MeasuresModel
+from .partitions import COLUMNS, measure_querysets
+from .rollups import rebuild_rollups, update_rollups
+
+# Columns an upsert may change, the row keeps its id, sensor, date and identity
+UPDATE_FIELDS = tuple(column for column in COLUMNS if column not in ('id', 'sensor_id', 'date', 'identity_id'))
+
+
+def _stored(measure, fields):
+    # The values as read back from the database, so replays compare equal to the stored rows
+    values = []
+    for field in fields:
+        value = getattr(measure, field.attname)
+        if hasattr(field, 'from_db_value') and value is not None:
+            value = field.from_db_value(field.get_prep_value(value), None, connection)
+        values.append(value)
+    return tuple(values)
+
+
+def upsert_measures(measures, batch_size=500):
+    """
+    Writes unsaved MeasuresModel instances, at most one per (sensor, date).
+
+    A measurement whose sensor already has one at the same date (dates are
+    stored in whole seconds) replaces its values where it is stored, in
+    MeasuresModel or in a partition table; identical values are left alone,
+    so replaying a batch writes nothing. Months already archived to Parquet
+    are not rewritten: their existing measurements are skipped. Within the
+    given measurements the last one of a (sensor, date) wins.
+
+    Returns the number of measurements created, updated, unchanged and skipped.
+    """
+    fields = [MeasuresModel._meta.get_field(column) for column in UPDATE_FIELDS]
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+    latest = {}
+    for measure in measures:
+        date = measure.date if timezone.is_aware(measure.date) else timezone.make_aware(measure.date)
+        measure.date = date.replace(microsecond=0)
+        latest[(measure.sensor_id, measure.date)] = measure
+    ordered = sorted(latest.values(), key=lambda measure: measure.date)
+
+    changed_sensors = {}
+    for offset in range(0, len(ordered), batch_size):
+        chunk = ordered[offset:offset + batch_size]
+        first_date, last_date = chunk[0].date, chunk[-1].date
+        sensor_ids = {measure.sensor_id for measure in chunk}
+
+        existing = {}
+        for queryset in measure_querysets(first_date, last_date, sensor_id__in=sensor_ids):
+            for pk, sensor_id, date, *values in queryset.values_list('id', 'sensor_id', 'date', *UPDATE_FIELDS):
+                existing[(sensor_id, date)] = (queryset.model, pk, tuple(values))
+        archived = set(iterate_archive(first_date, last_date, fields=('sensor_id', 'date'), sensor_id__in=sensor_ids))
+
+        new = []
+        updates = {}
+        for measure in chunk:
+            key = (measure.sensor_id, measure.date)
+            if key in archived:
+                result['skipped'] += 1
+                continue
+            if key not in existing:
+                new.append(measure)
+                continue
+            model, pk, values = existing[key]
+            stored = _stored(measure, fields)
+            if stored == values:
+                result['unchanged'] += 1
+                continue
+            updates.setdefault(model, []).append(model(id=pk, **dict(zip(UPDATE_FIELDS, stored))))
+            first, last = changed_sensors.get(measure.sensor_id, (measure.date, measure.date))
+            changed_sensors[measure.sensor_id] = (min(first, measure.date), max(last, measure.date))
+
+        with transaction.atomic():
+            # A row written by another process since the lookup is updated rather than duplicated
+            MeasuresModel.objects.bulk_create(
+                new, batch_size=batch_size, update_conflicts=True,
+                unique_fields=['sensor', 'date'], update_fields=list(UPDATE_FIELDS),
+            )
+            for model, rows in updates.items():
+                model.objects.bulk_update(rows, UPDATE_FIELDS, batch_size=batch_size)
+            # Rollups are committed with the rows they summarize
+            update_rollups(new)
+        result['created'] += len(new)
+        result['updated'] += sum(len(rows) for rows in updates.values())
+
+    # Replaced values are subtracted from the rollups by recomputing the days they touch
+    for sensor_id, (first_date, last_date) in changed_sensors.items():
+        rebuild_rollups([sensor_id], first_date, last_date)
+    return result
@@ -0,0 +1,109 @@
+# fluke_data/instrument_executor.py
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class InstrumentExecutor:
+    """
+    Bounded thread pool dedicated to blocking instrument I/O (pyvisa).
+
+    Calls are serialized per instrument through a lane (an asyncio.Lock), so a
+    slow or unreachable instrument only ever occupies one worker and never
+    blocks the ORM thread used by sync_to_async or the other instruments.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='instrument-io')
+        self._lanes = {}
+        self._stats = {}
+
+    def _lane_stats(self, key):
+        if key not in self._stats:
+            self._stats[key] = {
+                'queued': 0,
+                'in_flight': 0,
+                'calls': 0,
+                'errors': 0,
+                'total_wait': 0.0,
+                'max_wait': 0.0,
+                'last_wait': 0.0,
+                'last_duration': 0.0,
+            }
+        return self._stats[key]
+
+    async def run(self, key, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) in the lane of the instrument identified by key."""
+        lane = self._lanes.setdefault(key, asyncio.Lock())
+        stats = self._lane_stats(key)
+        queued_at = time.monotonic()
+        started_at = None
+
+        def call():
+            nonlocal started_at
+            started_at = time.monotonic()
+            return func(*args, **kwargs)
+
+        stats['queued'] += 1
+        try:
+            async with lane:
+                loop = asyncio.get_running_loop()
+                stats['in_flight'] += 1
+                try:
+                    return await loop.run_in_executor(self._executor, functools.partial(call))
+                except Exception:
+                    stats['errors'] += 1
+                    raise
+                finally:
+                    finished_at = time.monotonic()
+                    wait = (started_at or finished_at) - queued_at
+                    stats['in_flight'] -= 1
+                    stats['calls'] += 1
+                    stats['total_wait'] += wait
+                    stats['max_wait'] = max(stats['max_wait'], wait)
+                    stats['last_wait'] = wait
+                    stats['last_duration'] = finished_at - (started_at or finished_at)
+        finally:
+            stats['queued'] -= 1
+
+    def forget(self, key):
+        """Drops the lane of an instrument that is no longer acquired."""
+        lane = self._lanes.get(key)
+        if lane is not None and not lane.locked():
+            self._lanes.pop(key, None)
+
+    def stats(self):
+        """Queue depth and wait times (in milliseconds) per instrument lane, read on the event loop."""
+        lanes = {}
+        for key, stats in self._stats.items():
+            lanes[str(key)] = {
+                'queue_depth': max(stats['queued'] - stats['in_flight'], 0),
+                'in_flight': stats['in_flight'],
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'avg_wait_ms': round(stats['total_wait'] / stats['calls'] * 1000, 2) if stats['calls'] else 0.0,
+                'max_wait_ms': round(stats['max_wait'] * 1000, 2),
+                'last_wait_ms': round(stats['last_wait'] * 1000, 2),
+                'last_duration_ms': round(stats['last_duration'] * 1000, 2),
+            }
+        return {
+            'max_workers': self.max_workers,
+            'queue_depth': sum(lane['queue_depth'] for lane in lanes.values()),
+            'in_flight': sum(lane['in_flight'] for lane in lanes.values()),
+            'lanes': lanes,
+        }
+
+
+_instrument_executor = None
+
+
+def get_instrument_executor():
+    global _instrument_executor
+    if _instrument_executor is None:
+        _instrument_executor = InstrumentExecutor(getattr(settings, 'INSTRUMENT_IO_MAX_WORKERS', 32))
+    return _instrument_executor
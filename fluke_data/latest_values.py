@@ -0,0 +1,80 @@
+# fluke_data/latest_values.py
+
+import threading
+import time
+from datetime import datetime
+
+from django.utils import timezone
+
+STATE_FIELDS = ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity')
+
+
+class LatestValueStore:
+    """
+    Process-wide latest reading of every sensor, updated by the acquisition
+    loops on every poll, so the current state of the whole fleet can be read
+    without a WebSocket or a database query. A sensor is discarded when its
+    acquisition stops or the sensor is deleted.
+
+    Entries are built once per reading, in the form served by the API; a
+    snapshot only copies the references. version changes with every update
+    and is the ETag of the snapshot, together with the token of this store,
+    so a restarted process never answers for values it has not seen.
+    """
+
+    def __init__(self):
+        self.values = {}  # sensor id -> entry
+        self.version = 0
+        self.token = format(time.time_ns(), 'x')
+        self._lock = threading.Lock()  # Updated in the event loop, read by the API threads
+
+    def update(self, thermohygrometer_id, data, info):
+        calibrated = all(isinstance(data.get(field), (int, float)) for field in STATE_FIELDS[2:])
+        entry = {
+            'sensor_id': info['sensor_id'],
+            'sensor_name': info['sensor_name'],
+            'location': info['location'],
+            'channel': info['channel'],
+            'thermohygrometer_id': thermohygrometer_id,
+            'instrument_name': info['instrument_name'],
+            # Corrected values are None without a calibration certificate
+            **{field: data.get(field) if calibrated or field in STATE_FIELDS[:2] else None for field in STATE_FIELDS},
+            'date': timezone.make_aware(datetime.strptime(data['date'], '%Y/%m/%d %H:%M:%S')).isoformat(),
+            'received_at': timezone.now().isoformat(),
+            'received_at_epoch': time.time(),
+            'calibrated': calibrated,
+            'limits': {
+                'min_temperature': info['min_temperature'],
+                'max_temperature': info['max_temperature'],
+                'min_humidity': info['min_humidity'],
+                'max_humidity': info['max_humidity'],
+            },
+            # True when the value is outside its limits, as shown in red on the live pages
+            'out_of_limits': {
+                field: data.get(f'{field}_style') == 'red'
+                for field in (STATE_FIELDS if calibrated else STATE_FIELDS[:2])
+            },
+        }
+        with self._lock:
+            self.values[entry['sensor_id']] = entry
+            self.version += 1
+
+    def discard(self, sensor_id):
+        with self._lock:
+            if self.values.pop(sensor_id, None) is not None:
+                self.version += 1
+
+    def snapshot(self):
+        """Returns the ETag of the current state and its entries, in no particular order."""
+        with self._lock:
+            return f'{self.token}-{self.version}', list(self.values.values())
+
+
+_latest_value_store = None
+
+
+def get_latest_value_store():
+    global _latest_value_store
+    if _latest_value_store is None:
+        _latest_value_store = LatestValueStore()
+    return _latest_value_store
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from fluke_data.acquisition import InstrumentAcquisition
+from fluke_data.fanout import FrameSubscriber, get_live_fanout
+from fluke_data.models import SensorModel
+
+
+async def legacy_broadcast(acquisition, data, sensor):
+    """InstrumentAcquisition.broadcast_data before the reading was encoded once."""
+    channel_layer = get_channel_layer()
+    info = {
+        'sn': acquisition.instrument.SN,
+        'pn': acquisition.instrument.PN,
+        'instrument_name': acquisition.instrument.INSTRUMENT_NAME,
+        'instrument_location': acquisition.thermo.equipment_fisical_location,
+        'group_name': acquisition.instrument.GROUP_NAME,
+        'sensor_id': sensor.id,
+        'sensor_name': sensor.sensor_name,
+        'location': sensor.location,
+        'channel': sensor.channel,
+        'min_temperature': sensor.min_temperature or acquisition.thermo.min_temperature,
+        'max_temperature': sensor.max_temperature or acquisition.thermo.max_temperature,
+        'min_humidity': sensor.min_humidity or acquisition.thermo.min_humidity,
+        'max_humidity': sensor.max_humidity or acquisition.thermo.max_humidity,
+    }
+    data.setdefault('thermo_info', info)
+    await channel_layer.group_send(acquisition.group_name, {'type': 'thermo_data', 'data': data})
+    await channel_layer.group_send(
+        f'thermo_{acquisition.thermohygrometer_id}_sensor_{sensor.id}',
+        {'type': 'send_data_to_listeners', 'message': json.dumps(data)},
+    )
+    await channel_layer.group_send(
+        f'thermo_{acquisition.thermohygrometer_id}',
+        {'type': 'send_data_to_listeners', 'message': json.dumps(data)},
+    )
+
+
+def legacy_thermo_data(event):
+    return json.dumps({'data': event['data']})
+
+
+def legacy_send_data_to_listeners(event):
+    return event['message']
+
+
+class BenchmarkSubscriber(FrameSubscriber):
+    """A consumer whose socket accepts every frame at once."""
+    sent = 0
+
+    async def send_frame(self, frame):
+        BenchmarkSubscriber.sent += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the CPU time and memory allocated per live reading by its broadcast to one DataConsumer "
+        "and to the ListenerConsumers, through the channel layer with one encoding per group (legacy) "
+        "and through the LiveFanout with the reading encoded once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listeners', type=int, nargs='+', default=[1, 100, 1000],
+                            help="Listener counts to measure, half per sensor and half per instrument")
+        parser.add_argument('--readings', type=int, default=200, help="Readings broadcast per measurement")
+        parser.add_argument('--output', help="Also write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        results = asyncio.run(self.run(options))
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    async def run(self, options):
+        acquisition = InstrumentAcquisition(0)
+        acquisition.instrument = SimpleNamespace(SN='B0000001', PN='1620A', INSTRUMENT_NAME='DewK 1620A', GROUP_NAME='B0000001')
+        acquisition.thermo = SimpleNamespace(
+            equipment_fisical_location='Lab', group_name=None, min_temperature=18.0, max_temperature=25.0, min_humidity=30.0, max_humidity=60.0,
+        )
+        acquisition.group_name = 'thermohygrometer_B0000001'
+        sensor = SensorModel(id=1, sensor_name='Bench', location='Room 1', channel=1)
+
+        results = []
+        for listeners in options['listeners']:
+            for name, measure in (('legacy', self.measure_legacy), ('encode_once', self.measure_fanout)):
+                results.append({
+                    'listeners': listeners,
+                    'path': name,
+                    **await measure(acquisition, sensor, listeners, options['readings']),
+                })
+        return results
+
+    @staticmethod
+    def reading_data(sensor, index):
+        return {
+            'temperature': 21.0 + index % 10 / 10, 'humidity': 45.0, 'date': '2026/01/01 00:00:00',
+            'corrected_temperature': 20.9, 'corrected_humidity': 46.1,
+            'sensor_id': sensor.id, 'sensor_name': sensor.sensor_name, 'location': sensor.location, 'channel': 1,
+            'temperature_style': 'black', 'humidity_style': 'black',
+            'corrected_temperature_style': 'black', 'corrected_humidity_style': 'black',
+        }
+
+    @staticmethod
+    def listener_group(sensor, index):
+        # Listeners are split between the sensor and the instrument group
+        return f'thermo_0_sensor_{sensor.id}' if index % 2 else 'thermo_0'
+
+    async def measure_legacy(self, acquisition, sensor, listeners, readings):
+        channel_layer = get_channel_layer()
+        consumers = [(await channel_layer.new_channel(), legacy_thermo_data)]
+        await channel_layer.group_add(acquisition.group_name, consumers[0][0])
+        for i in range(listeners):
+            channel = await channel_layer.new_channel()
+            await channel_layer.group_add(self.listener_group(sensor, i), channel)
+            consumers.append((channel, legacy_send_data_to_listeners))
+
+        async def reading(index):
+            await legacy_broadcast(acquisition, self.reading_data(sensor, index), sensor)
+            for channel, handler in consumers:
+                handler(await channel_layer.receive(channel))
+
+        try:
+            return await self.measure(reading, readings)
+        finally:
+            for i, (channel, _) in enumerate(consumers):
+                group = acquisition.group_name if i == 0 else self.listener_group(sensor, i - 1)
+                await channel_layer.group_discard(group, channel)
+            await channel_layer.flush()
+
+    async def measure_fanout(self, acquisition, sensor, listeners, readings):
+        fanout = get_live_fanout()
+        subscribers = [(acquisition.group_name, BenchmarkSubscriber())]
+        subscribers += [(self.listener_group(sensor, i), BenchmarkSubscriber()) for i in range(listeners)]
+        for group, subscriber in subscribers:
+            subscriber.start_frames()
+            fanout.subscribe(group, subscriber)
+        acquisition.thermo_info = {}
+
+        async def reading(index):
+            expected = BenchmarkSubscriber.sent + len(subscribers)
+            await acquisition.broadcast_data(self.reading_data(sensor, index), sensor)
+            while BenchmarkSubscriber.sent < expected:
+                await asyncio.sleep(0)
+
+        try:
+            return await self.measure(reading, readings)
+        finally:
+            for group, subscriber in subscribers:
+                fanout.unsubscribe(group, subscriber)
+                await subscriber.stop_frames()
+
+    async def measure(self, reading, readings):
+        await reading(0)  # Warm up
+        started_at = time.process_time()
+        for index in range(readings):
+            await reading(index)
+        cpu = (time.process_time() - started_at) / readings
+
+        tracemalloc.start()
+        peaks = []
+        for index in range(min(readings, 20)):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await reading(index)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+        return {
+            'cpu_us_per_reading': round(cpu * 1e6, 1),
+            'peak_kib_per_reading': round(sorted(peaks)[len(peaks) // 2] / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(self.style.MIGRATE_HEADING("Per reading: CPU time, peak memory allocated (median)"))
+        for result in results:
+            self.stdout.write(
+                f"  {result['listeners']:>5} listeners  {result['path']:<12} "
+                f"{result['cpu_us_per_reading']:>10} us  {result['peak_kib_per_reading']:>8} KiB"
+            )
@@ -0,0 +1,174 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections, models, transaction
+from django.db.migrations.state import ProjectState
+from django.db.models import Avg, Max, Min, Q
+from django.utils import timezone
+
+from fluke_data.models import (CalibrationCertificateModel, InstrumentIdentityModel,
+                               MeasuresModel, SensorModel, ThermohygrometerModel)
+
+BENCHMARK_ALIAS = 'measure_queries_benchmark'
+
+# Index Django created on MeasuresModel.sensor before the (sensor, date) unique constraint replaced it
+SENSOR_FK_INDEX = models.Index(fields=['sensor'], name='measures_sensor_id_fk_idx')
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a synthetic measurement history into a scratch SQLite database and records "
+        "EXPLAIN QUERY PLAN and latency of the history query shapes, without and with the "
+        "MeasuresModel composite indexes and (sensor, date) unique constraint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000, help="Measurements to generate")
+        parser.add_argument('--instruments', type=int, default=10, help="Instruments (two sensors each)")
+        parser.add_argument('--range-days', type=int, default=7, help="Days covered by the queried range")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query, the median is reported")
+        parser.add_argument('--output', help="Also write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='measure-queries-')
+        connections.databases[BENCHMARK_ALIAS] = dict(
+            connections.databases['default'], NAME=os.path.join(directory, 'benchmark.sqlite3')
+        )
+        connection = connections[BENCHMARK_ALIAS]
+        try:
+            sensors, last_date = self.load_history(connection, options)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            results = {'rows': options['rows'], 'before': self.run_queries(sensors, last_date, options)}
+            with connection.schema_editor() as editor:
+                editor.remove_index(MeasuresModel, SENSOR_FK_INDEX)
+                for index in MeasuresModel._meta.indexes:
+                    editor.add_index(MeasuresModel, index)
+                for constraint in MeasuresModel._meta.constraints:
+                    # A unique index, as the constraint of the migrated table; adding it with
+                    # add_constraint would make SQLite copy the whole table
+                    editor.execute(constraint.create_sql(MeasuresModel, editor))
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            results['after'] = self.run_queries(sensors, last_date, options)
+        finally:
+            connection.close()
+            del connections[BENCHMARK_ALIAS]
+            del connections.databases[BENCHMARK_ALIAS]
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def load_history(self, connection, options):
+        # "Before": only the foreign-key indexes, as before the composite indexes and the unique
+        # constraint were added. The table is created from a state without them, as removing the
+        # unique constraint from a created table is not possible on SQLite
+        state = ProjectState.from_apps(apps)
+        state.models['fluke_data', 'measuresmodel'].options.update(indexes=[], constraints=[])
+        with connection.schema_editor() as editor:
+            for model in (CalibrationCertificateModel, ThermohygrometerModel, SensorModel, InstrumentIdentityModel):
+                editor.create_model(model)
+            editor.create_model(state.apps.get_model('fluke_data', 'MeasuresModel'))
+            editor.add_index(MeasuresModel, SENSOR_FK_INDEX)
+
+        sensors = []
+        for i in range(options['instruments']):
+            instrument = ThermohygrometerModel.objects.using(BENCHMARK_ALIAS).create(
+                ip_address=f"10.0.0.{i + 1}", pn='1620A', sn=f"BENCH{i:04d}", instrument_name=f"BENCH {i}",
+                min_temperature=18, max_temperature=25, min_humidity=35, max_humidity=60,
+            )
+            for channel in (1, 2):
+                sensors.append(SensorModel.objects.using(BENCHMARK_ALIAS).create(
+                    instrument=instrument, channel=channel, sensor_name=f"BENCH {i} - {channel}"
+                ))
+
+        # One reading per sensor every 5 minutes, ending now
+        per_sensor = options['rows'] // len(sensors)
+        last_date = timezone.now().replace(microsecond=0)
+        first_date = last_date - timedelta(minutes=5 * per_sensor)
+        table = connection.ops.quote_name(MeasuresModel._meta.db_table)
+        prep = {name: MeasuresModel._meta.get_field(name).get_db_prep_value for name in ('temperature', 'humidity', 'date')}
+        rng = random.Random(0)
+        started_at = time.monotonic()
+        with transaction.atomic(using=BENCHMARK_ALIAS), connection.cursor() as cursor:
+            for step in range(0, per_sensor, 10_000):
+                rows = []
+                for minute in range(step, min(step + 10_000, per_sensor)):
+                    date = prep['date'](first_date + timedelta(minutes=5 * minute), connection)
+                    for sensor in sensors:
+                        temperature = prep['temperature'](rng.uniform(17, 26), connection)
+                        humidity = prep['humidity'](rng.uniform(30, 65), connection)
+                        rows.append((sensor.instrument_id, sensor.id, temperature, temperature, humidity, humidity, date))
+                cursor.executemany(
+                    f"INSERT INTO {table} (instrument_id, sensor_id, temperature, corrected_temperature, "
+                    f"humidity, corrected_humidity, date) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                    rows,
+                )
+        self.stdout.write(f"Loaded {per_sensor * len(sensors)} rows in {time.monotonic() - started_at:.1f} s")
+        return sensors, last_date
+
+    def query_shapes(self, sensor, start_datetime, end_datetime):
+        """The MeasuresModel queries of DataVisualizationView, export_to_csv and out_of_limits_chart."""
+        instrument = sensor.instrument
+        measures = MeasuresModel.objects.using(BENCHMARK_ALIAS)
+        by_sensor = measures.filter(sensor=sensor, date__range=[start_datetime, end_datetime]).order_by('-date')
+        by_instrument = measures.filter(
+            instrument=instrument,
+            date__range=(start_datetime, end_datetime),
+            date__week_day__gte=2,
+            date__week_day__lte=6,
+            date__time__gte=start_datetime.time(),
+            date__time__lte=end_datetime.time(),
+        ).order_by('date')
+        temperature_out = by_instrument.filter(corrected_temperature__isnull=False).filter(
+            Q(corrected_temperature__lt=instrument.min_temperature) | Q(corrected_temperature__gt=instrument.max_temperature)
+        )
+        return {
+            'data_visualization_rows': (by_sensor, lambda: list(by_sensor.values_list('date', 'temperature'))),
+            'data_visualization_stats': (by_sensor, lambda: by_sensor.aggregate(
+                Min('temperature'), Max('temperature'), Avg('temperature'),
+                Min('humidity'), Max('humidity'), Avg('humidity'),
+            )),
+            'export_to_csv': (by_sensor, lambda: sum(1 for _ in by_sensor.iterator(chunk_size=2000))),
+            'out_of_limits_chart_count': (temperature_out, lambda: temperature_out.count()),
+            'out_of_limits_chart_rows': (by_instrument, lambda: list(by_instrument.values_list('date', 'corrected_temperature'))),
+        }
+
+    def run_queries(self, sensors, last_date, options):
+        sensor = SensorModel.objects.using(BENCHMARK_ALIAS).select_related('instrument').get(id=sensors[0].id)
+        end_datetime = last_date
+        start_datetime = end_datetime - timedelta(days=options['range_days'])
+        results = {}
+        for name, (queryset, run) in self.query_shapes(sensor, start_datetime, end_datetime).items():
+            timings = []
+            for _ in range(options['repeat']):
+                started_at = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started_at)
+            results[name] = {
+                'plan': queryset.explain(),
+                'median_ms': round(sorted(timings)[len(timings) // 2] * 1000, 2),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"\n{results['rows']} rows")
+        for name in results['before']:
+            before = results['before'][name]
+            after = results['after'][name]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+            self.stdout.write(f"  before: {before['median_ms']} ms")
+            self.stdout.write('    ' + before['plan'].replace('\n', '\n    '))
+            self.stdout.write(f"  after:  {after['median_ms']} ms")
+            self.stdout.write('    ' + after['plan'].replace('\n', '\n    '))
@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from fluke_data.models import (CalibrationCertificateModel, InstrumentIdentityModel,
+                               MeasuresModel, SensorModel, ThermohygrometerModel)
+
+BENCHMARK_ALIAS = 'measure_storage_benchmark'
+
+# MeasuresModel before the compact format: floats, text dates and per-row pn/sn
+LEGACY_TABLE = 'legacy_measures'
+LEGACY_SCHEMA = (
+    f"CREATE TABLE {LEGACY_TABLE} (id integer NOT NULL PRIMARY KEY AUTOINCREMENT, temperature real NOT NULL, "
+    "corrected_temperature real NULL, humidity real NOT NULL, corrected_humidity real NULL, date datetime NOT NULL, "
+    "pn varchar(100) NULL, sn varchar(100) NULL, instrument_id bigint NULL, sensor_id bigint NULL)",
+    f"CREATE INDEX legacy_measures_instrument ON {LEGACY_TABLE} (instrument_id)",
+    f"CREATE INDEX legacy_measures_sensor ON {LEGACY_TABLE} (sensor_id)",
+    f"CREATE INDEX legacy_measures_sensor_date ON {LEGACY_TABLE} (sensor_id, date)",
+    f"CREATE INDEX legacy_measures_instrument_date ON {LEGACY_TABLE} (instrument_id, date)",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads the same synthetic readings in the legacy and in the compact MeasuresModel "
+        "row format in a scratch SQLite database and reports bytes per row and range-query latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Measurements to generate")
+        parser.add_argument('--sensors', type=int, default=20, help="Sensors (two per instrument)")
+        parser.add_argument('--range-days', type=int, default=7, help="Days covered by the queried range")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per query, the median is reported")
+        parser.add_argument('--output', help="Also write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp(prefix='measure-storage-')
+        connections.databases[BENCHMARK_ALIAS] = dict(
+            connections.databases['default'], NAME=os.path.join(directory, 'benchmark.sqlite3')
+        )
+        connection = connections[BENCHMARK_ALIAS]
+        try:
+            sensors, last_date = self.load(connection, options)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            results = {
+                'rows': options['rows'],
+                'bytes_per_row': self.bytes_per_row(connection, options['rows']),
+                'latency_ms': self.run_queries(connection, sensors[0], last_date, options),
+            }
+        finally:
+            connection.close()
+            del connections[BENCHMARK_ALIAS]
+            del connections.databases[BENCHMARK_ALIAS]
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def load(self, connection, options):
+        with connection.schema_editor() as editor:
+            for model in (CalibrationCertificateModel, ThermohygrometerModel, SensorModel, InstrumentIdentityModel, MeasuresModel):
+                editor.create_model(model)
+        with connection.cursor() as cursor:
+            for statement in LEGACY_SCHEMA:
+                cursor.execute(statement)
+
+        sensors = []
+        for i in range((options['sensors'] + 1) // 2):
+            instrument = ThermohygrometerModel.objects.using(BENCHMARK_ALIAS).create(
+                ip_address=f"10.0.0.{i + 1}", pn='1620A', sn=f"BENCH{i:04d}", instrument_name=f"BENCH {i}",
+            )
+            for channel in (1, 2):
+                sensors.append(SensorModel.objects.using(BENCHMARK_ALIAS).create(
+                    instrument=instrument, channel=channel, sensor_name=f"BENCH {i} - {channel}"
+                ))
+
+        # One reading per sensor every 5 minutes, ending now, corrected like a certificate would
+        per_sensor = options['rows'] // len(sensors)
+        last_date = timezone.now().replace(microsecond=0)
+        first_date = last_date - timedelta(minutes=5 * per_sensor)
+        prep = {field.name: field.get_db_prep_value for field in MeasuresModel._meta.concrete_fields}
+        compact_table = connection.ops.quote_name(MeasuresModel._meta.db_table)
+        rng = random.Random(0)
+        started_at = time.monotonic()
+        with transaction.atomic(using=BENCHMARK_ALIAS), connection.cursor() as cursor:
+            for step in range(0, per_sensor, 10_000):
+                legacy_rows = []
+                compact_rows = []
+                for minute in range(step, min(step + 10_000, per_sensor)):
+                    date = first_date + timedelta(minutes=5 * minute)
+                    for sensor in sensors:
+                        temperature = round(rng.uniform(17, 26), 2)
+                        humidity = round(rng.uniform(30, 65), 1)
+                        corrected_temperature = round(temperature - 0.13, 2)
+                        corrected_humidity = round(humidity + 1.2, 2)
+                        legacy_rows.append((
+                            sensor.instrument_id, sensor.id, temperature, corrected_temperature, humidity,
+                            corrected_humidity, connection.ops.adapt_datetimefield_value(date),
+                        ))
+                        compact_rows.append((
+                            sensor.instrument_id, sensor.id,
+                            prep['temperature'](temperature, connection),
+                            prep['corrected_temperature'](corrected_temperature, connection),
+                            prep['humidity'](humidity, connection),
+                            prep['corrected_humidity'](corrected_humidity, connection),
+                            prep['date'](date, connection),
+                        ))
+                for table, rows in ((LEGACY_TABLE, legacy_rows), (compact_table, compact_rows)):
+                    cursor.executemany(
+                        f"INSERT INTO {table} (instrument_id, sensor_id, temperature, corrected_temperature, "
+                        f"humidity, corrected_humidity, date) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                        rows,
+                    )
+        self.stdout.write(f"Loaded {per_sensor * len(sensors)} rows per format in {time.monotonic() - started_at:.1f} s")
+        return sensors, last_date
+
+    def bytes_per_row(self, connection, rows):
+        """Pages of each table and its indexes, from the dbstat virtual table."""
+        tables = {'legacy': LEGACY_TABLE, 'compact': MeasuresModel._meta.db_table}
+        results = {}
+        with connection.cursor() as cursor:
+            for name, table in tables.items():
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+                total = cursor.fetchone()[0] or 0
+                cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+                results[name] = round(total / max(cursor.fetchone()[0], 1), 1)
+        return results
+
+    def run_queries(self, connection, sensor, last_date, options):
+        start_date = last_date - timedelta(days=options['range_days'])
+        columns = 'date, temperature, corrected_temperature, humidity, corrected_humidity'
+        compact_table = connection.ops.quote_name(MeasuresModel._meta.db_table)
+        date_field = MeasuresModel._meta.get_field('date')
+        legacy_bounds = [sensor.id, connection.ops.adapt_datetimefield_value(start_date), connection.ops.adapt_datetimefield_value(last_date)]
+        compact_bounds = [sensor.id, date_field.get_db_prep_value(start_date, connection), date_field.get_db_prep_value(last_date, connection)]
+        where = "WHERE sensor_id = %s AND date BETWEEN %s AND %s"
+
+        def raw(table, sql_columns, bounds):
+            def run():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT {sql_columns} FROM {table} {where} ORDER BY date", bounds)
+                    return cursor.fetchall()
+            return run
+
+        measures = MeasuresModel.objects.using(BENCHMARK_ALIAS).filter(
+            sensor_id=sensor.id, date__range=(start_date, last_date)
+        ).order_by('date')
+        aggregates = 'MIN(temperature), MAX(temperature), AVG(temperature), MIN(humidity), MAX(humidity), AVG(humidity)'
+        queries = {
+            'range_rows_legacy_sql': raw(LEGACY_TABLE, columns, legacy_bounds),
+            'range_rows_compact_sql': raw(compact_table, columns, compact_bounds),
+            'range_rows_compact_orm': lambda: list(measures.values_list(
+                'date', 'temperature', 'corrected_temperature', 'humidity', 'corrected_humidity'
+            )),
+            'range_stats_legacy_sql': raw(LEGACY_TABLE, aggregates, legacy_bounds),
+            'range_stats_compact_sql': raw(compact_table, aggregates, compact_bounds),
+        }
+        results = {}
+        for name, run in queries.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started_at = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started_at)
+            results[name] = round(sorted(timings)[len(timings) // 2] * 1000, 2)
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"\n{results['rows']} rows per format")
+        self.stdout.write(self.style.MIGRATE_HEADING("\nBytes per row (table and indexes)"))
+        for name, value in results['bytes_per_row'].items():
+            self.stdout.write(f"  {name}: {value}")
+        self.stdout.write(self.style.MIGRATE_HEADING("\nRange query latency (median)"))
+        for name, value in results['latency_ms'].items():
+            self.stdout.write(f"  {name}: {value} ms")
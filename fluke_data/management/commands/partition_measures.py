@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from fluke_data.archive import archive_closed_partitions
+from fluke_data.models import MeasurePartitionModel
+from fluke_data.partitions import apply_retention, seal_closed_months
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the closed months of MeasuresModel into their monthly partition tables, "
+        "archives the old partitions to Parquet and drops the partitions older than the "
+        "retention period."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hot-months', type=int, default=settings.MEASUREMENT_HOT_MONTHS,
+                            help="Months, including the current one, kept in MeasuresModel")
+        parser.add_argument('--archive-after-months', type=int, default=settings.MEASUREMENT_ARCHIVE_AFTER_MONTHS,
+                            help="Archive the partitions older than this many months to Parquet (0 never archives)")
+        parser.add_argument('--retention-months', type=int, default=settings.MEASUREMENT_RETENTION_MONTHS,
+                            help="Drop the partitions older than this many months (0 keeps everything)")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Give the space of dropped tables back to the file system (rewrites the database)")
+        parser.add_argument('--list', action='store_true', help="Only list the partitions")
+
+    def handle(self, *args, **options):
+        if not options['list']:
+            for month, rows in seal_closed_months(options['hot_months']).items():
+                self.stdout.write(f"Sealed {month:%Y-%m}: {rows} rows moved")
+            for month, archive_bytes in archive_closed_partitions(options['archive_after_months']).items():
+                self.stdout.write(f"Archived {month:%Y-%m}: {archive_bytes} bytes of Parquet")
+            for month in apply_retention(options['retention_months']):
+                self.stdout.write(f"Dropped {month:%Y-%m}")
+            if options['vacuum']:
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM')
+
+        for partition in MeasurePartitionModel.objects.all():
+            location = f"archive, {partition.archive_bytes} bytes" if partition.archived_at else partition.table_name
+            self.stdout.write(f"  {partition.month:%Y-%m}  {partition.row_count} rows  ({location})")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fluke_data.models import SensorModel
+from fluke_data.rollups import rebuild_rollups
+
+from .recompute_corrections import parse_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the minute, hour and day rollups of the stored measurements. "
+        "Run it once after upgrading, on existing data; afterwards they are kept up to date on write."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', type=int, action='append', help="Sensor id (repeatable, all sensors by default)")
+        parser.add_argument('--start', help="First date (YYYY-MM-DD or ISO datetime)")
+        parser.add_argument('--end', help="Last date (YYYY-MM-DD or ISO datetime)")
+
+    def handle(self, *args, **options):
+        sensor_ids = options['sensor']
+        if sensor_ids:
+            missing = set(sensor_ids) - set(SensorModel.objects.filter(id__in=sensor_ids).values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Sensors not found: {', '.join(map(str, sorted(missing)))}")
+
+        def progress(sensor_id, rows):
+            self.stdout.write(f"  sensor {sensor_id}: {rows} rows")
+
+        rows = rebuild_rollups(
+            sensor_ids,
+            start=parse_date(options['start']) if options['start'] else None,
+            end=parse_date(options['end'], end_of_day=True) if options['end'] else None,
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rollups rebuilt from {rows} rows"))
@@ -0,0 +1,70 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from fluke_data.models import CorrectionRecomputeJobModel, SensorModel
+from fluke_data.recompute import CorrectionRecompute
+
+
+def parse_date(value, end_of_day=False):
+    """Accepts YYYY-MM-DD or an ISO datetime; a bare end date includes the whole day."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date: {value}")
+    if len(value) == 10 and end_of_day:
+        parsed = datetime.combine(parsed.date(), time.max)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-applies the current calibration certificate of a sensor to the corrected "
+        "temperature and humidity already stored, optionally within a date range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sensor', type=int, help="Sensor id")
+        parser.add_argument('--start', help="First date (YYYY-MM-DD or ISO datetime)")
+        parser.add_argument('--end', help="Last date (YYYY-MM-DD or ISO datetime)")
+        parser.add_argument('--chunk-size', type=int, default=CorrectionRecompute.CHUNK_SIZE,
+                            help="Rows read, corrected and written per transaction")
+        parser.add_argument('--resume', type=int, metavar='JOB_ID',
+                            help="Continue an interrupted job after its last committed chunk")
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = CorrectionRecomputeJobModel.objects.select_related('sensor').get(id=options['resume'])
+            except CorrectionRecomputeJobModel.DoesNotExist:
+                raise CommandError(f"Job {options['resume']} not found")
+            if job.status == 'done':
+                self.stdout.write(f"Job {job.id} is already done")
+                return
+            if not CorrectionRecompute.is_resumable(job):
+                raise CommandError(f"Job {job.id} is still running (last update {job.updated_at})")
+        else:
+            if not options['sensor']:
+                raise CommandError("--sensor or --resume is required")
+            try:
+                sensor = SensorModel.objects.get(id=options['sensor'])
+            except SensorModel.DoesNotExist:
+                raise CommandError(f"Sensor {options['sensor']} not found")
+            job = CorrectionRecompute.create_job(
+                sensor,
+                start_date=parse_date(options['start']) if options['start'] else None,
+                end_date=parse_date(options['end'], end_of_day=True) if options['end'] else None,
+            )
+        self.stdout.write(f"Job {job.id}: recomputing corrections of sensor {job.sensor_id}")
+
+        def progress(job, rows_per_minute):
+            self.stdout.write(f"  {job.rows_done}/{job.rows_total} rows ({rows_per_minute} rows/min)")
+
+        try:
+            CorrectionRecompute(job, chunk_size=options['chunk_size'], progress=progress).run()
+        except Exception as e:
+            raise CommandError(f"Job {job.id} failed: {e}. Resume it with --resume {job.id}")
+        self.stdout.write(self.style.SUCCESS(f"Job {job.id}: {job.rows_done} rows recomputed"))
@@ -0,0 +1,63 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from fluke_data.models import SensorModel, ThermohygrometerModel
+from thermohygrometer.simulator import (add_simulator_arguments, simulator_options,
+                                        start_simulators, stop_simulators)
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts N simulated DewK 1620A instruments on localhost and registers them "
+        "as thermohygrometers, for offline load and latency tests."
+    )
+
+    def add_arguments(self, parser):
+        # Same options as `python -m thermohygrometer.simulator`
+        add_simulator_arguments(parser)
+        parser.add_argument('--no-register', action='store_true',
+                            help="Do not create ThermohygrometerModel rows for the simulators")
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.serve(options))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, options):
+        simulators = await start_simulators(
+            options['count'], host=options['host'], base_port=options['base_port'], **simulator_options(options)
+        )
+        if not options['no_register']:
+            await sync_to_async(self.register)(simulators)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(simulators)} simulated instruments listening on "
+            f"{options['host']}:{options['base_port']}-{options['base_port'] + len(simulators) - 1}"
+        ))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stop_simulators(simulators)
+
+    def register(self, simulators):
+        for simulator in simulators:
+            thermo, created = ThermohygrometerModel.objects.update_or_create(
+                ip_address=simulator.address,
+                defaults={
+                    'pn': simulator.part_number,
+                    'sn': simulator.serial_number,
+                    'instrument_name': simulator.name,
+                    'group_name': f"thermo_{simulator.part_number}_{simulator.serial_number}",
+                },
+            )
+            for channel in (1, 2):
+                SensorModel.objects.get_or_create(
+                    instrument=thermo,
+                    channel=channel,
+                    defaults={
+                        'sensor_name': f"{simulator.name} - Channel {channel}",
+                        'location': 'Simulator',
+                    },
+                )
@@ -0,0 +1,151 @@
+# fluke_data/measurement_spool.py
+
+import json
+import os
+from datetime import datetime
+
+from .partitions import EXTREME_FIELDS
+
+
+class MeasurementSpool:
+    """
+    Append-only on-disk journal of the measurements waiting for the database.
+
+    Measurements are appended as JSON lines to the active segment file with a
+    single write and fsync per batch. Sealed segments are replayed into
+    MeasuresModel and deleted once the transaction commits, so a measurement
+    survives a crash or a database outage as soon as append() returns.
+
+    A line torn by a crash is skipped on replay. When the spool grows beyond
+    max_bytes the oldest sealed segments are discarded.
+    """
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.log'
+
+    def __init__(self, directory, segment_max_bytes, max_bytes):
+        self.directory = str(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.max_bytes = max_bytes
+        self.dropped_segments = 0
+        self.dropped_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segment_numbers()
+        self._next_number = (segments[-1] + 1) if segments else 1
+        self._active = None
+        self._active_size = 0
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{self.SEGMENT_PREFIX}{number:012d}{self.SEGMENT_SUFFIX}")
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    @staticmethod
+    def encode(measure):
+        record = {
+            'i': measure.instrument_id,
+            's': measure.sensor_id,
+            't': measure.temperature,
+            'ct': measure.corrected_temperature,
+            'h': measure.humidity,
+            'ch': measure.corrected_humidity,
+            'd': measure.date.isoformat(),
+        }
+        if measure.sample_count is not None:
+            # Rows of the interval aggregate storage mode, see InstrumentAcquisition
+            record['n'] = measure.sample_count
+            record['x'] = [getattr(measure, field) for field in EXTREME_FIELDS]
+        return json.dumps(record, separators=(',', ':'))
+
+    @staticmethod
+    def decode(line):
+        """Returns the record of a spooled line, or None if the line is torn."""
+        try:
+            record = json.loads(line)
+            record['d'] = datetime.fromisoformat(record['d'])
+            return record
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def append(self, measures):
+        """Appends measures to the active segment and fsyncs them."""
+        if not measures:
+            return
+        if self._active is None:
+            number = self._next_number
+            self._next_number += 1
+            self._active = (number, open(self._segment_path(number), 'ab'))
+            self._active_size = 0
+        data = ''.join(self.encode(measure) + '\n' for measure in measures).encode('utf-8')
+        segment_file = self._active[1]
+        segment_file.write(data)
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+        self._active_size += len(data)
+        if self._active_size >= self.segment_max_bytes:
+            self.seal()
+        self._enforce_limit()
+
+    def seal(self):
+        """Closes the active segment so it can be replayed."""
+        if self._active is not None:
+            self._active[1].close()
+            self._active = None
+            self._active_size = 0
+
+    def sealed_segments(self):
+        active = self._active[0] if self._active else None
+        return [number for number in self._segment_numbers() if number != active]
+
+    def read(self, number):
+        with open(self._segment_path(number), 'rb') as segment_file:
+            lines = segment_file.read().decode('utf-8', errors='replace').splitlines()
+        return [record for record in map(self.decode, lines) if record is not None]
+
+    def remove(self, number):
+        try:
+            os.remove(self._segment_path(number))
+        except FileNotFoundError:
+            pass
+
+    def _segment_sizes(self):
+        sizes = {}
+        for number in self._segment_numbers():
+            try:
+                sizes[number] = os.path.getsize(self._segment_path(number))
+            except FileNotFoundError:
+                continue  # Replayed and removed since the directory was listed
+        return sizes
+
+    def _enforce_limit(self):
+        sizes = self._segment_sizes()
+        total = sum(sizes.values())
+        active = self._active[0] if self._active else None
+        for number in sizes:
+            if total <= self.max_bytes:
+                break
+            if number == active:
+                continue
+            print(f"measurement_spool: Spool over {self.max_bytes} bytes, discarding segment {number}")
+            self.remove(number)
+            total -= sizes[number]
+            self.dropped_segments += 1
+            self.dropped_bytes += sizes[number]
+
+    def stats(self):
+        sizes = self._segment_sizes()
+        return {
+            'directory': self.directory,
+            'segments': len(sizes),
+            'bytes': sum(sizes.values()),
+            'max_bytes': self.max_bytes,
+            'dropped_segments': self.dropped_segments,
+            'dropped_bytes': self.dropped_bytes,
+        }
@@ -0,0 +1,235 @@
+# fluke_data/measurement_writer.py
+
+import asyncio
+import atexit
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .measurement_spool import MeasurementSpool
+from .models import MeasuresModel, SensorModel
+from .ingest import upsert_measures
+from .partitions import EXTREME_FIELDS
+
+
+class MeasurementWriter:
+    """
+    Write buffer shared by every acquisition loop.
+
+    Measurements are queued in memory and, when batch_size measurements are
+    pending or flush_interval seconds have passed, appended to the on-disk
+    spool with one fsync. The sealed spool segments are then replayed with
+    one bulk upsert per transaction (see fluke_data.ingest), so SQLite sees
+    one short write transaction every few seconds instead of one per sensor
+    per save, and replaying a segment twice does not duplicate measurements.
+
+    If the database is unavailable the measurements stay in the spool and the
+    replay is retried with a growing delay. At most max_pending measurements
+    are kept in memory; if the spool itself cannot be written the oldest ones
+    are dropped and counted in the metrics.
+    """
+    MAX_RETRY_DELAY = 60  # seconds
+
+    def __init__(self, spool, batch_size, flush_interval, max_pending):
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = deque()
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._replay_failures = 0
+        self._retry_at = 0
+        self._stats = {
+            'enqueued': 0,
+            'spooled': 0,
+            'written': 0,
+            'duplicates': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'errors': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'total_flush': 0.0,
+            'last_flush': 0.0,
+            'max_flush': 0.0,
+        }
+
+    def add(self, measure):
+        """Queues an unsaved MeasuresModel instance."""
+        if len(self.pending) >= self.max_pending:
+            self.pending.popleft()
+            self._stats['dropped'] += 1
+        self.pending.append(measure)
+        self._stats['enqueued'] += 1
+        self._ensure_task()
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Spools every pending measurement, then replays the spool into the database."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            while self.pending:
+                batch = self._next_batch()
+                try:
+                    # fsync runs off the ORM thread and off the event loop
+                    await sync_to_async(self.spool.append, thread_sensitive=False)(batch)
+                    self._stats['spooled'] += len(batch)
+                except OSError as e:
+                    print(f"measurement_writer.flush: Error spooling {len(batch)} measurements: {str(e)}")
+                    self._requeue(batch)
+                    break
+            await self.replay()
+
+    async def replay(self):
+        """Writes the sealed spool segments to MeasuresModel, oldest first."""
+        if time.monotonic() < self._retry_at:
+            return
+        self.spool.seal()
+        for number in self.spool.sealed_segments():
+            records = await sync_to_async(self.spool.read, thread_sensitive=False)(number)
+            try:
+                await sync_to_async(self._write)(records)
+            except Exception as e:
+                self._replay_failures += 1
+                self._stats['errors'] += 1
+                delay = min(self.MAX_RETRY_DELAY, 2 ** self._replay_failures)
+                self._retry_at = time.monotonic() + delay
+                print(f"measurement_writer.replay: Error writing spool segment {number}, retrying in {delay} s: {str(e)}")
+                return
+            self.spool.remove(number)
+        self._replay_failures = 0
+
+    def flush_sync(self):
+        """Blocking flush, used when the process exits."""
+        try:
+            self.spool.append(list(self.pending))
+            self.pending.clear()
+            self.spool.seal()
+            for number in self.spool.sealed_segments():
+                self._write(self.spool.read(number))
+                self.spool.remove(number)
+        except Exception as e:
+            print(f"measurement_writer.flush_sync: Measurements left in the spool: {str(e)}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def _next_batch(self):
+        return [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+
+    def _requeue(self, batch):
+        self._stats['errors'] += 1
+        self.pending.extendleft(reversed(batch))
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft()
+            self._stats['dropped'] += 1
+
+    def _write(self, records):
+        if not records:
+            return
+        started_at = time.monotonic()
+        # Sensors deleted while their measurements were spooled are skipped
+        sensor_ids = set(
+            SensorModel.objects.filter(id__in={record['s'] for record in records}).values_list('id', flat=True)
+        )
+        records = [record for record in records if record['s'] in sensor_ids]
+        for record in records:
+            if timezone.is_naive(record['d']):
+                record['d'] = timezone.make_aware(record['d'])
+        measures = [
+            MeasuresModel(
+                instrument_id=record['i'],
+                sensor_id=record['s'],
+                temperature=record['t'],
+                corrected_temperature=record['ct'],
+                humidity=record['h'],
+                corrected_humidity=record['ch'],
+                date=record['d'],
+                sample_count=record.get('n'),
+                **dict(zip(EXTREME_FIELDS, record.get('x') or ())),
+            )
+            for record in records
+        ]
+        # A segment left by a crash, or the same reading saved twice, is not duplicated
+        written = upsert_measures(measures, batch_size=self.batch_size)
+        elapsed = time.monotonic() - started_at
+        stats = self._stats
+        stats['written'] += written['created'] + written['updated']
+        stats['duplicates'] += written['unchanged'] + written['skipped']
+        stats['flushes'] += 1
+        stats['last_batch_size'] = len(measures)
+        stats['max_batch_size'] = max(stats['max_batch_size'], len(measures))
+        stats['total_flush'] += elapsed
+        stats['last_flush'] = elapsed
+        stats['max_flush'] = max(stats['max_flush'], elapsed)
+
+    def stats(self):
+        """Buffer occupancy, batch sizes and flush latency (in milliseconds)."""
+        stats = self._stats
+        return {
+            'pending': len(self.pending),
+            'max_pending': self.max_pending,
+            'batch_size': self.batch_size,
+            'flush_interval_s': self.flush_interval,
+            'enqueued': stats['enqueued'],
+            'spooled': stats['spooled'],
+            'written': stats['written'],
+            'duplicates': stats['duplicates'],
+            'dropped': stats['dropped'],
+            'flushes': stats['flushes'],
+            'errors': stats['errors'],
+            'database_available': self._replay_failures == 0,
+            'avg_batch_size': round(stats['written'] / stats['flushes'], 1) if stats['flushes'] else 0.0,
+            'last_batch_size': stats['last_batch_size'],
+            'max_batch_size': stats['max_batch_size'],
+            'avg_flush_ms': round(stats['total_flush'] / stats['flushes'] * 1000, 2) if stats['flushes'] else 0.0,
+            'last_flush_ms': round(stats['last_flush'] * 1000, 2),
+            'max_flush_ms': round(stats['max_flush'] * 1000, 2),
+            'spool': self.spool.stats(),
+        }
+
+
+_measurement_writer = None
+
+
+def get_measurement_writer():
+    global _measurement_writer
+    if _measurement_writer is None:
+        spool = MeasurementSpool(
+            getattr(settings, 'MEASUREMENT_SPOOL_DIR', settings.BASE_DIR / 'spool'),
+            segment_max_bytes=getattr(settings, 'MEASUREMENT_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024),
+            max_bytes=getattr(settings, 'MEASUREMENT_SPOOL_MAX_BYTES', 512 * 1024 * 1024),
+        )
+        _measurement_writer = MeasurementWriter(
+            spool,
+            batch_size=getattr(settings, 'MEASUREMENT_WRITER_BATCH_SIZE', 500),
+            flush_interval=getattr(settings, 'MEASUREMENT_WRITER_FLUSH_INTERVAL', 2.0),
+            max_pending=getattr(settings, 'MEASUREMENT_WRITER_MAX_PENDING', 50000),
+        )
+        atexit.register(_measurement_writer.flush_sync)
+    return _measurement_writer
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:17
+
+import django.contrib.auth.models
+import django.contrib.auth.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalibrationCertificateModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('calibration_date', models.DateField()),
+                ('next_calibration_date', models.DateField()),
+                ('certificate_number', models.CharField(max_length=100)),
+                ('temp_indication_point_1', models.FloatField()),
+                ('temp_correction_1', models.FloatField()),
+                ('temp_indication_point_2', models.FloatField()),
+                ('temp_correction_2', models.FloatField()),
+                ('temp_indication_point_3', models.FloatField()),
+                ('temp_correction_3', models.FloatField()),
+                ('humidity_indication_point_1', models.FloatField()),
+                ('humidity_correction_1', models.FloatField()),
+                ('humidity_indication_point_2', models.FloatField()),
+                ('humidity_correction_2', models.FloatField()),
+                ('humidity_indication_point_3', models.FloatField()),
+                ('humidity_correction_3', models.FloatField()),
+                ('temp_uncertainty', models.FloatField()),
+                ('humidity_uncertainty', models.FloatField()),
+            ],
+            options={
+                'ordering': ['-calibration_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ThermohygrometerModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.CharField(max_length=100)),
+                ('is_connected', models.BooleanField(default=False)),
+                ('time_interval_to_save_measures', models.IntegerField(default=5)),
+                ('equipment_fisical_location', models.CharField(blank=True, default='', max_length=100, null=True)),
+                ('pn', models.CharField(max_length=100)),
+                ('sn', models.CharField(max_length=100)),
+                ('instrument_name', models.CharField(max_length=100)),
+                ('group_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_connection_attempt', models.DateTimeField(blank=True, null=True)),
+                ('min_temperature', models.FloatField(blank=True, help_text='Minimum acceptable temperature value - moved to sensor level', null=True)),
+                ('max_temperature', models.FloatField(blank=True, help_text='Maximum acceptable temperature value - moved to sensor level', null=True)),
+                ('min_humidity', models.FloatField(blank=True, help_text='Minimum acceptable humidity value - moved to sensor level', null=True)),
+                ('max_humidity', models.FloatField(blank=True, help_text='Maximum acceptable humidity value - moved to sensor level', null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('name', models.CharField(max_length=100)),
+                ('is_manager', models.BooleanField(default=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SensorModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_name', models.CharField(max_length=100)),
+                ('location', models.CharField(blank=True, help_text='Room or location where the sensor is placed', max_length=100, null=True)),
+                ('sensor_sn', models.CharField(blank=True, max_length=100, null=True)),
+                ('sensor_pn', models.CharField(blank=True, max_length=100, null=True)),
+                ('channel', models.IntegerField(choices=[(1, 'Channel 1'), (2, 'Channel 2')], default=1)),
+                ('min_temperature', models.FloatField(blank=True, help_text='Minimum acceptable temperature value', null=True)),
+                ('max_temperature', models.FloatField(blank=True, help_text='Maximum acceptable temperature value', null=True)),
+                ('min_humidity', models.FloatField(blank=True, help_text='Minimum acceptable humidity value', null=True)),
+                ('max_humidity', models.FloatField(blank=True, help_text='Maximum acceptable humidity value', null=True)),
+                ('calibration_certificate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='fluke_data.calibrationcertificatemodel')),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sensors', to='fluke_data.thermohygrometermodel')),
+            ],
+            options={
+                'unique_together': {('instrument', 'channel')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MeasuresModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('temperature', models.FloatField(editable=False)),
+                ('corrected_temperature', models.FloatField(blank=True, editable=False, null=True)),
+                ('humidity', models.FloatField(editable=False)),
+                ('corrected_humidity', models.FloatField(blank=True, editable=False, null=True)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('pn', models.CharField(blank=True, editable=False, max_length=100, null=True)),
+                ('sn', models.CharField(blank=True, editable=False, max_length=100, null=True)),
+                ('sensor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='measures', to='fluke_data.sensormodel')),
+                ('instrument', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='fluke_data.thermohygrometermodel')),
+            ],
+        ),
+    ]
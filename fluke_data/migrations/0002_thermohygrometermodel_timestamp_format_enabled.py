@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thermohygrometermodel',
+            name='timestamp_format_enabled',
+            field=models.BooleanField(blank=True, help_text='FORM:TDST state seen on the last full handshake, reused on reconnect', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0002_thermohygrometermodel_timestamp_format_enabled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorrectionRecomputeJobModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateTimeField(blank=True, null=True)),
+                ('end_date', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('last_pk', models.BigIntegerField(default=0, help_text='Last MeasuresModel id already recomputed')),
+                ('rows_done', models.BigIntegerField(default=0)),
+                ('rows_total', models.BigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='correction_recompute_jobs', to='fluke_data.sensormodel')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
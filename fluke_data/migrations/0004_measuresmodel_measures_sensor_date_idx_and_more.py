@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0003_correctionrecomputejobmodel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='measuresmodel',
+            index=models.Index(fields=['sensor', 'date'], name='measures_sensor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='measuresmodel',
+            index=models.Index(fields=['instrument', 'date'], name='measures_instrument_date_idx'),
+        ),
+    ]
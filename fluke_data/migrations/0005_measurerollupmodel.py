@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0004_measuresmodel_measures_sensor_date_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasureRollupModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=6)),
+                ('bucket', models.DateTimeField(help_text='Start of the bucket (UTC)')),
+                ('count', models.IntegerField(default=0)),
+                ('temperature_min', models.FloatField()),
+                ('temperature_max', models.FloatField()),
+                ('temperature_sum', models.FloatField()),
+                ('humidity_min', models.FloatField()),
+                ('humidity_max', models.FloatField()),
+                ('humidity_sum', models.FloatField()),
+                ('corrected_temperature_count', models.IntegerField(default=0)),
+                ('corrected_temperature_min', models.FloatField(blank=True, null=True)),
+                ('corrected_temperature_max', models.FloatField(blank=True, null=True)),
+                ('corrected_temperature_sum', models.FloatField(blank=True, null=True)),
+                ('corrected_humidity_count', models.IntegerField(default=0)),
+                ('corrected_humidity_min', models.FloatField(blank=True, null=True)),
+                ('corrected_humidity_max', models.FloatField(blank=True, null=True)),
+                ('corrected_humidity_sum', models.FloatField(blank=True, null=True)),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='fluke_data.sensormodel')),
+            ],
+            options={
+                'unique_together': {('sensor', 'resolution', 'bucket')},
+            },
+        ),
+    ]
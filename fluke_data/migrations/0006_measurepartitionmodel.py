@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0005_measurerollupmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeasurePartitionModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month (UTC)', unique=True)),
+                ('table_name', models.CharField(max_length=100)),
+                ('row_count', models.BigIntegerField(default=0)),
+                ('sealed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
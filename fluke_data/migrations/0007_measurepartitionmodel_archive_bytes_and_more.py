@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0006_measurepartitionmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='measurepartitionmodel',
+            name='archive_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='measurepartitionmodel',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, help_text='Set once the table was replaced by Parquet files', null=True),
+        ),
+    ]
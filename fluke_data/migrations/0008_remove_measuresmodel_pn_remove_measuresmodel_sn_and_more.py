@@ -0,0 +1,120 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:09
+
+import django.db.models.deletion
+import django.utils.timezone
+import fluke_data.fields
+from django.db import migrations, models
+
+# Hundredths, the scale of the ScaledIntegerField columns the values are converted to
+SCALE = 100
+VALUE_COLUMNS = ('temperature', 'corrected_temperature', 'humidity', 'corrected_humidity')
+
+
+def convert_to_compact_format(apps, schema_editor):
+    # Runs before pn and sn are removed and the value and date columns change type, so a
+    # failure rolls the whole migration back
+    from fluke_data.partitions import convert_legacy_partitions
+
+    db_connection = schema_editor.connection
+    quote = db_connection.ops.quote_name
+    measures = quote(apps.get_model('fluke_data', 'MeasuresModel')._meta.db_table)
+    identity_table = apps.get_model('fluke_data', 'InstrumentIdentityModel')._meta.db_table
+    identities = quote(identity_table)
+    partitions = list(apps.get_model('fluke_data', 'MeasurePartitionModel').objects.filter(
+        archived_at__isnull=True).values_list('month', 'table_name'))
+    values = ', '.join(f"{column} = CAST(ROUND({column} * {SCALE}) AS INTEGER)" for column in VALUE_COLUMNS)
+
+    with db_connection.cursor() as cursor:
+        tables = set(db_connection.introspection.table_names(cursor))
+        sources = [measures] + [quote(table) for _, table in partitions if table in tables]
+        for source in sources:
+            # The unique (pn, sn) index is only created at the end of the migration
+            cursor.execute(
+                f"INSERT INTO {identities} (pn, sn) SELECT DISTINCT pn, sn FROM {source} AS legacy "
+                f"WHERE pn IS NOT NULL AND sn IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {identities} AS identity "
+                f"WHERE identity.pn = legacy.pn AND identity.sn = legacy.sn)"
+            )
+        cursor.execute(
+            f"UPDATE {measures} SET {values}, date = CAST(strftime('%s', date) AS INTEGER), "
+            f"identity_id = (SELECT id FROM {identities} AS identity "
+            f"WHERE identity.pn = {measures}.pn AND identity.sn = {measures}.sn)"
+        )
+        converted = cursor.rowcount
+    converted += convert_legacy_partitions(db_connection, [month for month, _ in partitions], identity_table)
+    if converted:
+        print(f"migrations.0008: {converted} measurements converted to the compact format")
+
+
+def convert_to_legacy_format(apps, schema_editor):
+    # Partition tables are outside the migrations and keep the compact format
+    db_connection = schema_editor.connection
+    quote = db_connection.ops.quote_name
+    measures = quote(apps.get_model('fluke_data', 'MeasuresModel')._meta.db_table)
+    identities = quote(apps.get_model('fluke_data', 'InstrumentIdentityModel')._meta.db_table)
+    values = ', '.join(f"{column} = {column} / {SCALE}.0" for column in VALUE_COLUMNS)
+    with db_connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {measures} SET {values}, date = strftime('%Y-%m-%d %H:%M:%S', date, 'unixepoch'), "
+            f"pn = (SELECT pn FROM {identities} AS identity WHERE identity.id = {measures}.identity_id), "
+            f"sn = (SELECT sn FROM {identities} AS identity WHERE identity.id = {measures}.identity_id)"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0007_measurepartitionmodel_archive_bytes_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstrumentIdentityModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pn', models.CharField(max_length=100)),
+                ('sn', models.CharField(max_length=100)),
+            ],
+            options={
+                'unique_together': {('pn', 'sn')},
+            },
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='identity',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='fluke_data.instrumentidentitymodel'),
+        ),
+        migrations.RunPython(convert_to_compact_format, convert_to_legacy_format),
+        migrations.RemoveField(
+            model_name='measuresmodel',
+            name='pn',
+        ),
+        migrations.RemoveField(
+            model_name='measuresmodel',
+            name='sn',
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='corrected_humidity',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='corrected_temperature',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='date',
+            field=fluke_data.fields.EpochDateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='humidity',
+            field=fluke_data.fields.ScaledIntegerField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='temperature',
+            field=fluke_data.fields.ScaledIntegerField(editable=False),
+        ),
+    ]
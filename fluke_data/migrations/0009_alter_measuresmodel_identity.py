@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0008_remove_measuresmodel_pn_remove_measuresmodel_sn_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='identity',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='fluke_data.instrumentidentitymodel'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0009_alter_measuresmodel_identity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensormodel',
+            name='humidity_tolerance',
+            field=models.FloatField(default=0.5, help_text='Humidity change (%) that makes the compression modes save a reading'),
+        ),
+        migrations.AddField(
+            model_name='sensormodel',
+            name='storage_mode',
+            field=models.CharField(choices=[('interval', 'Fixed interval'), ('deadband', 'Deadband'), ('swinging_door', 'Swinging door')], default='interval', help_text='Fixed interval saves one reading every time_interval_to_save_measures minutes; the compression modes save a reading only when the signal changes, and at least every time_interval_to_save_measures minutes', max_length=13),
+        ),
+        migrations.AddField(
+            model_name='sensormodel',
+            name='temperature_tolerance',
+            field=models.FloatField(default=0.1, help_text='Temperature change (°C) that makes the compression modes save a reading'),
+        ),
+    ]
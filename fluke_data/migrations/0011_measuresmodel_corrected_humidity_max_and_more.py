@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:23
+
+import fluke_data.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0010_sensormodel_humidity_tolerance_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='corrected_humidity_max',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='corrected_humidity_min',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='corrected_temperature_max',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='corrected_temperature_min',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='humidity_max',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='humidity_min',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='sample_count',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='temperature_max',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='measuresmodel',
+            name='temperature_min',
+            field=fluke_data.fields.ScaledIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sensormodel',
+            name='storage_mode',
+            field=models.CharField(choices=[('interval', 'Fixed interval'), ('deadband', 'Deadband'), ('swinging_door', 'Swinging door'), ('aggregate', 'Interval aggregate')], default='interval', help_text='Fixed interval saves one reading every time_interval_to_save_measures minutes; interval aggregate saves the mean, min and max of every reading of the interval instead; the compression modes save a reading only when the signal changes, and at least every time_interval_to_save_measures minutes', max_length=13),
+        ),
+    ]
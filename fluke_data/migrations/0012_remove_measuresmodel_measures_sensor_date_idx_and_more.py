@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def deduplicate_measures(apps, schema_editor):
+    # After 0008 made dates whole seconds, and while the (sensor, date) index still exists
+    from fluke_data.partitions import deduplicate_measures
+
+    partitions = apps.get_model('fluke_data', 'MeasurePartitionModel').objects.filter(archived_at__isnull=True)
+    deduplicate_measures(
+        schema_editor.connection,
+        [apps.get_model('fluke_data', 'MeasuresModel')._meta.db_table] + list(partitions.values_list('table_name', flat=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0011_measuresmodel_corrected_humidity_max_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_measures, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='measuresmodel',
+            name='measures_sensor_date_idx',
+        ),
+        migrations.AlterField(
+            model_name='measuresmodel',
+            name='sensor',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='measures', to='fluke_data.sensormodel'),
+        ),
+        migrations.AddConstraint(
+            model_name='measuresmodel',
+            constraint=models.UniqueConstraint(fields=('sensor', 'date'), name='measures_sensor_date_uniq'),
+        ),
+    ]
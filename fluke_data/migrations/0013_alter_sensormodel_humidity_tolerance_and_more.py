@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0012_remove_measuresmodel_measures_sensor_date_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sensormodel',
+            name='humidity_tolerance',
+            field=models.FloatField(default=0.5, help_text='Humidity change (%) that makes the compression modes save a reading', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='sensormodel',
+            name='temperature_tolerance',
+            field=models.FloatField(default=0.1, help_text='Temperature change (°C) that makes the compression modes save a reading', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
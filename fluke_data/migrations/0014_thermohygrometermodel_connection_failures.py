@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fluke_data', '0013_alter_sensormodel_humidity_tolerance_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thermohygrometermodel',
+            name='connection_failures',
+            field=models.IntegerField(default=0, editable=False, help_text='Failed connection attempts in a row, restored by the reconnect scheduler after a restart'),
+        ),
+    ]
@@ -1,8 +1,11 @@
 # fluke_data/models.py
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils import timezone
 
+from .fields import EpochDateTimeField, ScaledIntegerField
+
 
 class CalibrationCertificateModel(models.Model):
     calibration_date = models.DateField()
@@ -46,6 +49,8 @@ class ThermohygrometerModel(models.Model):
     instrument_name = models.CharField(max_length=100)
     group_name = models.CharField(max_length=100, null=True, blank=True)
     last_connection_attempt = models.DateTimeField(null=True, blank=True)
+    connection_failures = models.IntegerField(default=0, editable=False, help_text="Failed connection attempts in a row, restored by the reconnect scheduler after a restart")
+    timestamp_format_enabled = models.BooleanField(null=True, blank=True, help_text="FORM:TDST state seen on the last full handshake, reused on reconnect")
 
     # For backward compatibility
     min_temperature = models.FloatField(null=True, blank=True, help_text="Minimum acceptable temperature value - moved to sensor level")
@@ -57,8 +62,12 @@ class ThermohygrometerModel(models.Model):
         return f"{self.instrument_name} (PN: {self.pn}, SN: {self.sn})"
     
     def delete(self, *args, **kwargs):
+        from .partitions import update_measures
+
         # Before deleting, update related Measures with the pn and sn
-        MeasuresModel.objects.filter(instrument=self).update(pn=self.pn, sn=self.sn)
+        identity, _ = InstrumentIdentityModel.objects.get_or_create(pn=self.pn, sn=self.sn)
+        MeasuresModel.objects.filter(instrument=self).update(identity=identity)
+        update_measures({'identity_id': identity.id}, instrument_id=self.id)
         super().delete(*args, **kwargs)
 
 
@@ -79,6 +88,17 @@ class SensorModel(models.Model):
     # Add calibration certificate field to sensor
     calibration_certificate = models.ForeignKey(CalibrationCertificateModel, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Storage policy, see fluke_data.compression
+    STORAGE_MODE_CHOICES = (
+        ('interval', 'Fixed interval'),
+        ('deadband', 'Deadband'),
+        ('swinging_door', 'Swinging door'),
+        ('aggregate', 'Interval aggregate'),
+    )
+    storage_mode = models.CharField(max_length=13, choices=STORAGE_MODE_CHOICES, default='interval', help_text="Fixed interval saves one reading every time_interval_to_save_measures minutes; interval aggregate saves the mean, min and max of every reading of the interval instead; the compression modes save a reading only when the signal changes, and at least every time_interval_to_save_measures minutes")
+    temperature_tolerance = models.FloatField(default=0.1, validators=[MinValueValidator(0)], help_text="Temperature change (°C) that makes the compression modes save a reading")
+    humidity_tolerance = models.FloatField(default=0.5, validators=[MinValueValidator(0)], help_text="Humidity change (%) that makes the compression modes save a reading")
+
     class Meta:
         unique_together = [['instrument', 'channel']]
     
@@ -86,16 +106,144 @@ class SensorModel(models.Model):
         return f"Channel: {self.channel} - {self.location}"
 
 
+class InstrumentIdentityModel(models.Model):
+    """PN and SN of a deleted instrument, shared by the measurements it left."""
+    pn = models.CharField(max_length=100)
+    sn = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = [['pn', 'sn']]
+
+    def __str__(self):
+        return f"PN: {self.pn}, SN: {self.sn}"
+
+
 class MeasuresModel(models.Model):
+    # Values are stored in hundredths and dates in epoch seconds, see fluke_data.fields
     instrument = models.ForeignKey(ThermohygrometerModel, on_delete=models.CASCADE, null=True)
-    temperature = models.FloatField(editable=False)
-    corrected_temperature = models.FloatField(editable=False, null=True, blank=True)
-    humidity = models.FloatField(editable=False)
-    corrected_humidity = models.FloatField(editable=False, null=True, blank=True)
-    date = models.DateTimeField(default=timezone.now)
-    pn = models.CharField(max_length=100, blank=True, null=True, editable=False)
-    sn = models.CharField(max_length=100, blank=True, null=True, editable=False)
-    sensor = models.ForeignKey(SensorModel, on_delete=models.CASCADE, null=True, related_name='measures')
+    temperature = ScaledIntegerField(editable=False)
+    corrected_temperature = ScaledIntegerField(editable=False, null=True, blank=True)
+    humidity = ScaledIntegerField(editable=False)
+    corrected_humidity = ScaledIntegerField(editable=False, null=True, blank=True)
+    date = EpochDateTimeField(default=timezone.now)
+    # Only set once the instrument is deleted, never queried by it
+    identity = models.ForeignKey(InstrumentIdentityModel, on_delete=models.SET_NULL, null=True, blank=True, editable=False, db_index=False)
+    # Lookups by sensor use the (sensor, date) unique constraint
+    sensor = models.ForeignKey(SensorModel, on_delete=models.CASCADE, null=True, related_name='measures', db_index=False)
+    # Rows of the interval aggregate storage mode summarize every reading polled during the
+    # save interval: the values above are then means, and the date is the one of the last reading
+    sample_count = models.IntegerField(null=True, blank=True, editable=False)
+    temperature_min = ScaledIntegerField(editable=False, null=True, blank=True)
+    temperature_max = ScaledIntegerField(editable=False, null=True, blank=True)
+    humidity_min = ScaledIntegerField(editable=False, null=True, blank=True)
+    humidity_max = ScaledIntegerField(editable=False, null=True, blank=True)
+    corrected_temperature_min = ScaledIntegerField(editable=False, null=True, blank=True)
+    corrected_temperature_max = ScaledIntegerField(editable=False, null=True, blank=True)
+    corrected_humidity_min = ScaledIntegerField(editable=False, null=True, blank=True)
+    corrected_humidity_max = ScaledIntegerField(editable=False, null=True, blank=True)
+
+    class Meta:
+        # History queries filter by sensor or instrument plus a date range and order by date
+        indexes = [
+            models.Index(fields=['instrument', 'date'], name='measures_instrument_date_idx'),
+        ]
+        # One measurement per sensor and date, so replays and re-imports are idempotent
+        # (see fluke_data.ingest); the unique index also serves the sensor queries
+        constraints = [
+            models.UniqueConstraint(fields=['sensor', 'date'], name='measures_sensor_date_uniq'),
+        ]
+
+    @property
+    def pn(self):
+        return self.identity.pn if self.identity_id else None
+
+    @property
+    def sn(self):
+        return self.identity.sn if self.identity_id else None
+
+
+class MeasurePartitionModel(models.Model):
+    """
+    A closed month of measurements moved out of MeasuresModel into its own
+    table (see fluke_data.partitions), later possibly into per-sensor Parquet
+    files (see fluke_data.archive).
+    """
+    month = models.DateField(unique=True, help_text="First day of the month (UTC)")
+    table_name = models.CharField(max_length=100)
+    row_count = models.BigIntegerField(default=0)
+    sealed_at = models.DateTimeField(auto_now=True)
+    archived_at = models.DateTimeField(null=True, blank=True, help_text="Set once the table was replaced by Parquet files")
+    archive_bytes = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.row_count} rows{', archived' if self.archived_at else ''})"
+
+
+class MeasureRollupModel(models.Model):
+    """
+    Aggregates of the measurements of one sensor over a time bucket, kept up to
+    date as measurements are written (see fluke_data.rollups).
+    """
+    RESOLUTION_CHOICES = (
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+
+    sensor = models.ForeignKey(SensorModel, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.CharField(max_length=6, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField(help_text="Start of the bucket (UTC)")
+    count = models.IntegerField(default=0)
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    temperature_sum = models.FloatField()
+    humidity_min = models.FloatField()
+    humidity_max = models.FloatField()
+    humidity_sum = models.FloatField()
+    corrected_temperature_count = models.IntegerField(default=0)
+    corrected_temperature_min = models.FloatField(null=True, blank=True)
+    corrected_temperature_max = models.FloatField(null=True, blank=True)
+    corrected_temperature_sum = models.FloatField(null=True, blank=True)
+    corrected_humidity_count = models.IntegerField(default=0)
+    corrected_humidity_min = models.FloatField(null=True, blank=True)
+    corrected_humidity_max = models.FloatField(null=True, blank=True)
+    corrected_humidity_sum = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['sensor', 'resolution', 'bucket']]
+
+    def __str__(self):
+        return f"{self.sensor} {self.resolution} {self.bucket}"
+
+
+class CorrectionRecomputeJobModel(models.Model):
+    """Progress of a recomputation of corrected values (see fluke_data.recompute)."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    sensor = models.ForeignKey(SensorModel, on_delete=models.CASCADE, related_name='correction_recompute_jobs')
+    start_date = models.DateTimeField(null=True, blank=True)
+    end_date = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    last_pk = models.BigIntegerField(default=0, help_text="Last MeasuresModel id already recomputed")
+    rows_done = models.BigIntegerField(default=0)
+    rows_total = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Recompute {self.sensor} ({self.status}, {self.rows_done}/{self.rows_total})"
 
 
 class CustomUser(AbstractUser):
@@ -0,0 +1,383 @@
+# fluke_data/partitions.py
+
+import heapq
+from datetime import date as date_type, datetime, timezone as dt_timezone
+from operator import attrgetter, itemgetter
+
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from .fields import EpochDateTimeField, ScaledIntegerField
+from .models import MeasurePartitionModel, MeasuresModel
+
+# Extremes of the readings summarized by the rows of the interval aggregate storage mode
+EXTREME_FIELDS = tuple(
+    f"{field}_{bound}"
+    for field in ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity') for bound in ('min', 'max')
+)
+
+# Columns shared by MeasuresModel and the partition tables
+COLUMNS = (
+    'id', 'instrument_id', 'sensor_id', 'temperature', 'corrected_temperature',
+    'humidity', 'corrected_humidity', 'date', 'identity_id', 'sample_count',
+) + EXTREME_FIELDS
+
+# (measurement type, column, corrected column) of every value the calibration applies to
+CORRECTIONS = tuple(
+    (measurement_type, f"{measurement_type}{suffix}", f"corrected_{measurement_type}{suffix}")
+    for suffix in ('', '_min', '_max') for measurement_type in ('temperature', 'humidity')
+)
+
+# Sensors whose duplicate measurements the migrations deleted, their rollups are rebuilt after migrate
+deduplicated_sensors = set()
+
+# Partition models live in their own registry, out of the migrations and the admin
+_partition_apps = Apps()
+_partition_models = {}
+
+
+def month_of(date):
+    """First day (UTC) of the month of a date or datetime."""
+    if isinstance(date, datetime):
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        date = date.astimezone(dt_timezone.utc).date()
+    return date.replace(day=1)
+
+
+def next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date_type(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """[start, end) of a month as aware UTC datetimes."""
+    following = next_month(month)
+    return (datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+            datetime(following.year, following.month, 1, tzinfo=dt_timezone.utc))
+
+
+def partition_table(month):
+    return f"fluke_data_measures_{month:%Y%m}"
+
+
+def get_partition_model(month):
+    """Unmanaged model over the table of a month, with the MeasuresModel field names."""
+    model = _partition_models.get(month)
+    if model is None:
+        suffix = f"{month:%Y%m}"
+        meta = type('Meta', (), {
+            'app_label': 'fluke_data',
+            'apps': _partition_apps,
+            'db_table': partition_table(month),
+            'managed': False,
+            'indexes': [
+                models.Index(fields=['instrument_id', 'date'], name=f'measures_{suffix}_instr_date'),
+            ],
+            'constraints': [
+                models.UniqueConstraint(fields=['sensor_id', 'date'], name=f'measures_{suffix}_sensor_date_uniq'),
+            ],
+        })
+        model = _partition_models[month] = type(f'MeasuresPartition{suffix}', (models.Model,), {
+            '__module__': __name__,
+            'Meta': meta,
+            # Rows keep their MeasuresModel id, which AUTOINCREMENT never reuses
+            'id': models.BigIntegerField(primary_key=True),
+            'instrument_id': models.BigIntegerField(null=True),
+            'sensor_id': models.BigIntegerField(null=True),
+            'temperature': ScaledIntegerField(),
+            'corrected_temperature': ScaledIntegerField(null=True),
+            'humidity': ScaledIntegerField(),
+            'corrected_humidity': ScaledIntegerField(null=True),
+            'date': EpochDateTimeField(),
+            'identity_id': models.BigIntegerField(null=True),
+            'sample_count': models.IntegerField(null=True),
+            **{column: ScaledIntegerField(null=True) for column in EXTREME_FIELDS},
+        })
+    return model
+
+
+def get_partitions(start=None, end=None, archived=False):
+    """Catalog entries of the partitions overlapping [start, end], still in SQLite or archived."""
+    partitions = MeasurePartitionModel.objects.filter(archived_at__isnull=not archived)
+    if start:
+        partitions = partitions.filter(month__gte=month_of(start))
+    if end:
+        partitions = partitions.filter(month__lte=month_of(end))
+    return list(partitions)
+
+
+def measure_querysets(start=None, end=None, *args, **filters):
+    """
+    Querysets over MeasuresModel and over the partitions [start, end] needs,
+    each filtered by the date range and by the given lookups. Use sensor_id
+    and instrument_id rather than the relations, partitions have no foreign keys.
+    """
+    if start and end:
+        filters['date__range'] = (start, end)
+    elif start:
+        filters['date__gte'] = start
+    elif end:
+        filters['date__lte'] = end
+    querysets = [MeasuresModel.objects.filter(*args, **filters)]
+    for partition in get_partitions(start, end):
+        querysets.append(get_partition_model(partition.month).objects.filter(*args, **filters))
+    return querysets
+
+
+def iterate_measures(start=None, end=None, *args, order='date', fields=None, chunk_size=2000, **filters):
+    """
+    Measurements of MeasuresModel, the partitions and the Parquet archive in
+    date order ('date' or '-date'), as instances or, with fields, as
+    values_list tuples.
+    """
+    from .archive import iterate_archive
+
+    reverse = order.startswith('-')
+    iterators = []
+    for queryset in measure_querysets(start, end, *args, **filters):
+        queryset = queryset.order_by(order)
+        if fields:
+            queryset = queryset.values_list(*fields)
+        iterators.append(queryset.iterator(chunk_size=chunk_size))
+    iterators.append(iterate_archive(start, end, *args, order=order, fields=fields, **filters))
+    key = itemgetter(fields.index('date')) if fields else attrgetter('date')
+    return heapq.merge(*iterators, key=key, reverse=reverse)
+
+
+def count_measures(start=None, end=None, *args, **filters):
+    from .archive import read_archive
+
+    return (sum(queryset.count() for queryset in measure_querysets(start, end, *args, **filters))
+            + len(read_archive(start, end, *args, columns=('date',), **filters)))
+
+
+def delete_measures(*args, **filters):
+    """Deletes matching rows from the partitions; MeasuresModel rows follow the usual cascades."""
+    for partition in get_partitions():
+        get_partition_model(partition.month).objects.filter(*args, **filters).delete()
+
+
+def update_measures(values, *args, **filters):
+    for partition in get_partitions():
+        get_partition_model(partition.month).objects.filter(*args, **filters).update(**values)
+
+
+def _create_partition_table(month, db_connection=connection):
+    model = get_partition_model(month)
+    if model._meta.db_table not in db_connection.introspection.table_names():
+        # The SQLite schema editor cannot run inside an atomic block
+        with db_connection.schema_editor() as editor:
+            editor.create_model(model)
+    _create_partition_columns(model, db_connection)
+    _create_partition_indexes(model, db_connection)
+    return model
+
+
+def _create_partition_columns(model, db_connection=connection):
+    # Tables created before a column was added to MeasuresModel get it, empty
+    with db_connection.cursor() as cursor:
+        existing = {column.name for column in db_connection.introspection.get_table_description(cursor, model._meta.db_table)}
+    missing = [field for field in model._meta.local_fields if field.column not in existing]
+    if missing:
+        with db_connection.schema_editor() as editor:
+            for field in missing:
+                editor.add_field(model, field)
+
+
+def _partition_index_names(model):
+    # The non-unique (sensor_id, date) index of the tables created before the unique constraint
+    obsolete = model._meta.db_table.replace('fluke_data_', '') + '_sensor_date'
+    return [index.name for index in model._meta.indexes + model._meta.constraints] + [obsolete]
+
+
+def _create_partition_indexes(model, db_connection=connection):
+    # create_model skips the Meta.indexes and Meta.constraints of unmanaged models
+    with db_connection.cursor() as cursor:
+        existing = db_connection.introspection.get_constraints(cursor, model._meta.db_table)
+    missing = [index for index in model._meta.indexes + model._meta.constraints if index.name not in existing]
+    if missing:
+        with db_connection.schema_editor() as editor:
+            for index in missing:
+                # A unique index: add_constraint would make the SQLite schema editor rebuild the table
+                editor.execute(index.create_sql(model, editor))
+            editor.execute(f"DROP INDEX IF EXISTS {editor.quote_name(_partition_index_names(model)[-1])}")
+
+
+def seal_month(month):
+    """
+    Moves the rows of a month from MeasuresModel to its partition table.
+    Running it again moves rows that arrived late, e.g. from a backfill.
+    """
+    partition = MeasurePartitionModel.objects.filter(month=month).first()
+    if partition and partition.archived_at:
+        from .archive import append_to_archive
+
+        return append_to_archive(partition)
+    model = _create_partition_table(month)
+    start, end = month_bounds(month)
+    source = connection.ops.quote_name(MeasuresModel._meta.db_table)
+    target = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(COLUMNS)
+    date_field = MeasuresModel._meta.get_field('date')
+    bounds = [date_field.get_db_prep_value(start, connection), date_field.get_db_prep_value(end, connection)]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                # A measurement already sealed for the same sensor and date is kept, see fluke_data.ingest
+                f"INSERT OR IGNORE INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE date >= %s AND date < %s",
+                bounds,
+            )
+            moved = cursor.rowcount
+            cursor.execute(f"DELETE FROM {source} WHERE date >= %s AND date < %s", bounds)
+        partition, _ = MeasurePartitionModel.objects.get_or_create(month=month, defaults={'table_name': model._meta.db_table})
+        partition.row_count += moved
+        partition.save()
+    return moved
+
+
+def seal_closed_months(hot_months=None, today=None):
+    """
+    Seals every month older than the last hot_months (MEASUREMENT_HOT_MONTHS),
+    which stay in MeasuresModel for the live views and late backfills.
+    """
+    if hot_months is None:
+        hot_months = getattr(settings, 'MEASUREMENT_HOT_MONTHS', 2)
+    cutoff = add_months(month_of(today or timezone.now()), -(max(hot_months, 1) - 1))
+    cutoff_date = month_bounds(cutoff)[0]
+    sealed = {}
+    while True:
+        oldest = MeasuresModel.objects.filter(date__lt=cutoff_date).order_by('date').values_list('date', flat=True).first()
+        if oldest is None:
+            return sealed
+        month = month_of(oldest)
+        sealed[month] = seal_month(month)
+
+
+def drop_partition(partition):
+    """Drops the table or the archive of a partition; the cost does not depend on its row count."""
+    if partition.archived_at:
+        from .archive import remove_archive
+
+        remove_archive(partition.month)
+    else:
+        with connection.schema_editor() as editor:
+            editor.delete_model(get_partition_model(partition.month))
+    partition.delete()
+
+
+def apply_retention(retention_months=None, today=None):
+    """
+    Drops the partitions older than retention_months (MEASUREMENT_RETENTION_MONTHS,
+    unset keeps everything). Rollups are kept.
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, 'MEASUREMENT_RETENTION_MONTHS', None)
+    if not retention_months:  # 0 keeps everything too
+        return []
+    cutoff = add_months(month_of(today or timezone.now()), -retention_months)
+    dropped = []
+    for partition in MeasurePartitionModel.objects.filter(month__lt=cutoff):
+        drop_partition(partition)
+        dropped.append(partition.month)
+    return dropped
+
+
+def convert_legacy_partitions(db_connection, months, identity_table):
+    """
+    Rebuilds the partition tables of the given months written before the
+    compact format (float values, text dates, pn and sn) with the current
+    columns, the pn and sn of each row replaced by the id of its row of
+    identity_table. Run by migration 0008, inside its transaction, once the
+    identities are created. Returns the number of rows converted.
+    """
+    tables = set(db_connection.introspection.table_names())
+    scale = MeasuresModel._meta.get_field('temperature').scale
+    values = ', '.join(
+        f"CAST(ROUND(legacy.{column} * {scale}) AS INTEGER)" if column in (
+            'temperature', 'corrected_temperature', 'humidity', 'corrected_humidity'
+        ) else f"legacy.{column}"
+        for column in COLUMNS[:7]
+    )
+    identities = db_connection.ops.quote_name(identity_table)
+    converted = 0
+    with db_connection.cursor() as cursor:
+        for month in months:
+            model = get_partition_model(month)
+            table = model._meta.db_table
+            if table not in tables:
+                continue
+            columns = {column.name for column in db_connection.introspection.get_table_description(cursor, table)}
+            if 'pn' not in columns:
+                continue
+            legacy = f"{table}_legacy"
+            cursor.execute(f"ALTER TABLE {db_connection.ops.quote_name(table)} RENAME TO {db_connection.ops.quote_name(legacy)}")
+            for name in _partition_index_names(model):
+                cursor.execute(f"DROP INDEX IF EXISTS {db_connection.ops.quote_name(name)}")
+            _create_partition_table(month, db_connection)
+            # Readings of a sensor within the same second become duplicates once dates are whole
+            # seconds; the unique index of the new table keeps the oldest
+            cursor.execute(
+                f"SELECT DISTINCT sensor_id FROM {db_connection.ops.quote_name(legacy)} WHERE sensor_id IS NOT NULL "
+                f"GROUP BY sensor_id, CAST(strftime('%s', date) AS INTEGER) HAVING COUNT(*) > 1"
+            )
+            deduplicated_sensors.update(row[0] for row in cursor.fetchall())
+            cursor.execute(
+                f"INSERT OR IGNORE INTO {db_connection.ops.quote_name(table)} ({', '.join(COLUMNS[:9])}) "
+                f"SELECT {values}, CAST(strftime('%s', legacy.date) AS INTEGER), identity.id "
+                f"FROM {db_connection.ops.quote_name(legacy)} AS legacy "
+                f"LEFT JOIN {identities} AS identity ON identity.pn = legacy.pn AND identity.sn = legacy.sn "
+                f"ORDER BY legacy.id"
+            )
+            converted += cursor.rowcount
+            cursor.execute(f"DROP TABLE {db_connection.ops.quote_name(legacy)}")
+    return converted
+
+
+def update_partition_tables(using='default'):
+    """
+    Adds the columns and indexes added to MeasuresModel since a partition
+    table was created. Partition tables are outside the migrations, so this
+    runs after every migrate and does nothing once they are up to date.
+    """
+    db_connection = connections[using]
+    tables = set(db_connection.introspection.table_names())
+    if MeasurePartitionModel._meta.db_table not in tables:
+        return
+    for partition in MeasurePartitionModel.objects.using(using).filter(archived_at__isnull=True):
+        if partition.table_name in tables:
+            model = get_partition_model(partition.month)
+            _create_partition_columns(model, db_connection)
+            _create_partition_indexes(model, db_connection)
+
+
+def deduplicate_measures(db_connection, tables):
+    """
+    Deletes the measurements of the given tables that repeat the sensor and
+    date of an older one. Run by migration 0012 before the (sensor, date)
+    unique constraint is created, on the whole-second dates of the compact
+    format. The sensors are added to deduplicated_sensors.
+    """
+    existing = set(db_connection.introspection.table_names())
+    deleted = 0
+    with db_connection.cursor() as cursor:
+        for table in tables:
+            if table not in existing:
+                continue
+            table = db_connection.ops.quote_name(table)
+            # The (sensor_id, date) index makes the lookup of the older row cheap
+            duplicate = (f"sensor_id IS NOT NULL AND EXISTS (SELECT 1 FROM {table} AS older "
+                         f"WHERE older.sensor_id = {table}.sensor_id AND older.date = {table}.date AND older.id < {table}.id)")
+            cursor.execute(f"SELECT DISTINCT sensor_id FROM {table} WHERE {duplicate}")
+            deduplicated_sensors.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f"DELETE FROM {table} WHERE {duplicate}")
+            deleted += cursor.rowcount
+    if deleted:
+        print(f"partitions.deduplicate_measures: {deleted} duplicate measurements deleted")
+    return deleted
@@ -0,0 +1,274 @@
+# fluke_data/rollups.py
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import MeasureRollupModel, MeasuresModel, SensorModel
+from .archive import read_archive
+from .partitions import EXTREME_FIELDS, iterate_measures, measure_querysets
+
+# Coarsest first, bucket length in seconds
+RESOLUTIONS = (
+    ('day', 86400),
+    ('hour', 3600),
+    ('minute', 60),
+)
+
+VALUE_FIELDS = ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity')
+
+_UPSERT_COLUMNS = (
+    'sensor_id', 'resolution', 'bucket', 'count',
+    'temperature_min', 'temperature_max', 'temperature_sum',
+    'humidity_min', 'humidity_max', 'humidity_sum',
+    'corrected_temperature_count', 'corrected_temperature_min', 'corrected_temperature_max', 'corrected_temperature_sum',
+    'corrected_humidity_count', 'corrected_humidity_min', 'corrected_humidity_max', 'corrected_humidity_sum',
+)
+
+
+def _upsert_assignment(column):
+    if column.endswith('_count') or column == 'count':
+        return f"{column} = {column} + excluded.{column}"
+    if column.endswith('_sum'):
+        return f"{column} = COALESCE({column}, 0) + COALESCE(excluded.{column}, 0)"
+    # SQLite's multi-argument MIN/MAX return NULL if any argument is NULL
+    function = 'MIN' if column.endswith('_min') else 'MAX'
+    return f"{column} = {function}(COALESCE({column}, excluded.{column}), COALESCE(excluded.{column}, {column}))"
+
+
+def _aware(date):
+    # Naive dates are read in the current time zone, like Django does in queries
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+def floor_date(date, seconds):
+    timestamp = _aware(date).timestamp()
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def ceil_date(date, seconds):
+    floored = floor_date(date, seconds)
+    return floored if floored == _aware(date) else floored + timedelta(seconds=seconds)
+
+
+class RollupAccumulator:
+    """
+    Pre-aggregates measurements per (sensor, resolution, bucket) in memory and
+    merges them into MeasureRollupModel with one upsert per bucket.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, sensor_id, date, temperature, humidity, corrected_temperature=None, corrected_humidity=None, extremes=None):
+        """extremes: the EXTREME_FIELDS of the row, whose min and max replace the value's when set."""
+        values = (temperature, humidity, corrected_temperature, corrected_humidity)
+        bounds = [(value, value) for value in values]
+        if extremes:
+            bounds = [
+                (value if low is None else low, value if high is None else high)
+                for value, low, high in zip(values, extremes[0::2], extremes[1::2])
+            ]
+        (temperature_min, temperature_max), (humidity_min, humidity_max) = bounds[:2]
+        timestamp = _aware(date).timestamp()
+        for resolution, seconds in RESOLUTIONS:
+            key = (sensor_id, resolution, timestamp - timestamp % seconds)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = bucket = [0, temperature_min, temperature_max, 0.0, humidity_min, humidity_max, 0.0,
+                                              0, None, None, None, 0, None, None, None]
+            bucket[0] += 1
+            bucket[1] = min(bucket[1], temperature_min)
+            bucket[2] = max(bucket[2], temperature_max)
+            bucket[3] += temperature
+            bucket[4] = min(bucket[4], humidity_min)
+            bucket[5] = max(bucket[5], humidity_max)
+            bucket[6] += humidity
+            for offset, value, (low, high) in ((7, corrected_temperature, bounds[2]), (11, corrected_humidity, bounds[3])):
+                if value is None:
+                    continue
+                bucket[offset] += 1
+                bucket[offset + 1] = low if bucket[offset + 1] is None else min(bucket[offset + 1], low)
+                bucket[offset + 2] = high if bucket[offset + 2] is None else max(bucket[offset + 2], high)
+                bucket[offset + 3] = (bucket[offset + 3] or 0.0) + value
+
+    def add_measures(self, measures):
+        # Instances that were just saved still hold the values before rounding to the stored precision
+        fields = [MeasuresModel._meta.get_field(name) for name in VALUE_FIELDS + EXTREME_FIELDS]
+        for measure in measures:
+            values = [field.from_db_value(field.get_prep_value(getattr(measure, field.name)), None, connection) for field in fields]
+            self.add(measure.sensor_id, measure.date, *values[:4], extremes=values[4:])
+
+    def save(self, using=None):
+        """Merges the pending buckets into the rollup table. Call it inside the write transaction."""
+        if not self.buckets:
+            return 0
+        db_connection = connection if using is None else transaction.get_connection(using)
+        table = db_connection.ops.quote_name(MeasureRollupModel._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(_UPSERT_COLUMNS))
+        assignments = ', '.join(_upsert_assignment(column) for column in _UPSERT_COLUMNS[3:])
+        rows = [
+            (sensor_id, resolution,
+             db_connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(bucket_start, tz=dt_timezone.utc)),
+             *values)
+            for (sensor_id, resolution, bucket_start), values in self.buckets.items()
+        ]
+        with db_connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(_UPSERT_COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (sensor_id, resolution, bucket) DO UPDATE SET {assignments}",
+                rows,
+            )
+        count = len(self.buckets)
+        self.buckets = {}
+        return count
+
+
+def update_rollups(measures):
+    """Adds freshly written MeasuresModel instances to the rollups."""
+    accumulator = RollupAccumulator()
+    accumulator.add_measures(measures)
+    accumulator.save()
+
+
+def rebuild_rollups(sensor_ids=None, start=None, end=None, chunk_size=20000, progress=None):
+    """
+    Recomputes the rollups of the given sensors (all by default) from
+    the stored measurements, for the whole days touched by [start, end].
+    """
+    if sensor_ids is None:
+        sensor_ids = list(SensorModel.objects.values_list('id', flat=True))
+    start = floor_date(start, 86400) if start else None
+    end = ceil_date(end + timedelta(microseconds=1), 86400) if end else None
+
+    total = 0
+    for sensor_id in sensor_ids:
+        rollups = MeasureRollupModel.objects.filter(sensor_id=sensor_id)
+        if start:
+            rollups = rollups.filter(bucket__gte=start)
+        if end:
+            rollups = rollups.filter(bucket__lt=end)
+
+        rows = 0
+        with transaction.atomic():
+            rollups.delete()
+            accumulator = RollupAccumulator()
+            measures = iterate_measures(
+                start, end, sensor_id=sensor_id, chunk_size=chunk_size,
+                fields=('date',) + VALUE_FIELDS + EXTREME_FIELDS,
+            )
+            for date, *values in measures:
+                accumulator.add(sensor_id, date, *values[:4], extremes=values[4:])
+                rows += 1
+                if rows % chunk_size == 0:
+                    accumulator.save()
+            accumulator.save()
+        total += rows
+        if progress:
+            progress(sensor_id, rows)
+    return total
+
+
+def _partial_aggregates(queryset, rollup):
+    if rollup:
+        return queryset.aggregate(
+            count=Sum('count'),
+            **{f"{field}_count": Sum(f"{field}_count") for field in VALUE_FIELDS if field.startswith('corrected')},
+            **{f"{field}_{name}": function(f"{field}_{name}") for field in VALUE_FIELDS
+               for name, function in (('min', Min), ('max', Max), ('sum', Sum))},
+        )
+    return queryset.aggregate(
+        count=Count('id'),
+        **{f"{field}_count": Count(field) for field in VALUE_FIELDS if field.startswith('corrected')},
+        **{f"{field}_{name}": function(Coalesce(f"{field}_{name}", field)) for field in VALUE_FIELDS
+           for name, function in (('min', Min), ('max', Max))},
+        **{f"{field}_sum": Sum(field) for field in VALUE_FIELDS},
+    )
+
+
+def _frame_aggregates(frame):
+    """_partial_aggregates of archived measurements."""
+    if not len(frame):
+        return {}
+    partial = {'count': len(frame)}
+    for field in VALUE_FIELDS:
+        column = frame[field].dropna()
+        if field.startswith('corrected'):
+            partial[f"{field}_count"] = len(column)
+        if len(column):
+            partial.update({
+                f"{field}_min": frame[f"{field}_min"].fillna(frame[field]).min(),
+                f"{field}_max": frame[f"{field}_max"].fillna(frame[field]).max(),
+                f"{field}_sum": column.sum(),
+            })
+    return {key: float(value) if key.endswith(('_min', '_max', '_sum')) else value for key, value in partial.items()}
+
+
+def _merge(total, partial):
+    for key, value in partial.items():
+        if value is None:
+            continue
+        if total.get(key) is None:
+            total[key] = value
+        elif key.endswith('_min'):
+            total[key] = min(total[key], value)
+        elif key.endswith('_max'):
+            total[key] = max(total[key], value)
+        else:
+            total[key] += value
+
+
+def rollup_stats(sensor, start, end):
+    """
+    Min, max and average of the readings of a sensor with date__range=[start, end],
+    with the keys of DataVisualizationView's aggregate.
+
+    Whole days inside the range are read from the daily rollups, the rest of
+    the whole hours from the hourly ones and so on; only the parts of the
+    range that are not minute-aligned are aggregated from the measurements.
+    """
+    start, end = _aware(start), _aware(end)
+    total = {}
+
+    def add_raw(start, end, **filters):
+        for queryset in measure_querysets(start, end, sensor_id=sensor.id, **filters):
+            _merge(total, _partial_aggregates(queryset, rollup=False))
+        _merge(total, _frame_aggregates(read_archive(start, end, columns=VALUE_FIELDS + EXTREME_FIELDS, sensor_id=sensor.id, **filters)))
+
+    aligned_start, aligned_end = ceil_date(start, 60), floor_date(end, 60)
+    if aligned_start >= aligned_end:
+        add_raw(start, end)
+    else:
+        if start < aligned_start:
+            add_raw(start, aligned_start, date__lt=aligned_start)
+        # The range is inclusive, readings at exactly `end` belong to it
+        add_raw(aligned_end, end)
+
+        ranges = [(aligned_start, aligned_end)]
+        for resolution, seconds in RESOLUTIONS:
+            covered = Q()
+            remaining = []
+            for low, high in ranges:
+                bucket_start, bucket_end = ceil_date(low, seconds), floor_date(high, seconds)
+                if bucket_start < bucket_end:
+                    covered |= Q(bucket__gte=bucket_start, bucket__lt=bucket_end)
+                    remaining.extend(part for part in ((low, bucket_start), (bucket_end, high)) if part[0] < part[1])
+                else:
+                    remaining.append((low, high))
+            if covered:
+                rollups = MeasureRollupModel.objects.filter(covered, sensor=sensor, resolution=resolution)
+                _merge(total, _partial_aggregates(rollups, rollup=True))
+            ranges = remaining
+
+    stats = {}
+    for field in VALUE_FIELDS:
+        count = total.get(f"{field}_count") if field.startswith('corrected') else total.get('count')
+        prefix = 'corrected_' if field.startswith('corrected') else ''
+        name = field.replace('corrected_', '')
+        stats[f"{prefix}min_{name}"] = total.get(f"{field}_min")
+        stats[f"{prefix}max_{name}"] = total.get(f"{field}_max")
+        stats[f"{prefix}avg_{name}"] = total[f"{field}_sum"] / count if count else None
+    return stats
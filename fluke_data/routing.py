@@ -1,10 +1,12 @@
 # fluke_data/routing.py
 from django.urls import path
 
-from .consumers import DataConsumer, ListenerConsumer
+from .consumers import DataConsumer, ListenerConsumer, LiveConsumer
 
 websocket_urlpatterns = [
     path('ws/data/<int:thermohygrometer_id>/', DataConsumer.as_asgi()),
     path('ws/listener/<int:thermohygrometer_id>/', ListenerConsumer.as_asgi()),
     path('ws/listener/<int:thermohygrometer_id>/sensor/<int:sensor_id>/', ListenerConsumer.as_asgi()),
+    # One socket for any set of sensors, thermohygrometers and instrument groups
+    path('ws/live/', LiveConsumer.as_asgi()),
 ]
@@ -0,0 +1,54 @@
+# fluke_data/signals.py
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from thermohygrometer.calibration import get_compiled_calibration, invalidate_compiled_calibration
+
+from .acquisition import AcquisitionManager
+from .models import CalibrationCertificateModel, SensorModel, ThermohygrometerModel
+from .archive import convert_legacy_archive, delete_archived_measures
+from .latest_values import get_latest_value_store
+from .partitions import deduplicated_sensors, delete_measures, update_partition_tables
+from .rollups import rebuild_rollups
+
+@receiver([post_save, post_delete], sender=CalibrationCertificateModel)
+def invalidate_calibration_cache(sender, instance, signal, **kwargs):
+    # The compiled correction curves must follow the edited calibration points
+    invalidate_compiled_calibration(instance.pk)
+    if signal is post_save:
+        # Compiled from the saved points, so instances loaded before the edit get them too
+        get_compiled_calibration(instance)
+    # Running acquisitions hold the certificate loaded with their sensors
+    AcquisitionManager.reload_sensors()
+
+
+@receiver(post_save, sender=SensorModel)
+def reload_acquisition_sensors(sender, instance, **kwargs):
+    AcquisitionManager.reload_sensors(instance.instrument_id)
+
+
+@receiver(post_delete, sender=SensorModel)
+def discard_latest_value(sender, instance, **kwargs):
+    get_latest_value_store().discard(instance.pk)
+
+
+@receiver(pre_delete, sender=ThermohygrometerModel)
+@receiver(pre_delete, sender=SensorModel)
+def delete_partitioned_measures(sender, instance, **kwargs):
+    # Partition tables have no foreign keys, the MeasuresModel cascade is applied by hand
+    if sender is SensorModel:
+        delete_measures(sensor_id=instance.pk)
+        delete_archived_measures(instance.pk)
+    else:
+        delete_measures(instrument_id=instance.pk)
+
+
+def update_measure_storage(sender, using, **kwargs):
+    # Connected to post_migrate in FlukeDataConfig.ready. The rows are converted by the
+    # migrations; partition tables and archive files are outside them
+    update_partition_tables(using)
+    convert_legacy_archive()
+    if deduplicated_sensors:
+        rebuild_rollups(sorted(deduplicated_sensors))
+        deduplicated_sensors.clear()
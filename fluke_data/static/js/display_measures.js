@@ -4,7 +4,7 @@ document.addEventListener('DOMContentLoaded', async function () {
     const measuresContainer = document.getElementById('measures-container');
     const loadingSpinner = document.getElementById('loading-spinner');
     let sensorData = {}; // Store sensor data instead of DOM elements
-    let webSockets = {}; // Track active WebSocket connections
+    let liveSocket = null; // Single multiplexed WebSocket for every thermohygrometer
     let dataReceived = false; // Track if we've received any data
 
     // Fetch the list of connected thermohygrometers
@@ -24,14 +24,11 @@ document.addEventListener('DOMContentLoaded', async function () {
             return;
         }
 
-        // For each thermohygrometer, connect to WebSocket
-        for (const thermo of thermohygrometers) {
-            try {
-                // Instead of fetching sensors via API, connect directly to thermohygrometer WebSocket
-                connectThermoWebSocket(thermo.id);
-            } catch (error) {
-                console.error(`Error connecting to thermohygrometer ${thermo.id}:`, error);
-            }
+        // One multiplexed WebSocket subscribed to every connected thermohygrometer
+        try {
+            connectLiveWebSocket(thermohygrometers.map(thermo => thermo.id));
+        } catch (error) {
+            console.error('Error connecting to the live WebSocket:', error);
         }
         
         // Set a timeout to hide the spinner if we don't get data in a reasonable time
@@ -56,23 +53,23 @@ document.addEventListener('DOMContentLoaded', async function () {
         }
     }
 
-    function connectThermoWebSocket(thermoId) {
-        const wsKey = `thermo_${thermoId}`;
-        const wsUrl = `ws://${window.location.host}/ws/listener/${thermoId}/`;
+    function connectLiveWebSocket(thermoIds) {
+        const wsUrl = `ws://${window.location.host}/ws/live/`;
         
-        if (webSockets[wsKey]) {
-            if (webSockets[wsKey].readyState === WebSocket.OPEN) {
+        if (liveSocket) {
+            if (liveSocket.readyState === WebSocket.OPEN) {
                 return; // Already connected
             }
-            webSockets[wsKey].close();
+            liveSocket.close();
         }
         
-        console.log(`Connecting to thermohygrometer WebSocket: ${wsUrl}`);
+        console.log(`Connecting to live WebSocket: ${wsUrl}`);
         const ws = new WebSocket(wsUrl);
-        webSockets[wsKey] = ws;
+        liveSocket = ws;
         
         ws.onopen = function() {
-            console.log(`WebSocket connection opened for thermohygrometer ${thermoId}`);
+            console.log(`WebSocket connection opened for thermohygrometers ${thermoIds.join(', ')}`);
+            ws.send(JSON.stringify({ command: 'subscribe', instruments: thermoIds }));
         };
         
         ws.onmessage = function(event) {
@@ -81,15 +78,18 @@ document.addEventListener('DOMContentLoaded', async function () {
                 console.error(`WebSocket error: ${data.error}`);
                 return;
             }
+            if (data.subscriptions) {
+                return; // Answer to the subscribe command
+            }
             updateOrCreateSensorBox(data);
         };
         
         ws.onclose = function() {
-            console.log(`WebSocket connection closed for thermohygrometer ${thermoId}`);
+            console.log('Live WebSocket connection closed');
         };
         
         ws.onerror = function(error) {
-            console.error(`WebSocket error for thermohygrometer ${thermoId}:`, error);
+            console.error('Live WebSocket error:', error);
         };
     }
 
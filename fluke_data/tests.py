@@ -1,3 +1,1337 @@
-from django.test import TestCase
+import asyncio
+import atexit
+import csv
+import functools
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as time_of_day, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Avg, Max, Min
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from pyvisa import constants
+from pyvisa.errors import VisaIOError
+from rest_framework.test import APIClient
+from twisted.internet.abstract import FileDescriptor
+from twisted.internet.testing import MemoryReactor
+
+from fluke_dewk_1620A_project.asgi import application as asgi_application
+from thermohygrometer.async_thermohygrometer import AsyncThermohygrometer
+from thermohygrometer.calibration import get_compiled_calibration
+from thermohygrometer.simulator import SimulatedThermohygrometer
+from thermohygrometer.thermohygrometer import Thermohygrometer
+
+from . import measurement_writer, partitions
+from .acquisition import AcquisitionManager, InstrumentAcquisition
+from .archive import archive_closed_partitions, read_archive, sensor_file
+from .compression import MeasureAggregator, MeasureCompressor, resample
+from .fanout import (BINARY_READING, FLAG_NO_CALIBRATION, NO_VALUE, LiveFanout, LiveReading, get_live_fanout, instrument_group,
+                     named_group, sensor_group)
+from .measurement_spool import MeasurementSpool
+from .measurement_writer import MeasurementWriter
+from .connection_manager import InstrumentConnectionManager, ReconnectScheduler
+from .consumers import LiveConsumer
+from .ingest import upsert_measures
+from .instrument_executor import InstrumentExecutor
+from .latest_values import LatestValueStore, get_latest_value_store
+from .models import (CalibrationCertificateModel, CorrectionRecomputeJobModel, InstrumentIdentityModel, MeasurePartitionModel,
+                     MeasureRollupModel, MeasuresModel, SensorModel, ThermohygrometerModel)
+from .partitions import (apply_retention, count_measures, drop_partition, get_partition_model, iterate_measures,
+                         seal_closed_months, seal_month)
+from .recompute import CorrectionRecompute
+from .rollups import rollup_stats
+from .visa_communication import AsyncInstrument
+
+
+class TemporaryStorageMixin:
+    """Points the measurement spool and the Parquet archive to a directory removed after the test."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.storage_dir, True)
+        storage_settings = override_settings(
+            MEASUREMENT_SPOOL_DIR=str(self.storage_dir / 'spool'),
+            MEASUREMENT_ARCHIVE_DIR=str(self.storage_dir / 'archive'),
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        # The writer of each test is created on first use, in the test's event loop
+        measurement_writer._measurement_writer = None
+        self.addCleanup(self.discard_measurement_writer)
+
+    @staticmethod
+    def discard_measurement_writer():
+        writer = measurement_writer._measurement_writer
+        if writer is not None:
+            atexit.unregister(writer.flush_sync)
+        measurement_writer._measurement_writer = None
+
+
+def create_certificate(temperature_correction=0.0, humidity_correction=0.0):
+    """Certificate with the same correction at its three points."""
+    return CalibrationCertificateModel.objects.create(
+        calibration_date=date(2026, 1, 1),
+        next_calibration_date=date(2027, 1, 1),
+        certificate_number='TEST-001',
+        temp_indication_point_1=10.0, temp_correction_1=temperature_correction,
+        temp_indication_point_2=20.0, temp_correction_2=temperature_correction,
+        temp_indication_point_3=30.0, temp_correction_3=temperature_correction,
+        humidity_indication_point_1=30.0, humidity_correction_1=humidity_correction,
+        humidity_indication_point_2=50.0, humidity_correction_2=humidity_correction,
+        humidity_indication_point_3=70.0, humidity_correction_3=humidity_correction,
+        temp_uncertainty=0.1,
+        humidity_uncertainty=1.0,
+    )
+
+
+async def wait_until(condition, timeout=10):
+    """Polls condition, a function or a coroutine function, until it is true."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if asyncio.iscoroutine(result):
+            result = await result
+        if result:
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"Condition not met within {timeout} s")
+
+
+@override_settings(THERMOHYGROMETER_TRANSPORT='asyncio')
+@patch.object(InstrumentAcquisition, 'POLL_INTERVAL', 0.05)
+@patch.object(ReconnectScheduler, 'SCAN_INTERVAL', 0.05)
+@patch.object(ReconnectScheduler, 'BASE_DELAY', 0.1)
+class LinkLossTests(TemporaryStorageMixin, TestCase):
+    """A held instrument whose link drops goes back to the scheduler and is reconnected."""
+
+    async def test_lost_link_is_released_and_reconnected(self):
+        simulator = await SimulatedThermohygrometer(port=0, seed=1).start()
+        thermo = await ThermohygrometerModel.objects.acreate(
+            ip_address=simulator.address, pn='', sn='', instrument_name='SIMULATOR', group_name='Lab A'
+        )
+        sensor_ids = set()
+        for channel in (1, 2):
+            sensor = await SensorModel.objects.acreate(
+                instrument=thermo, channel=channel, sensor_name=f'Channel {channel}',
+                min_temperature=15.0, max_temperature=30.0, min_humidity=20.0, max_humidity=80.0,
+            )
+            sensor_ids.add(sensor.id)
+
+        def current_sensors():
+            return sensor_ids & get_latest_value_store().values.keys()
+
+        async def is_connected():
+            return (await ThermohygrometerModel.objects.aget(id=thermo.id)).is_connected
+
+        scheduler = InstrumentConnectionManager.scheduler = ReconnectScheduler()
+        task = asyncio.create_task(scheduler.run())
+        try:
+            await wait_until(lambda: thermo.id in InstrumentConnectionManager._held_instruments)
+            await wait_until(lambda: simulator.queries > 10)
+            await wait_until(lambda: current_sensors() == sensor_ids)
+
+            # The instrument goes away: the acquisition notices and releases the hold
+            await simulator.stop()
+            await wait_until(lambda: thermo.id not in InstrumentConnectionManager._held_instruments)
+            self.assertFalse(await is_connected())
+            self.assertEqual(scheduler.links_lost, 1)
+            self.assertIsNone(AcquisitionManager.get(thermo.id))
+            # Its last readings are no longer served as the current ones
+            self.assertEqual(current_sensors(), set())
+
+            # Back on the same address, it is reconnected and polled again
+            restarted = await SimulatedThermohygrometer(port=simulator.port, seed=1).start()
+            try:
+                await wait_until(lambda: thermo.id in InstrumentConnectionManager._held_instruments)
+                await wait_until(lambda: restarted.queries > 10)
+                self.assertTrue(await is_connected())
+                await wait_until(lambda: current_sensors() == sensor_ids)
+                self.assertGreaterEqual(scheduler.attempts, 2)
+                # The handshake identity was saved, the configured group was kept
+                thermo = await ThermohygrometerModel.objects.aget(id=thermo.id)
+                self.assertEqual(thermo.sn, 'SIM0001')
+                self.assertEqual(thermo.group_name, 'Lab A')
+            finally:
+                task.cancel()
+                await InstrumentConnectionManager.disconnect_instrument(thermo)
+                await restarted.stop()
+        finally:
+            task.cancel()
+            InstrumentConnectionManager.scheduler = None
+            InstrumentConnectionManager._held_instruments.clear()
+            await simulator.stop()
+
+
+class ReconnectSchedulerTests(TestCase):
+    def create_thermo(self, name, **fields):
+        return ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn=name, instrument_name=name, **fields)
+
+    def test_failures_are_restored_after_a_restart(self):
+        now = timezone.now()
+        failing = self.create_thermo('T1', connection_failures=ReconnectScheduler.FAILURE_THRESHOLD,
+                                     last_connection_attempt=now - timedelta(seconds=10))
+        retried_long_ago = self.create_thermo('T2', connection_failures=2, last_connection_attempt=now - timedelta(hours=1))
+        new = self.create_thermo('T3')
+
+        scheduler = ReconnectScheduler()
+        monotonic = time.monotonic()
+        states = {thermo.id: scheduler.restore_state(thermo, monotonic) for thermo in (failing, retried_long_ago, new)}
+
+        self.assertEqual(states[failing.id].state, 'open')
+        self.assertGreaterEqual(states[failing.id].next_attempt, monotonic + ReconnectScheduler.OPEN_DELAY / 2 - 11)
+        self.assertEqual((states[retried_long_ago.id].state, states[retried_long_ago.id].failures), ('closed', 2))
+        for thermo in (retried_long_ago, new):
+            self.assertLessEqual(states[thermo.id].next_attempt, monotonic + ReconnectScheduler.SCAN_INTERVAL)
+
+    async def test_attempts_save_the_failures(self):
+        thermo = await sync_to_async(self.create_thermo)('T1')
+        scheduler = ReconnectScheduler()
+        state = scheduler.restore_state(thermo, time.monotonic())
+
+        async def failures():
+            return (await ThermohygrometerModel.objects.aget(id=thermo.id)).connection_failures
+
+        with patch.object(InstrumentConnectionManager, 'connect_to_instrument', return_value=None):
+            await scheduler.attempt(thermo, state)
+            await scheduler.attempt(thermo, state)
+        self.assertEqual(await failures(), 2)
+        with patch.object(InstrumentConnectionManager, 'connect_to_instrument', return_value=Mock()):
+            await scheduler.attempt(thermo, state)
+        self.assertEqual(await failures(), 0)
+
+    @override_settings(AUTO_CONNECT_ON_STARTUP=True)
+    async def test_server_starts_the_scheduler_once(self):
+        started = asyncio.Event()
+
+        async def connect_all_instruments():
+            started.set()
+            await asyncio.Event().wait()
+
+        with patch.object(InstrumentConnectionManager, 'connect_all_instruments', side_effect=connect_all_instruments) as run:
+            InstrumentConnectionManager.start()
+            InstrumentConnectionManager.start()
+            await asyncio.wait_for(started.wait(), 1)
+            self.assertEqual(run.call_count, 1)
+            task = InstrumentConnectionManager._task
+            task.cancel()
+            await asyncio.wait([task])
+            await asyncio.sleep(0)  # The done callbacks run on the next iteration
+        self.assertIsNone(InstrumentConnectionManager._task)
+
+
+class PipelinedQueryTests(SimpleTestCase):
+    """A read that fails partway through a pipelined query does not leave its responses for the next query."""
+
+    async def test_async_connection_is_reopened(self):
+        simulator = await SimulatedThermohygrometer(port=0, seed=1).start()
+        try:
+            instrument = AsyncThermohygrometer(simulator.address, timeout=0.4)
+            self.assertTrue(await instrument.connect())
+            # The second response arrives after the read timed out
+            delays = iter([0, 0.5])
+
+            async def respond_delay():
+                await asyncio.sleep(next(delays, 0))
+
+            simulator._respond_delay = respond_delay
+            with self.assertRaises(asyncio.TimeoutError):
+                await instrument.query_pipelined(['*IDN?', 'SENS1:IDEN?'])
+            self.assertEqual(await instrument.send_command('*IDN?'), 'FLUKE,1620A,SIM0001,1.20')
+            await instrument.disconnect()
+        finally:
+            await simulator.stop()
+
+    def test_visa_session_is_reopened(self):
+        with patch('pyvisa.ResourceManager') as resource_manager:
+            stale, fresh = Mock(), Mock()
+            stale.read.side_effect = ['FLUKE,1620A,SIM0001,1.20', VisaIOError(constants.VI_ERROR_TMO)]
+            resource_manager.return_value.open_resource.side_effect = [stale, fresh]
+            instrument = Thermohygrometer('127.0.0.1')
+            instrument.instrument = instrument._open_resource()
+
+            with self.assertRaises(VisaIOError):
+                instrument.query_pipelined(['*IDN?', 'SENS1:IDEN?'])
+            stale.close.assert_called_once()
+            self.assertIs(instrument.instrument, fresh)
+            self.assertEqual(fresh.timeout, 2000)
+
+
+class BatchedReadTests(SimpleTestCase):
+    """A failed batched read falls back for that read; batching stops only when the instrument keeps failing it."""
+
+    def setUp(self):
+        self.instrument = AsyncInstrument('127.0.0.1')
+        self.instrument.get_data = Mock(side_effect=lambda channel: self.reading(channel))
+
+    @staticmethod
+    async def reading(channel):
+        return {'channel': channel, 'temperature': 20.0, 'humidity': 50.0}
+
+    async def read(self, pipelined):
+        with patch.object(self.instrument, 'query_pipelined', side_effect=pipelined):
+            return await self.instrument.get_live_data_all_channels()
+
+    async def test_transient_failures_fall_back_for_one_read(self):
+        self.assertEqual(set(await self.read(asyncio.TimeoutError())), {1, 2})
+        self.assertTrue(self.instrument.batched_reads)
+        # A successful batched read starts the count again
+        self.assertEqual(set(await self.read([['20.0,50.0'] * 2])), {1, 2})
+        self.assertEqual(self.instrument.batched_read_failures, 0)
+
+        for _ in range(AsyncInstrument.BATCHED_READ_FAILURE_LIMIT - 1):
+            await self.read(asyncio.TimeoutError())
+        self.assertTrue(self.instrument.batched_reads)
+        self.assertEqual(set(await self.read(asyncio.TimeoutError())), {1, 2})
+        self.assertFalse(self.instrument.batched_reads)
+
+    async def test_rejected_batch_is_turned_off_until_reconnected(self):
+        self.assertEqual(set(await self.read([['-113,"Undefined header"'] * 2])), {1, 2})
+        self.assertFalse(self.instrument.batched_reads)
+
+        with patch('asyncio.open_connection', side_effect=OSError('unreachable')):
+            await self.instrument.connect()
+        self.assertTrue(self.instrument.batched_reads)
+
+
+class CompiledCalibrationTests(TestCase):
+    def test_edited_certificate_is_not_replaced_by_a_stale_instance(self):
+        certificate = create_certificate(temperature_correction=0.2)
+        # Loaded before the edit, like the sensors of a running acquisition
+        stale = CalibrationCertificateModel.objects.get(pk=certificate.pk)
+        self.assertEqual(get_compiled_calibration(stale).correct('temperature', 20.0), 19.8)
+
+        for i in (1, 2, 3):
+            setattr(certificate, f'temp_correction_{i}', 2.0)
+        certificate.save()
+        # The cache holds the curves of the saved points, whichever instance asks for them
+        self.assertEqual(get_compiled_calibration(stale).correct('temperature', 20.0), 18.0)
+        fresh = CalibrationCertificateModel.objects.get(pk=certificate.pk)
+        self.assertIs(get_compiled_calibration(fresh), get_compiled_calibration(stale))
+
+        certificate.delete()
+        self.assertEqual(get_compiled_calibration(stale).correct('temperature', 20.0), 19.8)
+
+    def test_running_acquisitions_reload_their_sensors(self):
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        acquisition = AcquisitionManager._acquisitions[thermo.id] = InstrumentAcquisition(thermo.id)
+        self.addCleanup(AcquisitionManager._acquisitions.pop, thermo.id, None)
+
+        certificate = create_certificate()
+        self.assertTrue(acquisition.sensors_changed)
+        acquisition.sensors_changed = False
+        sensor.calibration_certificate = certificate
+        sensor.save()
+        self.assertTrue(acquisition.sensors_changed)
+
+
+@patch.object(CorrectionRecompute, 'start_in_background')
+class CorrectionRecomputeResumeTests(TestCase):
+    def setUp(self):
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='tester', password='secret'))
+
+    def resume(self, job):
+        return self.client.post(
+            f'/api/v1/sensors/{self.sensor.id}/recompute-corrections/', {'resume_job_id': job.id}, format='json'
+        )
+
+    def test_running_job_is_not_started_twice(self, start_in_background):
+        job = CorrectionRecompute.create_job(self.sensor)
+        CorrectionRecomputeJobModel.objects.filter(id=job.id).update(status='running')
+        self.assertEqual(self.resume(job).status_code, 400)
+        start_in_background.assert_not_called()
+
+    def test_job_left_running_by_a_stopped_process_is_resumed(self, start_in_background):
+        job = CorrectionRecompute.create_job(self.sensor)
+        # No worker in this process and no heartbeat since
+        CorrectionRecomputeJobModel.objects.filter(id=job.id).update(
+            status='running', last_pk=42, updated_at=timezone.now() - timedelta(seconds=CorrectionRecompute.STALE_AFTER + 1)
+        )
+        response = self.resume(job)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(start_in_background.call_args.args[0].last_pk, 42)
+
+
+class SensorApiValidationTests(TestCase):
+    def setUp(self):
+        self.thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=self.thermo, channel=1, sensor_name='Channel 1')
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='tester', password='secret'))
+
+    def test_invalid_storage_settings_are_rejected(self):
+        for data in ({'temperature_tolerance': 'abc'}, {'humidity_tolerance': -1}, {'storage_mode': 'lossy'}):
+            with self.subTest(data=data):
+                response = self.client.put(f'/api/v1/sensors/{self.sensor.id}/', data, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(data)), response.json()['error'])
+        self.sensor.refresh_from_db()
+        self.assertEqual((self.sensor.storage_mode, self.sensor.temperature_tolerance), ('interval', 0.1))
+
+        response = self.client.post('/api/v1/sensors/', {
+            'thermohygrometer_id': self.thermo.id, 'sensor_name': 'Channel 2', 'channel': 2, 'temperature_tolerance': 'abc',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SensorModel.objects.filter(channel=2).exists())
+
+    def test_numeric_strings_are_stored_as_numbers(self):
+        response = self.client.put(f'/api/v1/sensors/{self.sensor.id}/', {
+            'storage_mode': 'deadband', 'temperature_tolerance': '0.25',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.sensor.refresh_from_db()
+        self.assertEqual((self.sensor.storage_mode, self.sensor.temperature_tolerance), ('deadband', 0.25))
+
+
+class AggregatedExtremesTests(TemporaryStorageMixin, TestCase):
+    """Rows of the interval aggregate storage mode are checked and exported with their extremes."""
+
+    def setUp(self):
+        super().setUp()
+        self.thermo = ThermohygrometerModel.objects.create(
+            ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1', min_temperature=18.0, max_temperature=25.0
+        )
+        self.sensor = SensorModel.objects.create(instrument=self.thermo, channel=1, sensor_name='Channel 1')
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='tester', password='secret'))
+        # A Monday morning, one summary every 5 minutes; the mean of 08:30 hides a peak at 27 °C
+        start = timezone.make_aware(datetime(2026, 3, 2, 7, 50))
+        MeasuresModel.objects.bulk_create([
+            MeasuresModel(
+                instrument=self.thermo, sensor=self.sensor, date=start + timedelta(minutes=5 * i), sample_count=5,
+                temperature=20.0, temperature_min=19.5, temperature_max=27.0 if i == 8 else 20.5,
+                corrected_temperature=20.0, corrected_temperature_min=19.5,
+                corrected_temperature_max=27.0 if i == 8 else 20.5, humidity=50.0,
+            )
+            for i in range(17)
+        ])
+
+    def percent_out_of_limits(self, **options):
+        response = self.client.post('/api/v1/environmental-analysis/out-of-limits-chart/', {
+            'start_date': '2026-03-02', 'end_date': '2026-03-02', 'start_time': '08:00', 'end_time': '09:00',
+            'instruments': [self.thermo.id], **options,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data'][0]['percent_out_of_limits']
+
+    def test_out_of_limits_time_counts_the_peak(self):
+        # Above 25 °C for 2/7 of the two 5 minute segments around the peak, out of one hour
+        self.assertAlmostEqual(self.percent_out_of_limits(use_extremes=True), 100 * 2 * 5 * 2 / 7 / 60, places=3)
+
+    def test_out_of_limits_time_uses_the_means_by_default(self):
+        self.assertEqual(self.percent_out_of_limits(), 0)
+        self.assertEqual(self.percent_out_of_limits(use_extremes=False), 0)
+
+    def test_csv_export_has_the_extremes(self):
+        MeasuresModel.objects.create(
+            instrument=self.thermo, sensor=self.sensor, date=timezone.make_aware(datetime(2026, 3, 2, 9, 30)),
+            temperature=21.0, humidity=50.0,
+        )
+        response = self.client.post('/api/v1/export/export-to-csv/', {
+            'sensor_id': self.sensor.id, 'start_date': '2026-03-02', 'start_time': '08:00',
+            'end_date': '2026-03-02', 'end_time': '10:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        header, *rows = csv.reader(response.content.decode().splitlines())
+        rows = {row[0]: dict(zip(header, row)) for row in rows}
+        self.assertEqual(rows['02/03/2026 08:30']['Samples'], '5')
+        self.assertEqual(rows['02/03/2026 08:30']['Corrected Temperature (°C) Max'], '27.0')
+        self.assertEqual(rows['02/03/2026 08:30']['Temperature (°C) Min'], '19.5')
+        self.assertEqual(rows['02/03/2026 09:30']['Samples'], '1')
+        self.assertEqual(rows['02/03/2026 09:30']['Temperature (°C) Max'], '')
+
+
+class CompactRowFormatTests(TestCase):
+    def setUp(self):
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+
+    def test_values_and_dates_round_trip(self):
+        date = timezone.make_aware(datetime(2026, 3, 2, 8, 30, 15, 750000))
+        measure = MeasuresModel.objects.create(
+            instrument=self.sensor.instrument, sensor=self.sensor, date=date,
+            temperature=21.37, corrected_temperature=-3.05, humidity=45.999, corrected_humidity=None,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT temperature, corrected_temperature, humidity, date FROM {MeasuresModel._meta.db_table} WHERE id = %s",
+                [measure.id],
+            )
+            self.assertEqual(cursor.fetchone(), (2137, -305, 4600, int(date.timestamp())))
+
+        stored = MeasuresModel.objects.get(id=measure.id)
+        self.assertEqual((stored.temperature, stored.corrected_temperature, stored.humidity), (21.37, -3.05, 46.0))
+        self.assertIsNone(stored.corrected_humidity)
+        self.assertEqual(stored.date, date.replace(microsecond=0))
+        self.assertEqual(stored.date.utcoffset(), timedelta(0))
+
+    def test_lookups_and_aggregates_use_float_values(self):
+        start = timezone.make_aware(datetime(2026, 3, 2, 8, 0))  # A Monday
+        for i, temperature in enumerate((20.01, 20.02, 20.04)):
+            MeasuresModel.objects.create(
+                instrument=self.sensor.instrument, sensor=self.sensor, date=start + timedelta(hours=i),
+                temperature=temperature, humidity=50.0,
+            )
+        measures = MeasuresModel.objects.filter(sensor=self.sensor)
+        self.assertEqual(measures.filter(temperature__gt=20.01).count(), 2)
+        self.assertAlmostEqual(measures.aggregate(Avg('temperature'))['temperature__avg'], 20.0233, places=4)
+        self.assertEqual(measures.filter(date__week_day=2, date__time__gte=time_of_day(9, 0)).count(), 2)
+        self.assertEqual(measures.filter(date__range=(start, start + timedelta(hours=1))).count(), 2)
+
+
+class CompactFormatMigrationTests(TransactionTestCase):
+    # Migrating back and forth needs the schema editor outside the transaction of a TestCase
+    LEGACY = [('fluke_data', '0007_measurepartitionmodel_archive_bytes_and_more')]
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('fluke_data')
+        self.addCleanup(self.migrate, latest)
+        self.apps = self.migrate(self.LEGACY)
+        self.addCleanup(partitions.deduplicated_sensors.clear)
+        self.addCleanup(lambda: [drop_partition(partition) for partition in MeasurePartitionModel.objects.all()])
+        thermo = self.apps.get_model('fluke_data', 'ThermohygrometerModel').objects.create(
+            ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = self.apps.get_model('fluke_data', 'SensorModel').objects.create(
+            instrument=thermo, channel=1, sensor_name='Channel 1')
+
+    @staticmethod
+    def migrate(targets):
+        return MigrationExecutor(connection).migrate(targets).apps
+
+    def add_legacy_measure(self, measured_at, temperature):
+        self.apps.get_model('fluke_data', 'MeasuresModel').objects.create(
+            instrument=self.sensor.instrument, sensor=self.sensor, date=measured_at, pn='1620A', sn='T1',
+            temperature=temperature, corrected_temperature=-3.05, humidity=45.99, corrected_humidity=None,
+        )
+
+    def seal_legacy_january(self):
+        # As the partition code of the time sealed it, with the MeasuresModel columns
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE fluke_data_measures_202601 AS SELECT * FROM fluke_data_measuresmodel WHERE date < '2026-02'")
+            cursor.execute("DELETE FROM fluke_data_measuresmodel WHERE date < '2026-02'")
+        self.apps.get_model('fluke_data', 'MeasurePartitionModel').objects.create(
+            month=date(2026, 1, 1), table_name='fluke_data_measures_202601')
+
+    def stored(self):
+        return [
+            (measure.date, measure.temperature, measure.corrected_temperature, measure.humidity,
+             measure.corrected_humidity, measure.identity_id)
+            for measure in iterate_measures(sensor_id=self.sensor.id)
+        ]
+
+    def test_legacy_rows_are_converted_with_their_identity(self):
+        march = timezone.make_aware(datetime(2026, 3, 2, 8, 30, 15, 750000))
+        january = timezone.make_aware(datetime(2026, 1, 5, 12, 0, 1, 250000))
+        self.add_legacy_measure(march, 21.37)
+        self.add_legacy_measure(january, 19.5)
+        self.seal_legacy_january()
+
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('fluke_data'))
+
+        identity = InstrumentIdentityModel.objects.get()
+        self.assertEqual((identity.pn, identity.sn), ('1620A', 'T1'))
+        self.assertEqual(self.stored(), [
+            (january.replace(microsecond=0), 19.5, -3.05, 45.99, None, identity.id),
+            (march.replace(microsecond=0), 21.37, -3.05, 45.99, None, identity.id),
+        ])
+
+    def test_readings_within_the_same_second_keep_the_oldest(self):
+        march = timezone.make_aware(datetime(2026, 3, 2, 8, 30, 15))
+        january = timezone.make_aware(datetime(2026, 1, 5, 12, 0, 1))
+        for second in (march, january):
+            self.add_legacy_measure(second + timedelta(milliseconds=250), 20.0)
+            self.add_legacy_measure(second + timedelta(milliseconds=750), 20.5)
+            self.add_legacy_measure(second + timedelta(seconds=1), 21.0)
+        self.seal_legacy_january()
+
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('fluke_data'))
+
+        self.assertEqual([(stored[0], stored[1]) for stored in self.stored()], [
+            (january, 20.0), (january + timedelta(seconds=1), 21.0),
+            (march, 20.0), (march + timedelta(seconds=1), 21.0),
+        ])
+        self.assertEqual(partitions.deduplicated_sensors, {self.sensor.id})
+
+
+class MeasureCompressorTests(SimpleTestCase):
+    TOLERANCES = (0.1, 1.0)
+
+    def readings(self, count=2000):
+        """A random walk of (temperature, humidity) read every minute, which crosses 22 °C."""
+        rng = random.Random(7)
+        start = timezone.make_aware(datetime(2026, 3, 2))
+        temperature, humidity = 21.5, 50.0
+        readings = []
+        for i in range(count):
+            temperature += rng.gauss(0.004, 0.05)
+            humidity += rng.gauss(0, 0.4)
+            readings.append((start + timedelta(minutes=i), (round(temperature, 2), round(humidity, 2))))
+        return readings
+
+    def compress(self, mode, readings, max_interval=timedelta(hours=1)):
+        compressor = MeasureCompressor(mode, self.TOLERANCES, max_interval)
+        stored = []
+        for date, values in readings:
+            stored += compressor.add(date, values, values[0] > 22, (date, values))
+        return stored + compressor.flush()
+
+    def reconstruction_errors(self, readings, stored):
+        start, end = readings[0][0], readings[-1][0]
+        errors = []
+        for i in range(len(self.TOLERANCES)):
+            points = [(date, values[i]) for date, values in stored]
+            rebuilt = resample(points, start, end, timedelta(minutes=1), timedelta(days=1))
+            errors.append(max(abs(value[i] - point[1]) for (_, value), point in zip(readings, rebuilt)))
+        return errors
+
+    def test_swinging_door_stores_every_departure(self):
+        readings = self.readings()
+        stored = self.compress('swinging_door', readings)
+        self.assertLess(len(stored), len(readings) / 4)
+        # Segments end on the last reading that fitted a line within the tolerances, not on that
+        # line, so the interpolated signal is within twice the tolerances
+        for error, tolerance in zip(self.reconstruction_errors(readings, stored), self.TOLERANCES):
+            self.assertLessEqual(error, 2 * tolerance + 1e-9)
+
+    def test_deadband_stores_every_departure(self):
+        readings = self.readings()
+        stored = self.compress('deadband', readings)
+        self.assertLess(len(stored), len(readings) / 2)
+        # Between two stored readings every reading stays within the tolerance of the first
+        for (first, values), (last, _) in zip(stored, stored[1:]):
+            for date, reading in readings:
+                if first < date < last:
+                    for value, origin, tolerance in zip(reading, values, self.TOLERANCES):
+                        self.assertLessEqual(abs(value - origin), tolerance + 1e-9)
+        # Interpolated, the signal is within twice the tolerances
+        for error, tolerance in zip(self.reconstruction_errors(readings, stored), self.TOLERANCES):
+            self.assertLessEqual(error, 2 * tolerance + 1e-9)
+
+    def test_limit_crossings_and_steady_signals_are_stored(self):
+        start = timezone.make_aware(datetime(2026, 3, 2))
+        # Flat, then a step over 22 °C within the tolerance
+        readings = [(start + timedelta(minutes=i), (21.95 if i < 30 else 22.02, 50.0)) for i in range(90)]
+        for mode in MeasureCompressor.MODES:
+            with self.subTest(mode=mode):
+                dates = [date for date, _ in self.compress(mode, readings, max_interval=timedelta(minutes=20))]
+                # Both sides of the crossing, and at least every 20 minutes
+                self.assertIn(start + timedelta(minutes=29), dates)
+                self.assertIn(start + timedelta(minutes=30), dates)
+                self.assertLessEqual(max(b - a for a, b in zip(dates, dates[1:])), timedelta(minutes=20))
+                self.assertEqual(dates[-1], readings[-1][0])
+
+
+class MeasureAggregatorTests(TemporaryStorageMixin, TestCase):
+    FIELDS = ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity')
+
+    def test_interval_summary(self):
+        aggregator = MeasureAggregator(self.FIELDS, timedelta(minutes=5))
+        start = timezone.make_aware(datetime(2026, 3, 2, 8, 0))
+        summaries = []
+        for i, temperature in enumerate((20.0, 21.0, 26.0, 19.0, 19.5, 20.0, 20.5)):
+            # Corrected values are missing while the sensor has no certificate
+            corrected = None if i < 2 else temperature - 0.5
+            summary = aggregator.add(start + timedelta(minutes=i), (temperature, 50.0 + i, corrected, None))
+            if summary:
+                summaries.append(summary)
+        summaries.append(aggregator.flush())
+        self.assertIsNone(aggregator.flush())
+
+        first, last = summaries
+        # The reading that closes an interval is its last one
+        self.assertEqual((first['date'], first['sample_count']), (start + timedelta(minutes=5), 6))
+        self.assertAlmostEqual(first['temperature'], 125.5 / 6)
+        self.assertEqual((first['temperature_min'], first['temperature_max']), (19.0, 26.0))
+        self.assertEqual((first['humidity_min'], first['humidity_max']), (50.0, 55.0))
+        self.assertAlmostEqual(first['corrected_temperature'], 82.5 / 4)
+        self.assertEqual((first['corrected_temperature_min'], first['corrected_temperature_max']), (18.5, 25.5))
+        self.assertEqual((first['corrected_humidity'], first['corrected_humidity_min']), (None, None))
+        self.assertEqual((last['date'], last['sample_count'], last['temperature']), (start + timedelta(minutes=6), 1, 20.5))
+
+    def test_aggregated_rows_keep_their_extremes_through_the_spool(self):
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        summary = {
+            'date': timezone.make_aware(datetime(2026, 3, 2, 8, 5)), 'sample_count': 6,
+            'temperature': 20.92, 'temperature_min': 19.0, 'temperature_max': 26.0,
+            'humidity': 52.5, 'humidity_min': 50.0, 'humidity_max': 55.0,
+            'corrected_temperature': None, 'corrected_temperature_min': None, 'corrected_temperature_max': None,
+            'corrected_humidity': None, 'corrected_humidity_min': None, 'corrected_humidity_max': None,
+        }
+        spool = MeasurementSpool(self.storage_dir / 'spool', segment_max_bytes=1 << 20, max_bytes=1 << 30)
+        writer = MeasurementWriter(spool, batch_size=100, flush_interval=1, max_pending=1000)
+        spool.append([MeasuresModel(instrument=thermo, sensor=sensor, **summary)])
+        spool.seal()
+        writer._write(spool.read(spool.sealed_segments()[0]))
+
+        stored = MeasuresModel.objects.values(*summary).get(sensor=sensor)
+        self.assertEqual(stored, summary)
+
+
+class UpsertMeasuresTests(TemporaryStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        self.start = timezone.make_aware(datetime(2026, 3, 2, 8, 0))
+
+    def measures(self, temperatures, microsecond=0):
+        return [
+            MeasuresModel(
+                instrument=self.sensor.instrument, sensor=self.sensor, temperature=temperature, humidity=50.0,
+                date=self.start + timedelta(minutes=i, microseconds=microsecond),
+            )
+            for i, temperature in enumerate(temperatures)
+        ]
+
+    def stats(self):
+        return rollup_stats(self.sensor, self.start, self.start + timedelta(days=1))
+
+    def test_replayed_measurements_are_not_duplicated(self):
+        created = upsert_measures(self.measures((20.0, 21.0, 22.0)))
+        self.assertEqual(created, {'created': 3, 'updated': 0, 'unchanged': 0, 'skipped': 0})
+        stats = self.stats()
+
+        # Replayed, also with a date in the same second, nothing is written
+        for microsecond in (0, 400000):
+            with self.subTest(microsecond=microsecond):
+                result = upsert_measures(self.measures((20.0, 21.0, 22.0), microsecond=microsecond))
+                self.assertEqual(result, {'created': 0, 'updated': 0, 'unchanged': 3, 'skipped': 0})
+                self.assertEqual(MeasuresModel.objects.filter(sensor=self.sensor).count(), 3)
+                self.assertEqual(self.stats(), stats)
+
+    def test_changed_measurements_replace_the_stored_ones(self):
+        upsert_measures(self.measures((20.0, 21.0, 22.0)))
+        # Within a batch, the last measurement of a (sensor, date) wins
+        result = upsert_measures(self.measures((20.0, 30.0)) + self.measures((20.0, 25.0, 22.0, 23.0)))
+        self.assertEqual(result, {'created': 1, 'updated': 1, 'unchanged': 2, 'skipped': 0})
+        self.assertEqual(
+            list(MeasuresModel.objects.filter(sensor=self.sensor).order_by('date').values_list('temperature', flat=True)),
+            [20.0, 25.0, 22.0, 23.0],
+        )
+        # The rollups no longer count the replaced value
+        stats = self.stats()
+        self.assertEqual((stats['max_temperature'], stats['avg_temperature']), (25.0, 22.5))
+
+
+class RollupStatsTests(TemporaryStorageMixin, TestCase):
+    """The rollups answer DataVisualizationView and the statistics endpoint like an aggregate of the raw rows."""
+
+    def setUp(self):
+        super().setUp()
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        self.start = timezone.make_aware(datetime(2026, 3, 2))
+        rng = random.Random(3)
+        # Three days read every 97 s; the corrected values are missing for part of them
+        upsert_measures([
+            MeasuresModel(
+                instrument=thermo, sensor=self.sensor, date=self.start + timedelta(seconds=97 * i),
+                temperature=round(rng.uniform(18, 26), 2), humidity=round(rng.uniform(30, 70), 2),
+                corrected_temperature=round(rng.uniform(18, 26), 2) if i % 3 else None,
+                corrected_humidity=round(rng.uniform(30, 70), 2) if i % 5 else None,
+            )
+            for i in range(3 * 86400 // 97)
+        ])
+
+    def raw_stats(self, start, end):
+        functions = (('min', Min), ('max', Max), ('avg', Avg))
+        return MeasuresModel.objects.filter(sensor=self.sensor, date__range=(start, end)).aggregate(**{
+            f"{'corrected_' if field.startswith('corrected') else ''}{name}_{field.replace('corrected_', '')}": function(field)
+            for field in ('temperature', 'humidity', 'corrected_temperature', 'corrected_humidity') for name, function in functions
+        })
+
+    def test_rollup_stats_match_the_raw_aggregates(self):
+        self.assertEqual(MeasureRollupModel.objects.filter(sensor=self.sensor, resolution='day').count(), 3)
+        ranges = {
+            'unaligned days': (self.start + timedelta(hours=8, minutes=17, seconds=23), self.start + timedelta(days=2, hours=15, seconds=51)),
+            'whole day': (self.start + timedelta(days=1), self.start + timedelta(days=2)),
+            'ending on a reading': (self.start + timedelta(minutes=30), self.start + timedelta(seconds=97 * 1000)),
+            'within a minute': (self.start + timedelta(hours=9, minutes=59, seconds=30), self.start + timedelta(hours=9, minutes=59, seconds=59)),
+            'no readings': (self.start - timedelta(days=2), self.start - timedelta(days=1)),
+        }
+        for name, (start, end) in ranges.items():
+            with self.subTest(name):
+                expected = self.raw_stats(start, end)
+                stats = rollup_stats(self.sensor, start, end)
+                self.assertEqual(stats.keys(), expected.keys())
+                for key, value in expected.items():
+                    if value is None:
+                        self.assertIsNone(stats[key], key)
+                    else:
+                        self.assertAlmostEqual(stats[key], value, places=6, msg=key)
+
+    def test_statistics_endpoint_serves_the_rollup_stats(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username='tester', password='secret'))
+        response = client.post('/api/v1/environmental-analysis/statistics/', {
+            'start_date': '2026-03-02', 'start_time': '08:17', 'end_date': '2026-03-04', 'end_time': '15:42',
+            'sensors': [self.sensor.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data'][0]
+        expected = self.raw_stats(self.start + timedelta(hours=8, minutes=17), self.start + timedelta(days=2, hours=15, minutes=42))
+        for key, value in expected.items():
+            self.assertAlmostEqual(data[key], value, places=6, msg=key)
+
+
+class MeasurementSpoolReplayTests(TemporaryStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        self.spool = MeasurementSpool(self.storage_dir / 'spool', segment_max_bytes=1 << 20, max_bytes=1 << 30)
+        self.writer = MeasurementWriter(self.spool, batch_size=100, flush_interval=60, max_pending=1000)
+        self.addCleanup(self.spool.seal)
+
+    def measures(self, count, first=0):
+        start = timezone.make_aware(datetime(2026, 3, 2, 8, 0))
+        return [
+            MeasuresModel(
+                instrument=self.sensor.instrument, sensor=self.sensor, temperature=20.0 + i / 100, humidity=50.0,
+                date=start + timedelta(minutes=i),
+            )
+            for i in range(first, first + count)
+        ]
+
+    def stored_count(self):
+        return MeasuresModel.objects.filter(sensor=self.sensor).count()
+
+    async def test_spooled_measurements_wait_for_the_database(self):
+        for measure in self.measures(5):
+            self.writer.add(measure)
+        self.addCleanup(self.writer._task.cancel)
+        with patch('fluke_data.measurement_writer.upsert_measures', side_effect=OperationalError('database is locked')):
+            await self.writer.flush()
+        # Durable on disk, not in the database
+        self.assertEqual(len(self.spool.sealed_segments()), 1)
+        self.assertEqual(await sync_to_async(self.stored_count)(), 0)
+        self.assertFalse(self.writer.stats()['database_available'])
+
+        # Once the retry delay has passed, the next flush replays it
+        for measure in self.measures(2, first=5):
+            self.writer.add(measure)
+        self.writer._retry_at = 0
+        await self.writer.flush()
+        self.assertEqual(self.spool.sealed_segments(), [])
+        self.assertEqual(await sync_to_async(self.stored_count)(), 7)
+        self.assertTrue(self.writer.stats()['database_available'])
+
+    async def test_measurements_are_written_in_batches(self):
+        writer = MeasurementWriter(self.spool, batch_size=4, flush_interval=60, max_pending=1000)
+        measures = self.measures(8)
+        with patch('fluke_data.measurement_writer.upsert_measures', wraps=upsert_measures) as upsert:
+            for measure in measures[:3]:
+                writer.add(measure)
+            self.addCleanup(writer._task.cancel)
+            await asyncio.sleep(0.1)
+            # Below batch_size the measurements wait for the flush interval
+            self.assertEqual((len(writer.pending), writer.stats()['spooled']), (3, 0))
+
+            writer.add(measures[3])
+            await wait_until(lambda: writer.stats()['written'] == 4)
+            for measure in measures[4:]:
+                writer.add(measure)
+            await wait_until(lambda: writer.stats()['written'] == 8)
+        self.assertEqual(upsert.call_count, 2)
+        stats = writer.stats()
+        self.assertEqual((stats['flushes'], stats['last_batch_size'], stats['max_batch_size'], stats['pending']), (2, 4, 4, 0))
+        self.assertEqual(await sync_to_async(self.stored_count)(), 8)
+
+    async def test_oldest_pending_measurements_are_dropped(self):
+        writer = MeasurementWriter(self.spool, batch_size=100, flush_interval=60, max_pending=3)
+        for measure in self.measures(5):
+            writer.add(measure)
+        self.addCleanup(writer._task.cancel)
+        self.assertEqual(writer.stats()['dropped'], 2)
+        await writer.flush()
+        temperatures = await sync_to_async(list)(
+            MeasuresModel.objects.filter(sensor=self.sensor).order_by('date').values_list('temperature', flat=True))
+        self.assertEqual(temperatures, [20.02, 20.03, 20.04])
+
+    def test_replay_skips_torn_lines_and_duplicates(self):
+        self.spool.append(self.measures(3))
+        # A crash in the middle of a write
+        with open(self.spool._active[1].name, 'ab') as segment_file:
+            segment_file.write(b'{"i":1,"s":1,"t":2')
+        self.spool.seal()
+        # The segment was written, then the process stopped before removing it
+        segment = self.spool.sealed_segments()[0]
+        self.writer._write(self.spool.read(segment))
+        self.writer.flush_sync()
+
+        self.assertEqual(self.stored_count(), 3)
+        self.assertEqual(self.spool.sealed_segments(), [])
+        stats = self.writer.stats()
+        self.assertEqual((stats['written'], stats['duplicates']), (3, 3))
+
+    def test_stats_skip_segments_replayed_meanwhile(self):
+        self.spool.append(self.measures(3))
+        self.spool.seal()
+        segment = self.spool.sealed_segments()[0]
+        # The writer replays and removes the segment between the listing and its size
+        with patch.object(self.spool, '_segment_numbers', return_value=[segment, segment + 1]):
+            stats = self.spool.stats()
+        self.assertEqual(stats['segments'], 1)
+        self.assertEqual(stats['bytes'], os.path.getsize(self.spool._segment_path(segment)))
+
+
+class MeasurePartitionTests(TemporaryStorageMixin, TransactionTestCase):
+    # The SQLite schema editor cannot create the partition tables inside the transaction of a TestCase
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.drop_partitions)
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+
+    @staticmethod
+    def drop_partitions():
+        for partition in MeasurePartitionModel.objects.all():
+            drop_partition(partition)
+
+    def add_measure(self, month, day, temperature=20.0):
+        return MeasuresModel.objects.create(
+            instrument=self.sensor.instrument, sensor=self.sensor, temperature=temperature, humidity=50.0,
+            date=timezone.make_aware(datetime(2026, month, day, 12, 0)),
+        )
+
+    def temperatures(self):
+        return [(measure.date.month, measure.temperature) for measure in iterate_measures(sensor_id=self.sensor.id)]
+
+    def test_closed_months_are_sealed_and_still_queried(self):
+        for month in (1, 2, 3, 4):
+            self.add_measure(month, 10, temperature=20.0 + month)
+            self.add_measure(month, 20, temperature=21.0 + month)
+
+        sealed = seal_closed_months(hot_months=2, today=date(2026, 4, 15))
+        self.assertEqual(sealed, {date(2026, 1, 1): 2, date(2026, 2, 1): 2})
+        self.assertEqual(sorted(date.month for date in MeasuresModel.objects.values_list('date', flat=True)), [3, 3, 4, 4])
+        self.assertEqual(get_partition_model(date(2026, 1, 1)).objects.count(), 2)
+        self.assertEqual(self.temperatures(), [
+            (1, 21.0), (1, 22.0), (2, 22.0), (2, 23.0), (3, 23.0), (3, 24.0), (4, 24.0), (4, 25.0),
+        ])
+        self.assertEqual(count_measures(timezone.make_aware(datetime(2026, 1, 15)), timezone.make_aware(datetime(2026, 3, 15))), 4)
+
+        # A late backfill of a sealed month is moved on the next run; the sealed reading of the same date is kept
+        self.add_measure(1, 25, temperature=19.0)
+        self.add_measure(1, 10, temperature=30.0)
+        self.assertEqual(seal_month(date(2026, 1, 1)), 1)
+        self.assertFalse(MeasuresModel.objects.filter(date__lt=timezone.make_aware(datetime(2026, 2, 1))).exists())
+        self.assertEqual([value for month, value in self.temperatures() if month == 1], [21.0, 22.0, 19.0])
+        self.assertEqual(MeasurePartitionModel.objects.get(month=date(2026, 1, 1)).row_count, 3)
+
+    def test_retention_drops_old_partitions(self):
+        for month in (1, 2, 3):
+            self.add_measure(month, 10)
+        seal_closed_months(hot_months=1, today=date(2026, 3, 15))
+        january_table = get_partition_model(date(2026, 1, 1))._meta.db_table
+
+        self.assertEqual(apply_retention(retention_months=0, today=date(2026, 3, 15)), [])
+        self.assertEqual(apply_retention(retention_months=1, today=date(2026, 3, 15)), [date(2026, 1, 1)])
+        self.assertNotIn(january_table, connection.introspection.table_names())
+        self.assertEqual([month for month, _ in self.temperatures()], [2, 3])
+
+
+class MeasureArchiveTests(TemporaryStorageMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(MeasurePartitionTests.drop_partitions)
+        thermo = ThermohygrometerModel.objects.create(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        self.sensor = SensorModel.objects.create(instrument=thermo, channel=1, sensor_name='Channel 1')
+        self.other_sensor = SensorModel.objects.create(instrument=thermo, channel=2, sensor_name='Channel 2')
+        for month in (1, 2, 3):
+            for day in (10, 20):
+                for sensor, offset in ((self.sensor, 0.0), (self.other_sensor, 10.0)):
+                    MeasuresModel.objects.create(
+                        instrument=thermo, sensor=sensor, temperature=20.0 + month + day / 100 + offset, humidity=50.0,
+                        date=timezone.make_aware(datetime(2026, month, day, 12, 0)),
+                    )
+        # January is archived to Parquet, February stays in its partition and March in MeasuresModel
+        seal_closed_months(hot_months=1, today=date(2026, 3, 15))
+        archive_closed_partitions(archive_after_months=1, today=date(2026, 3, 15))
+
+    def test_archived_month_is_read_from_parquet(self):
+        january = date(2026, 1, 1)
+        self.assertIsNotNone(MeasurePartitionModel.objects.get(month=january).archived_at)
+        self.assertNotIn(get_partition_model(january)._meta.db_table, connection.introspection.table_names())
+        self.assertTrue(os.path.exists(sensor_file(january, self.sensor.id)))
+
+        frame = read_archive(sensor_id=self.sensor.id)
+        self.assertEqual(frame['temperature'].tolist(), [21.1, 21.2])
+        self.assertEqual(frame['sensor_id'].unique().tolist(), [self.sensor.id])
+
+        frame = read_archive(
+            timezone.make_aware(datetime(2026, 1, 15)), timezone.make_aware(datetime(2026, 1, 31)),
+            columns=('sensor_id', 'temperature'), temperature__gt=25.0,
+        )
+        self.assertEqual(frame.values.tolist(), [[self.other_sensor.id, 31.2]])
+
+    def test_archive_partitions_and_live_table_are_merged_in_date_order(self):
+        rows = list(iterate_measures(sensor_id=self.sensor.id, fields=('date', 'temperature')))
+        self.assertEqual([temperature for _, temperature in rows], [21.1, 21.2, 22.1, 22.2, 23.1, 23.2])
+        self.assertEqual([measured_at for measured_at, _ in rows], sorted(measured_at for measured_at, _ in rows))
+
+        newest = [measure.temperature for measure in iterate_measures(order='-date', sensor_id=self.other_sensor.id)]
+        self.assertEqual(newest, [33.2, 33.1, 32.2, 32.1, 31.2, 31.1])
+
+        start = timezone.make_aware(datetime(2026, 1, 15))
+        end = timezone.make_aware(datetime(2026, 3, 15))
+        self.assertEqual(count_measures(start, end), 8)
+        self.assertEqual(count_measures(start, end, sensor_id=self.sensor.id), 4)
+
+
+class MetricsThreadTests(TemporaryStorageMixin, TestCase):
+    async def test_event_loop_state_is_read_on_the_loop(self):
+        user = await sync_to_async(get_user_model().objects.create_user)(username='tester', password='secret')
+        client = APIClient()
+        client.force_authenticate(user)
+        threads = []
+
+        def stats(*args):
+            threads.append(threading.get_ident())
+            return {}
+
+        fanout = LiveFanout()
+        with patch('fluke_data.api.views.metrics.get_live_fanout', return_value=fanout), \
+                patch.object(fanout, 'stats', stats), \
+                patch.object(InstrumentExecutor, 'stats', stats):
+            # As under the ASGI server: the view runs in a worker thread, the acquisitions in the loop
+            response = await sync_to_async(client.get)('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+
+
+class InstrumentExecutorTests(SimpleTestCase):
+    async def test_a_blocked_instrument_only_holds_its_lane(self):
+        executor = InstrumentExecutor(max_workers=4)
+        self.addCleanup(executor._executor.shutdown, wait=False)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        running = []
+
+        def read(name):
+            running.append(name)
+            if name == 'first':
+                release.wait(10)
+            return name
+
+        first = asyncio.create_task(executor.run(1, read, 'first'))
+        second = asyncio.create_task(executor.run(1, read, 'second'))
+        await wait_until(lambda: running == ['first'])
+
+        # Another instrument is read while the first lane is blocked
+        self.assertEqual(await executor.run(2, read, 'other'), 'other')
+        stats = executor.stats()
+        self.assertEqual(stats['lanes']['1']['queue_depth'], 1)
+        self.assertEqual(stats['lanes']['1']['in_flight'], 1)
+        self.assertEqual(stats['lanes']['2']['calls'], 1)
+        self.assertEqual((stats['queue_depth'], stats['in_flight']), (1, 1))
+        self.assertEqual(running, ['first', 'other'])
+
+        release.set()
+        self.assertEqual(await asyncio.gather(first, second), ['first', 'second'])
+        self.assertEqual(running, ['first', 'other', 'second'])
+        self.assertEqual(executor.stats()['lanes']['1']['calls'], 2)
+        self.assertGreater(executor.stats()['lanes']['1']['max_wait_ms'], 0)
+
+    async def test_errors_are_counted_and_raised(self):
+        executor = InstrumentExecutor(max_workers=1)
+        self.addCleanup(executor._executor.shutdown, wait=False)
+
+        def fail():
+            raise VisaIOError(constants.StatusCode.error_timeout)
+
+        with self.assertRaises(VisaIOError):
+            await executor.run(1, fail)
+        lane = executor.stats()['lanes']['1']
+        self.assertEqual((lane['calls'], lane['errors'], lane['in_flight'], lane['queue_depth']), (1, 1, 0, 0))
+
+        executor.forget(1)
+        self.assertNotIn(1, executor._lanes)
+
+
+class LatestValuesApiTests(TestCase):
+    URL = '/api/v1/latest-values/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='viewer', password='secret'))
+        self.store = LatestValueStore()
+        store_patch = patch('fluke_data.api.views.latest_values.get_latest_value_store', return_value=self.store)
+        store_patch.start()
+        self.addCleanup(store_patch.stop)
+
+    def update(self, sensor_id, temperature):
+        self.store.update(1, {
+            'date': '2026/01/15 12:00:00', 'temperature': temperature, 'humidity': 50.0,
+            'corrected_temperature': temperature + 0.1, 'corrected_humidity': 50.5, 'temperature_style': 'red',
+        }, {
+            'sensor_id': sensor_id, 'sensor_name': f'Channel {sensor_id}', 'location': 'Lab', 'channel': sensor_id,
+            'instrument_name': 'T1', 'min_temperature': 18.0, 'max_temperature': 22.0, 'min_humidity': 40.0, 'max_humidity': 60.0,
+        })
+
+    def test_unchanged_values_are_not_modified(self):
+        self.update(1, 23.0)
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        [sensor] = response.data['sensors']
+        self.assertEqual((sensor['sensor_id'], sensor['temperature'], sensor['corrected_temperature']), (1, 23.0, 23.1))
+        self.assertTrue(sensor['calibrated'])
+        self.assertEqual(sensor['out_of_limits'], {
+            'temperature': True, 'humidity': False, 'corrected_temperature': False, 'corrected_humidity': False,
+        })
+        self.assertGreaterEqual(sensor['age_seconds'], 0)
+        self.assertNotIn('received_at_epoch', sensor)
+
+        # Weak comparison: the strong form of the tag and a list of tags match too
+        for if_none_match in (etag, etag.removeprefix('W/'), f'"other", {etag}', '*'):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=if_none_match)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+        self.update(2, 20.0)
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(sorted(sensor['sensor_id'] for sensor in response.data['sensors']), [1, 2])
+
+    def test_discarded_sensor_changes_the_etag(self):
+        self.update(1, 20.0)
+        self.update(2, 20.0)
+        etag = self.client.get(self.URL)['ETag']
+        self.store.discard(3)
+        self.assertEqual(self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.store.discard(2)
+        response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([sensor['sensor_id'] for sensor in response.data['sensors']], [1])
+
+    def test_another_process_does_not_match(self):
+        self.update(1, 20.0)
+        etag = self.client.get(self.URL)['ETag']
+        # A restarted server starts again from version 0 with another token
+        self.store = LatestValueStore()
+        self.store.token = 'restarted'
+        self.update(1, 20.0)
+        with patch('fluke_data.api.views.latest_values.get_latest_value_store', return_value=self.store):
+            response = self.client.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class LiveFanoutTests(SimpleTestCase):
+    def test_frame_is_published_once_to_each_subscriber(self):
+        fanout = LiveFanout()
+        sensor_listener, instrument_listener, group_listener, everything, other = (Mock() for _ in range(5))
+        fanout.subscribe('sensor', sensor_listener)
+        fanout.subscribe('instrument', instrument_listener)
+        fanout.subscribe('lab', group_listener)
+        for group in ('sensor', 'instrument', 'lab'):
+            fanout.subscribe(group, everything)
+        fanout.subscribe('other', other)
+
+        frame = LiveReading({'temperature': 20.0}, {'sensor_id': 1})
+        self.assertEqual(fanout.publish(['sensor', 'instrument', 'lab', 'missing'], frame, key=1), 4)
+        for subscriber in (sensor_listener, instrument_listener, group_listener, everything):
+            subscriber.deliver.assert_called_once_with(frame, 1)
+        other.deliver.assert_not_called()
+
+        # A single group is handed to its subscribers as is
+        self.assertEqual(fanout.publish(['sensor'], '{}'), 2)
+        self.assertEqual(fanout.publish(['missing'], '{}'), 0)
+
+        fanout.unsubscribe('sensor', sensor_listener)
+        fanout.unsubscribe('sensor', everything)
+        self.assertNotIn('sensor', fanout.groups)
+
+
+class LiveReadingTests(SimpleTestCase):
+    def reading(self, **data):
+        data = {'date': '2026/01/15 12:00:00', 'temperature': 21.37, 'humidity': 48.5, **data}
+        return LiveReading(data, {'sensor_id': 70000, 'sensor_name': 'Channel 1'})
+
+    def test_binary_frame_layout(self):
+        reading = self.reading(
+            corrected_temperature=-5.25, corrected_humidity=49.0,
+            temperature_style='red', humidity_style='black',
+            corrected_temperature_style='red', corrected_humidity_style='red',
+        )
+        frame = reading.binary
+        self.assertEqual(len(frame), 18)
+        self.assertEqual(frame[:2], bytes([1, 0x01 | 0x04 | 0x08]))
+        self.assertEqual(BINARY_READING.unpack(frame), (
+            1, 0x0d, 70000, int(timezone.make_aware(datetime(2026, 1, 15, 12, 0)).timestamp()), 2137, 4850, -525, 4900,
+        ))
+        self.assertIs(reading.binary, frame)
+        self.assertEqual(json.loads(reading.metadata), {'sensor': {'sensor_id': 70000, 'sensor_name': 'Channel 1'}})
+        self.assertIs(reading.metadata, reading.metadata)
+
+    def test_uncalibrated_values_are_flagged(self):
+        reading = self.reading(corrected_temperature='-', corrected_humidity=None)
+        _, flags, _, _, *values = BINARY_READING.unpack(reading.binary)
+        self.assertEqual(flags, FLAG_NO_CALIBRATION)
+        self.assertEqual(values, [2137, 4850, NO_VALUE, NO_VALUE])
+
+
+class LiveConsumerTests(TestCase):
+    async def connect(self):
+        communicator = WebsocketCommunicator(LiveConsumer.as_asgi(), '/ws/live/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def command(self, communicator, **message):
+        await communicator.send_json_to(message)
+        return await communicator.receive_json_from()
+
+    async def test_subscriptions_follow_the_commands(self):
+        thermo = await ThermohygrometerModel.objects.acreate(
+            ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1', group_name='Lab')
+        sensor = await SensorModel.objects.acreate(instrument=thermo, channel=1, sensor_name='Channel 1')
+        groups = [sensor_group(thermo.id, sensor.id), instrument_group(thermo.id), named_group('Lab')]
+        fanout = get_live_fanout()
+        communicator = await self.connect()
+        try:
+            response = await self.command(
+                communicator, command='subscribe', sensors=[sensor.id], instruments=[thermo.id], groups=['Lab'])
+            self.assertEqual(response, {'subscriptions': {'sensors': [sensor.id], 'instruments': [thermo.id], 'groups': ['Lab']}})
+            consumer = next(iter(fanout.groups[groups[0]]))
+            self.assertTrue(all(fanout.groups[group] == {consumer} for group in groups))
+
+            # A reading matching the three subscriptions is sent once
+            self.assertEqual(fanout.publish(groups, json.dumps({'sensor': sensor.id}), key=sensor.id), 1)
+            self.assertEqual(await communicator.receive_json_from(), {'sensor': sensor.id})
+            self.assertTrue(await communicator.receive_nothing())
+
+            response = await self.command(communicator, command='unsubscribe', sensors=[sensor.id], groups=['Lab'])
+            self.assertEqual(response, {'subscriptions': {'sensors': [], 'instruments': [thermo.id], 'groups': []}})
+            self.assertNotIn(groups[0], fanout.groups)
+            self.assertNotIn(groups[2], fanout.groups)
+
+            response = await self.command(communicator, command='subscribe', sensors=[sensor.id + 1000])
+            self.assertEqual(response, {'error': f'Sensors not found: [{sensor.id + 1000}]'})
+            response = await self.command(communicator, command='listen')
+            self.assertEqual(response, {'error': 'Unknown command: listen'})
+        finally:
+            await communicator.disconnect()
+        self.assertFalse(any(group in fanout.groups for group in groups))
+
+    @patch.object(LiveConsumer, 'MAX_SUBSCRIPTIONS', 2)
+    async def test_subscriptions_are_limited_per_connection(self):
+        communicator = await self.connect()
+        try:
+            response = await self.command(communicator, command='subscribe', groups=['A', 'B', 'C'])
+            self.assertEqual(response, {'error': 'At most 2 subscriptions per connection'})
+            response = await self.command(communicator, command='subscribe', groups=['A', 'B'])
+            self.assertEqual(response['subscriptions']['groups'], ['A', 'B'])
+            # Counted with the subscriptions already held, a repeated one is not counted twice
+            response = await self.command(communicator, command='subscribe', groups=['B', 'C'])
+            self.assertEqual(response, {'error': 'At most 2 subscriptions per connection'})
+            response = await self.command(communicator, command='subscribe', groups=['B'])
+            self.assertEqual(response['subscriptions']['groups'], ['A', 'B'])
+            self.assertNotIn(named_group('C'), get_live_fanout().groups)
+        finally:
+            await communicator.disconnect()
+
+
+class StalledTransport(FileDescriptor):
+    """Twisted transport, with its write buffer and flow control, over a socket that takes nothing while stalled."""
+    bufferSize = 4096
+
+    def __init__(self):
+        super().__init__(reactor=MemoryReactor())
+        self.connected = True
+        self.stalled = True
+        self.received = b''
+
+    def writeSomeData(self, data):
+        if self.stalled:
+            return 0
+        self.received += bytes(data)
+        return len(data)
+
+
+class TransportBackpressureTests(TestCase):
+    async def test_stalled_client_gets_the_latest_value_of_each_sensor(self):
+        thermo = await ThermohygrometerModel.objects.acreate(ip_address='127.0.0.1', pn='1620A', sn='T1', instrument_name='T1')
+        sensors = [
+            await SensorModel.objects.acreate(instrument=thermo, channel=channel, sensor_name=f'Channel {channel}')
+            for channel in range(1, 6)
+        ]
+        transport = StalledTransport()
+        # The HTTP channel of the upgrade request, left registered by daphne
+        http_channel = Mock()
+        transport.registerProducer(http_channel, True)
+        protocol = SimpleNamespace(transport=transport)
+
+        async def handle_reply(protocol, message):
+            if message['type'] == 'websocket.send':
+                protocol.transport.write(message['text'].encode() + b'\n')
+
+        # The project's WebSocket stack, called as daphne calls it
+        received = asyncio.Queue()
+        application = asyncio.create_task(asgi_application({
+            'type': 'websocket', 'path': '/ws/live/', 'headers': [], 'query_string': b'', 'subprotocols': [],
+            'client': ['127.0.0.1', 50000], 'server': ['127.0.0.1', 8000],
+        }, received.get, functools.partial(handle_reply, protocol)))
+        await received.put({'type': 'websocket.connect'})
+        await received.put({'type': 'websocket.receive', 'text': json.dumps({
+            'command': 'subscribe', 'sensors': [sensor.id for sensor in sensors],
+        })})
+        fanout = get_live_fanout()
+        groups = [sensor_group(thermo.id, sensor.id) for sensor in sensors]
+        await wait_until(lambda: all(group in fanout.groups for group in groups))
+        consumer = next(iter(fanout.groups[groups[0]]))
+        self.assertIs(transport.producer, consumer.flow_control)
+
+        try:
+            for i in range(200):
+                for sensor, group in zip(sensors, groups):
+                    fanout.publish([group], json.dumps({'sensor': sensor.id, 'i': i, 'data': 'x' * 500}), key=sensor.id)
+                await asyncio.sleep(0)
+
+            lag = consumer.frame_lag()
+            self.assertTrue(lag['transport_paused'])
+            self.assertEqual(lag['transport_pauses'], 1)
+            http_channel.pauseProducing.assert_called()
+            # A few frames fill the transport buffer, the others wait in the queue, one per sensor
+            self.assertLess(lag['sent'], 15)
+            self.assertEqual(lag['pending'], 5)
+            self.assertEqual(lag['sent'] + lag['pending'] + lag['coalesced'], 1000)
+
+            # The client reads again: the buffer drains and the latest values follow
+            transport.stalled = False
+            transport.doWrite()
+            self.assertFalse(consumer.frame_lag()['transport_paused'])
+            http_channel.resumeProducing.assert_called()
+            await wait_until(lambda: not consumer.pending)
+            transport.doWrite()
+            frames = [json.loads(line) for line in transport.received.splitlines()]
+            latest = {frame['sensor']: frame['i'] for frame in frames if 'sensor' in frame}
+            self.assertEqual(latest, {sensor.id: 199 for sensor in sensors})
+        finally:
+            await received.put({'type': 'websocket.disconnect', 'code': 1000})
+            await application
+        self.assertIs(transport.producer, http_channel)
+        self.assertFalse(any(group in fanout.groups for group in groups))
@@ -5,7 +5,6 @@ from django.contrib import messages
 from django.contrib.auth import get_user_model, login
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Avg, Max, Min
 from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import (
@@ -16,6 +15,8 @@ from django.views.generic import (
 
 from .forms import *
 from .models import *
+from .partitions import iterate_measures
+from .rollups import rollup_stats
 
 User = get_user_model()
 # Check if the user is a manager
@@ -80,26 +81,13 @@ class DataVisualizationView(TemplateView):
                 end_datetime = datetime.strptime(
                     f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
 
-                # Filter measurements by sensor directly
-                data = MeasuresModel.objects.filter(
-                    sensor=selected_sensor,
-                    date__range=[start_datetime, end_datetime]
-                ).order_by('-date')
-
-                stats = data.aggregate(
-                    min_temperature=Min('temperature'),
-                    corrected_min_temperature=Min('corrected_temperature'),
-                    max_temperature=Max('temperature'),
-                    corrected_max_temperature=Max('corrected_temperature'),
-                    avg_temperature=Avg('temperature'),
-                    corrected_avg_temperature=Avg('corrected_temperature'),
-                    min_humidity=Min('humidity'),
-                    corrected_min_humidity=Min('corrected_humidity'),
-                    max_humidity=Max('humidity'),
-                    corrected_max_humidity=Max('corrected_humidity'),
-                    avg_humidity=Avg('humidity'),
-                    corrected_avg_humidity=Avg('corrected_humidity'),
-                )
+                # Filter measurements by sensor directly, across the monthly partitions
+                data = list(iterate_measures(
+                    start_datetime, end_datetime, sensor_id=selected_sensor.id, order='-date'
+                ))
+
+                # Served from the minute/hour/day rollups instead of scanning every row
+                stats = rollup_stats(selected_sensor, start_datetime, end_datetime)
 
                 context.update({
                     'data': data,
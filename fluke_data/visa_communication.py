@@ -1,15 +1,18 @@
 # fluke_data/visa_communication.py
+from datetime import datetime
+
 from asgiref.sync import sync_to_async
 
+from thermohygrometer.async_thermohygrometer import AsyncThermohygrometer
 from thermohygrometer.thermohygrometer import Thermohygrometer
 
 from .models import ThermohygrometerModel, SensorModel
 
 
 class Instrument(Thermohygrometer):
-    def __init__(self, ip_address):
+    def __init__(self, ip_address, identity=None):
         super().__init__(ip_address)
-        self.connect()
+        self.connect(identity=identity)
         # Use async method to save data to the database
         sync_to_async(self.save_to_database)()
 
@@ -42,6 +45,11 @@ class Instrument(Thermohygrometer):
     def get_live_data_all_channels(self):
         """
         Retrieves live data from all available channels of the thermohygrometer.
+
+        By default both channels are read in a single exchange (pipelined
+        `READ?` queries). A failed exchange is read again one query per channel;
+        batching stays off for the session when the instrument does not answer
+        that way (see Thermohygrometer._batched_read_failed).
         
         Returns:
             dict: A dictionary with channel numbers as keys and the corresponding data as values.
@@ -52,6 +60,25 @@ class Instrument(Thermohygrometer):
             self.datetime_adjust_made = False
             return result
         
+        if self.batched_reads:
+            try:
+                responses = self.query_pipelined([f"READ? {channel}" for channel in self.LIVE_DATA_CHANNELS])
+                if responses is None:
+                    return result
+                result = self._parse_live_data_all_channels(responses, self.LIVE_DATA_CHANNELS)
+                if not result:
+                    # Answers that are not readings: the instrument does not take batched queries
+                    self._batched_read_failed(f"unexpected responses {responses}", rejected=True)
+                else:
+                    self.batched_read_failures = 0
+                    # After a fast reconnect the clock is checked on the first reading
+                    if self.clock_check_pending and self._reading_clock_out_of_sync(result):
+                        self._set_instrument_date_time(datetime.now())
+                        return {}
+                    return result
+            except Exception as e:
+                self._batched_read_failed(e)
+
         try:
             # Get data from channel 1
             ch1_data = self.get_data(channel='1')
@@ -102,4 +129,79 @@ class Instrument(Thermohygrometer):
                     'sensor_name': f"{thermo.instrument_name} - Channel 2",
                     'location': 'Default Location',
                 }
-            )
\ No newline at end of file
+            )
+
+
+class AsyncInstrument(AsyncThermohygrometer):
+    """
+    asyncio counterpart of Instrument.
+
+    Offers the same get_data/get_live_data_all_channels API as coroutines.
+    Since connecting requires awaiting, use `await AsyncInstrument.open(ip)`
+    instead of the constructor.
+    """
+
+    @classmethod
+    async def open(cls, ip_address, identity=None):
+        instrument = cls(ip_address)
+        await instrument.connect(identity=identity)
+        return instrument
+
+    async def get_data(self, channel=None):
+        """
+        Retrieves live data from the specified channel of the thermohygrometer.
+
+        Same contract as Instrument.get_data: returns the parsed dictionary, or
+        the exception message as a string if the query or the parsing fails.
+        """
+        try:
+            data = await self.send_command(f"READ? {channel}")
+            if data is None:
+                return "No response from instrument"
+            return self._parse_live_data_one_channel(data=data, channel=channel)
+        except Exception as e:
+            return str(e)
+
+    async def get_live_data_all_channels(self):
+        """
+        Retrieves live data from all available channels of the thermohygrometer.
+
+        Returns:
+            dict: A dictionary with channel numbers as keys and the corresponding data as values.
+        """
+        result = {}
+        if self.datetime_adjust_made:
+            self.datetime_adjust_made = False
+            return result
+
+        if self.batched_reads:
+            try:
+                responses = await self.query_pipelined([f"READ? {channel}" for channel in self.LIVE_DATA_CHANNELS])
+                if responses is None:
+                    return result
+                result = self._parse_live_data_all_channels(responses, self.LIVE_DATA_CHANNELS)
+                if not result:
+                    # Answers that are not readings: the instrument does not take batched queries
+                    self._batched_read_failed(f"unexpected responses {responses}", rejected=True)
+                else:
+                    self.batched_read_failures = 0
+                    # After a fast reconnect the clock is checked on the first reading
+                    if self.clock_check_pending and self._reading_clock_out_of_sync(result):
+                        await self._set_instrument_date_time(datetime.now())
+                        return {}
+                    return result
+            except Exception as e:
+                self._batched_read_failed(e)
+
+        try:
+            ch1_data = await self.get_data(channel='1')
+            if isinstance(ch1_data, dict):
+                result[1] = ch1_data
+
+            ch2_data = await self.get_data(channel='2')
+            if isinstance(ch2_data, dict):
+                result[2] = ch2_data
+            return result
+        except Exception as e:
+            print(f"Error getting data from all channels: {str(e)}")
+            return {}
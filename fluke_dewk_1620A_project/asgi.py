@@ -4,14 +4,18 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import fluke_data.routing
+from fluke_data.connection_manager import ConnectionManagerMiddleware
+from fluke_data.fanout import TransportSendMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fluke_dewk_1620A_project.settings')
 
-application = ProtocolTypeRouter({
+# ConnectionManagerMiddleware starts the reconnect scheduler on the server's event loop
+application = ConnectionManagerMiddleware(ProtocolTypeRouter({
     'http': get_asgi_application(),
-    'websocket': AuthMiddlewareStack(
+    # TransportSendMiddleware first, so live consumers can see when a client stops reading
+    'websocket': TransportSendMiddleware(AuthMiddlewareStack(
         URLRouter(
             fluke_data.routing.websocket_urlpatterns
         )
-    ),
-})
+    )),
+}))
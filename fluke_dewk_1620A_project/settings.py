@@ -152,7 +152,45 @@ CHANNEL_LAYERS = {
 LOGIN_URL = 'login'
 
 # Add this at the end of your settings file
-AUTO_CONNECT_ON_STARTUP = False  # Set to False if you want to disable auto-connect
+# Keeps every registered instrument connected from the first request to the ASGI
+# server on (see InstrumentConnectionManager.start)
+AUTO_CONNECT_ON_STARTUP = os.getenv('AUTO_CONNECT_ON_STARTUP', '0') == '1'
+
+# Transport used to talk to the DewK 1620A: 'visa' (pyvisa socket session) or
+# 'asyncio' (native asyncio socket, one event loop drives every instrument)
+THERMOHYGROMETER_TRANSPORT = os.getenv('THERMOHYGROMETER_TRANSPORT', 'visa')
+
+# Worker threads dedicated to blocking instrument I/O (one lane per instrument)
+INSTRUMENT_IO_MAX_WORKERS = int(os.getenv('INSTRUMENT_IO_MAX_WORKERS', '32'))
+
+# Reconnect attempts that may run at the same time (see ReconnectScheduler)
+INSTRUMENT_RECONNECT_CONCURRENCY = int(os.getenv('INSTRUMENT_RECONNECT_CONCURRENCY', '50'))
+
+# Measurements are written in batches: when MEASUREMENT_WRITER_BATCH_SIZE are
+# pending or every MEASUREMENT_WRITER_FLUSH_INTERVAL seconds
+MEASUREMENT_WRITER_BATCH_SIZE = int(os.getenv('MEASUREMENT_WRITER_BATCH_SIZE', '500'))
+MEASUREMENT_WRITER_FLUSH_INTERVAL = float(os.getenv('MEASUREMENT_WRITER_FLUSH_INTERVAL', '2.0'))
+MEASUREMENT_WRITER_MAX_PENDING = int(os.getenv('MEASUREMENT_WRITER_MAX_PENDING', '50000'))
+
+# On-disk spool every measurement goes through before reaching the database
+MEASUREMENT_SPOOL_DIR = os.getenv('MEASUREMENT_SPOOL_DIR', str(BASE_DIR / 'spool'))
+MEASUREMENT_SPOOL_SEGMENT_BYTES = int(os.getenv('MEASUREMENT_SPOOL_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+MEASUREMENT_SPOOL_MAX_BYTES = int(os.getenv('MEASUREMENT_SPOOL_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Closed months are moved out of MeasuresModel into one table per month by
+# `manage.py partition_measures` (run it daily, e.g. from cron); the last
+# MEASUREMENT_HOT_MONTHS months stay in MeasuresModel. Partitions older than
+# MEASUREMENT_RETENTION_MONTHS are dropped (unset keeps everything)
+MEASUREMENT_HOT_MONTHS = int(os.getenv('MEASUREMENT_HOT_MONTHS', '2'))
+MEASUREMENT_RETENTION_MONTHS = int(os.getenv('MEASUREMENT_RETENTION_MONTHS', '0')) or None
+
+# Partitions older than MEASUREMENT_ARCHIVE_AFTER_MONTHS are moved to per-sensor
+# Parquet files under MEASUREMENT_ARCHIVE_DIR (unset never archives)
+MEASUREMENT_ARCHIVE_AFTER_MONTHS = int(os.getenv('MEASUREMENT_ARCHIVE_AFTER_MONTHS', '0')) or None
+MEASUREMENT_ARCHIVE_DIR = os.getenv('MEASUREMENT_ARCHIVE_DIR', str(BASE_DIR / 'archive'))
+
+# Largest batch of measurements accepted by one call of the ingest API (/api/v1/measures/)
+MEASUREMENT_INGEST_MAX_BATCH = int(os.getenv('MEASUREMENT_INGEST_MAX_BATCH', '10000'))
 
 SWAGGER_SETTINGS = {
     'DEFAULT_INFO': 'fluke_data.urls.schema_view',
@@ -0,0 +1,176 @@
+# fluke_dewk_1620A_project\thermohygrometer\async_thermohygrometer.py
+
+import asyncio
+
+from datetime import datetime
+
+from .thermohygrometer import Thermohygrometer
+
+
+class AsyncThermohygrometer(Thermohygrometer):
+    """
+    asyncio-native transport for the DewK 1620A.
+
+    Speaks the same '\\r'-terminated SCPI protocol that pyvisa uses on
+    TCPIP0::<ip>::10001::SOCKET, but over asyncio.open_connection, so a single
+    event loop can drive many instruments without a thread per query.
+    Parsing and correction logic are inherited from Thermohygrometer; the I/O
+    methods have the same names but must be awaited.
+    """
+    TERMINATION = b'\r'
+
+    def __init__(self, ip, port=10001, timeout=2.0):
+        self.ip_address = ip
+        self.host, self.port = self._split_address(ip, port)
+        self.timeout = timeout  # Timeout de 2 segundos, igual à sessão VISA
+        self.instrument = None
+        self.reader = None
+        self.writer = None
+        self._format_data = None
+        self.datetime_adjust_made = False
+        self.batched_reads = True
+        self.batched_read_failures = 0
+        self.fast_reconnected = False
+        self.clock_check_pending = False
+        self._lock = asyncio.Lock()  # Uma consulta por vez no mesmo socket
+
+    async def connect(self, identity=None):
+        # Batched reads are tried again on every connection
+        self.batched_reads = True
+        self.batched_read_failures = 0
+        try:
+            self.reader, self.writer = await self._open_connection()
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"async_thermohygrometer.connect: Error connecting to DewK 1620A at {self.ip_address}: {e}")
+            self.instrument = None
+            return False
+        self.instrument = self.writer
+        if identity:
+            await self.set_format_data()
+            if self._fast_reconnect(identity, await self.send_command('*IDN?')):
+                return True
+        await self._update_date_time() # Adiciona a atualização de data e hora ao conectar
+        await self.set_format_data()
+        await self.get_format_data()
+        await self.get_instrument_personal_info()
+        return True
+
+    async def _open_connection(self):
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout=self.timeout)
+
+    async def _reopen(self):
+        """Replaces the connection, dropping the responses still on their way."""
+        self.writer.close()
+        try:
+            self.reader, self.writer = await self._open_connection()
+            self.instrument = self.writer
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"async_thermohygrometer._reopen: Error connecting to DewK 1620A at {self.ip_address}: {e}")
+            self.instrument = None
+            self.reader = None
+            self.writer = None
+
+    async def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.instrument = None
+        self.reader = None
+        self.writer = None
+        await asyncio.sleep(0.25)
+
+    async def send_command(self, command, response_needed=True):
+        if not self.instrument:
+            print("Thermohygrometer not connected.")
+            return None
+        try:
+            async with self._lock:
+                self.writer.write(command.encode('ascii') + self.TERMINATION)
+                await self.writer.drain()
+                if not response_needed:
+                    return None
+                return await self._read_response()
+        except Exception as e:
+            print(f"Error sending command '{command}'to DewK 1620A: {e}")
+            return None
+
+    async def query_pipelined(self, commands):
+        """
+        Writes every command at once, then reads one response per command.
+        When a read fails, the connection is reopened before the error is
+        raised, so the responses still pending are not read as the next answers.
+        """
+        if not self.instrument:
+            print("Thermohygrometer not connected.")
+            return None
+        async with self._lock:
+            try:
+                self.writer.write(b''.join(command.encode('ascii') + self.TERMINATION for command in commands))
+                await self.writer.drain()
+                return [await self._read_response() for _ in commands]
+            except Exception:
+                await self._reopen()
+                raise
+
+    async def _read_response(self):
+        response = await asyncio.wait_for(self.reader.readuntil(self.TERMINATION), timeout=self.timeout)
+        return response.decode('ascii').strip()
+
+    async def get_format_data(self):
+        response = await self.send_command('FORMat:TDST:STATe?')
+        self._format_data = response == '1'
+        return self._format_data
+
+    async def set_format_data(self, status: bool = True):
+        status = '1' if status else '0'
+        await self.send_command(f'FORM:TDST:STAT {status}', response_needed=False)
+
+    async def get_stored_record_count(self):
+        """Returns how many readings are stored in the instrument memory."""
+        response = await self.send_command(self.STORED_RECORD_COUNT_COMMAND)
+        try:
+            return int(response)
+        except (TypeError, ValueError):
+            return 0
+
+    async def read_stored_records(self, first_index, count):
+        """Reads `count` stored records starting at `first_index` in one exchange."""
+        commands = [self.STORED_RECORD_COMMAND.format(index=index) for index in range(first_index, first_index + count)]
+        return await self.query_pipelined(commands) or []
+
+    async def get_instrument_personal_info(self):
+        idn = await self.send_command('*IDN?')
+        _,self.PN,self.SN,_ = idn.split(',')
+        await asyncio.sleep(0.25)
+        self._set_instrument_name(await self.send_command('SENSor1:IDENtification?'))
+
+    async def _get_instrument_date_time(self):
+        """Consulta a data e hora atual do instrumento."""
+        date_response = await self.send_command("SYSTem:DATE?")
+        time_response = await self.send_command("SYSTem:TIME?")
+        return self._parse_instrument_date_time(date_response, time_response)
+
+    async def _set_instrument_date_time(self, now):
+        """Define a data e hora do instrumento."""
+        date_str = f"{now.year},{now.month},{now.day}"
+        time_str = f"{now.hour},{now.minute},{now.second}"
+
+        await self.send_command(f"SYSTem:DATE {date_str}", response_needed=False)
+        await asyncio.sleep(0.1)
+        await self.send_command(f"SYSTem:TIME {time_str}", response_needed=False)
+        print("Data e hora remotamente atualizadas.")
+
+    async def _update_date_time(self):
+        """Verifica e atualiza a data e hora do instrumento se necessário."""
+        instrument_date_time = await self._get_instrument_date_time()
+        now = datetime.now()
+
+        if instrument_date_time:
+            if self._date_time_out_of_sync(instrument_date_time, now):
+                await self._set_instrument_date_time(now)
+                self.datetime_adjust_made = True
+        else:
+            print("Não foi possível obter a data e hora do instrumento.")
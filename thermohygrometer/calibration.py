@@ -0,0 +1,123 @@
+# fluke_dewk_1620A_project\thermohygrometer\calibration.py
+
+from bisect import bisect_right
+
+import numpy as np
+
+
+MEASUREMENT_TYPES = ('temperature', 'humidity')
+
+# Field prefixes of the calibration points in CalibrationCertificateModel
+_CERTIFICATE_FIELDS = {
+    'temperature': ('temp_indication_point_{}', 'temp_correction_{}'),
+    'humidity': ('humidity_indication_point_{}', 'humidity_correction_{}'),
+}
+
+
+def _to_float(value):
+    if isinstance(value, str):
+        return float(value.replace(',', '.'))
+    return float(value)
+
+
+class CorrectionCurve:
+    """
+    Piecewise-linear correction compiled from the calibration points.
+
+    Points are sorted and the slopes computed once; outside the calibration
+    range the correction of the nearest point is used, like
+    Thermohygrometer.get_correction.
+    """
+
+    def __init__(self, points):
+        points = sorted((_to_float(indication), _to_float(correction)) for indication, correction in points)
+        self.indications = tuple(point[0] for point in points)
+        self.corrections = tuple(point[1] for point in points)
+        self.slopes = tuple(
+            (self.corrections[i + 1] - self.corrections[i]) / (self.indications[i + 1] - self.indications[i])
+            if self.indications[i + 1] != self.indications[i] else 0.0
+            for i in range(len(points) - 1)
+        )
+        self._indication_array = np.array(self.indications)
+        self._correction_array = np.array(self.corrections)
+
+    @classmethod
+    def from_certificate(cls, calibration_certificate, measurement_type):
+        if measurement_type not in _CERTIFICATE_FIELDS:
+            raise ValueError("measurement_type must be 'temperature' or 'humidity'")
+        indication_field, correction_field = _CERTIFICATE_FIELDS[measurement_type]
+        return cls([
+            (getattr(calibration_certificate, indication_field.format(i)), getattr(calibration_certificate, correction_field.format(i)))
+            for i in (1, 2, 3)
+        ])
+
+    def correction(self, measured_value):
+        """Correction for a single reading (scalar fast path)."""
+        if measured_value <= self.indications[0]:
+            return self.corrections[0]
+        if measured_value >= self.indications[-1]:
+            return self.corrections[-1]
+        i = bisect_right(self.indications, measured_value) - 1
+        return self.corrections[i] + self.slopes[i] * (measured_value - self.indications[i])
+
+    def correct(self, measured_value):
+        return round(measured_value - self.correction(measured_value), 2)
+
+    def correction_array(self, measured_values):
+        """Corrections for a whole array of readings at once."""
+        return np.interp(measured_values, self._indication_array, self._correction_array)
+
+    def correct_array(self, measured_values):
+        measured_values = np.asarray(measured_values, dtype=float)
+        return np.round(measured_values - self.correction_array(measured_values), 2)
+
+
+class CompiledCalibration:
+    """Temperature and humidity correction curves of one calibration certificate."""
+
+    def __init__(self, calibration_certificate):
+        self.curves = {
+            measurement_type: CorrectionCurve.from_certificate(calibration_certificate, measurement_type)
+            for measurement_type in MEASUREMENT_TYPES
+        }
+
+    def curve(self, measurement_type):
+        try:
+            return self.curves[measurement_type]
+        except KeyError:
+            raise ValueError("measurement_type must be 'temperature' or 'humidity'")
+
+    def correct(self, measurement_type, measured_value):
+        return self.curve(measurement_type).correct(measured_value)
+
+    def correct_array(self, measurement_type, measured_values):
+        return self.curve(measurement_type).correct_array(measured_values)
+
+
+_compiled_calibrations = {}  # primary key -> CompiledCalibration
+
+
+def get_compiled_calibration(calibration_certificate):
+    """
+    Returns the compiled curves of a certificate, cached by primary key.
+
+    Call invalidate_compiled_calibration when the certificate changes: the
+    curves are then compiled again from the next instance passed in, which
+    every later call gets, also with an instance loaded before the edit.
+    Certificates that were never saved are compiled on every call.
+    """
+    key = getattr(calibration_certificate, 'pk', None)
+    if key is None:
+        return CompiledCalibration(calibration_certificate)
+    compiled = _compiled_calibrations.get(key)
+    if compiled is None:
+        compiled = _compiled_calibrations[key] = CompiledCalibration(calibration_certificate)
+    return compiled
+
+
+def invalidate_compiled_calibration(key=None):
+    """Drops the cached curves of one certificate, or of all of them."""
+    if key is None:
+        _compiled_calibrations.clear()
+    else:
+        _compiled_calibrations.pop(key, None)
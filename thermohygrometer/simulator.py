@@ -0,0 +1,262 @@
+# fluke_dewk_1620A_project\thermohygrometer\simulator.py
+"""
+Simulated DewK 1620A for load and latency tests.
+
+Each SimulatedThermohygrometer is an asyncio TCP server that answers the SCPI
+commands used by Thermohygrometer, with configurable latency, jitter, drop
+rate and drifting readings. Run N instances on consecutive localhost ports:
+
+    python -m thermohygrometer.simulator --count 200 --base-port 20000
+
+and register them with "127.0.0.1:<port>" as the instrument IP address.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+
+from datetime import datetime, timedelta
+
+
+class SimulatedChannel:
+    """Temperature and humidity that drift slowly around a set point."""
+
+    def __init__(self, temperature, humidity, drift, rng):
+        self.base_temperature = temperature
+        self.base_humidity = humidity
+        self.drift = drift
+        self.rng = rng
+        self.temperature_offset = 0.0
+        self.humidity_offset = 0.0
+        self.phase = rng.uniform(0, 2 * math.pi)
+
+    def read(self, now):
+        # Random walk plus a slow daily-like oscillation
+        self.temperature_offset += self.rng.gauss(0, self.drift)
+        self.humidity_offset += self.rng.gauss(0, self.drift * 5)
+        self.temperature_offset = max(min(self.temperature_offset, 3.0), -3.0)
+        self.humidity_offset = max(min(self.humidity_offset, 15.0), -15.0)
+        wave = math.sin(now / 3600 + self.phase)
+        temperature = self.base_temperature + self.temperature_offset + 0.5 * wave
+        humidity = self.base_humidity + self.humidity_offset + 2.0 * wave
+        return round(temperature, 2), round(min(max(humidity, 0.0), 100.0), 1)
+
+
+class SimulatedThermohygrometer:
+    """One simulated 1620A listening on host:port."""
+
+    def __init__(self, host='127.0.0.1', port=10001, serial_number='SIM0001', name='SIMULATOR',
+                 latency=0.0, jitter=0.0, drop_rate=0.0, drift=0.01, clock_offset=0.0,
+                 stored_records=0, record_interval=60, seed=None):
+        self.host = host
+        self.port = port
+        self.part_number = '1620A'
+        self.serial_number = serial_number
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.clock_offset = clock_offset  # seconds between the simulated clock and the host
+        self.record_interval = record_interval
+        self.timestamp_format = False
+        self.rng = random.Random(seed)
+        self.channels = {
+            1: SimulatedChannel(self.rng.uniform(19, 25), self.rng.uniform(35, 60), drift, self.rng),
+            2: SimulatedChannel(self.rng.uniform(19, 25), self.rng.uniform(35, 60), drift, self.rng),
+        }
+        self.records = []
+        self.server = None
+        self.connections = set()
+        self.queries = 0
+        self.dropped = 0
+        self._generate_records(stored_records)
+
+    def now(self):
+        return datetime.now() + timedelta(seconds=self.clock_offset)
+
+    def _generate_records(self, count):
+        """Fills the memory with `count` records, one every record_interval seconds up to now."""
+        start = self.now() - timedelta(seconds=self.record_interval * count)
+        for index in range(count):
+            date = start + timedelta(seconds=self.record_interval * (index + 1))
+            self.records.append(self._record(date))
+
+    def _record(self, date):
+        temperature_1, humidity_1 = self.channels[1].read(date.timestamp())
+        temperature_2, humidity_2 = self.channels[2].read(date.timestamp())
+        return (f"{temperature_1},{humidity_1},{temperature_2},{humidity_2},"
+                f"{date.year},{date.month},{date.day},{date.hour},{date.minute},{date.second}")
+
+    def _read(self, channel):
+        channel = int(channel)
+        if channel not in self.channels:
+            return None
+        now = self.now()
+        temperature, humidity = self.channels[channel].read(time.time())
+        if not self.timestamp_format:
+            return f"{temperature},{humidity}"
+        return (f"{channel},T,{temperature},C,{humidity},%,"
+                f"{now.year},{now.month},{now.day},{now.hour},{now.minute},{now.second}")
+
+    def _set_date(self, value):
+        year, month, day = map(int, value.split(','))
+        current = self.now()
+        target = current.replace(year=year, month=month, day=day)
+        self.clock_offset += (target - current).total_seconds()
+
+    def _set_time(self, value):
+        hour, minute, second = map(int, value.split(','))
+        current = self.now()
+        target = current.replace(hour=hour, minute=minute, second=second)
+        self.clock_offset += (target - current).total_seconds()
+
+    def handle_command(self, command):
+        """Returns the response to a command, or None when the command has no response."""
+        header, _, argument = command.strip().partition(' ')
+        header = header.upper()
+        argument = argument.strip()
+        now = self.now()
+
+        if header == '*IDN?':
+            return f"FLUKE,{self.part_number},{self.serial_number},1.20"
+        if header == 'READ?':
+            return self._read(argument or '1')
+        if header in ('FORM:TDST:STAT', 'FORMAT:TDST:STATE'):
+            self.timestamp_format = argument == '1'
+            return None
+        if header in ('FORM:TDST:STAT?', 'FORMAT:TDST:STATE?'):
+            return '1' if self.timestamp_format else '0'
+        if header in ('SYST:DATE?', 'SYSTEM:DATE?'):
+            return f"{now.year},{now.month},{now.day}"
+        if header in ('SYST:TIME?', 'SYSTEM:TIME?'):
+            return f"{now.hour},{now.minute},{now.second}"
+        if header in ('SYST:DATE', 'SYSTEM:DATE'):
+            self._set_date(argument)
+            return None
+        if header in ('SYST:TIME', 'SYSTEM:TIME'):
+            self._set_time(argument)
+            return None
+        if header in ('SENS1:IDEN?', 'SENSOR1:IDENTIFICATION?'):
+            return f'"{self.name}"'
+        if header in ('DATA:REC:COUN?', 'DATA:RECORD:COUNT?'):
+            return str(len(self.records))
+        if header in ('DATA:REC?', 'DATA:RECORD?'):
+            index = int(argument)
+            if 1 <= index <= len(self.records):
+                return self.records[index - 1]
+            return None
+        return None
+
+    async def _respond_delay(self):
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _handle_client(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\r')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                command = line.decode('ascii', errors='replace').strip()
+                if not command:
+                    continue
+                self.queries += 1
+                response = self.handle_command(command)
+                if response is None:
+                    continue
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    self.dropped += 1
+                    continue
+                await self._respond_delay()
+                writer.write(response.encode('ascii') + b'\r')
+                await writer.drain()
+        except ConnectionError:
+            pass  # Client went away
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        if not self.port:
+            self.port = self.server.sockets[0].getsockname()[1]  # Port 0 picks a free one
+        return self
+
+    async def stop(self):
+        """Stops listening and drops the open connections, like an instrument switched off."""
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.connections):
+                writer.transport.abort()
+            await self.server.wait_closed()
+            self.server = None
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+
+async def start_simulators(count, host='127.0.0.1', base_port=20000, **options):
+    """Starts `count` simulators on consecutive ports and returns them."""
+    simulators = []
+    for index in range(count):
+        simulator = SimulatedThermohygrometer(
+            host=host,
+            port=base_port + index,
+            serial_number=f"SIM{index + 1:04d}",
+            name=f"SIMULATOR {index + 1}",
+            seed=index,
+            **options,
+        )
+        simulators.append(await simulator.start())
+    return simulators
+
+
+async def stop_simulators(simulators):
+    await asyncio.gather(*(simulator.stop() for simulator in simulators))
+
+
+def add_simulator_arguments(parser):
+    parser.add_argument('--count', type=int, default=1, help="Number of simulated instruments")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=20000, help="Port of the first instrument")
+    parser.add_argument('--latency', type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Maximum latency variation in seconds")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="Fraction of responses that are never sent")
+    parser.add_argument('--drift', type=float, default=0.01, help="Random walk step of the readings")
+    parser.add_argument('--stored-records', type=int, default=0, help="Records preloaded in each memory")
+    parser.add_argument('--record-interval', type=int, default=60, help="Seconds between stored records")
+    return parser
+
+
+def simulator_options(options):
+    """Keyword arguments of SimulatedThermohygrometer taken from parsed options (a dict)."""
+    return {
+        key: options[key]
+        for key in ('latency', 'jitter', 'drop_rate', 'drift', 'stored_records', 'record_interval')
+    }
+
+
+async def serve(options):
+    simulators = await start_simulators(
+        options['count'], host=options['host'], base_port=options['base_port'], **simulator_options(options)
+    )
+    for simulator in simulators:
+        print(f"{simulator.name} listening on {simulator.address}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_simulators(simulators)
+
+
+if __name__ == '__main__':
+    try:
+        parser = argparse.ArgumentParser(description="Simulated Fluke DewK 1620A thermohygrometers")
+        asyncio.run(serve(vars(add_simulator_arguments(parser).parse_args())))
+    except KeyboardInterrupt:
+        pass
@@ -6,6 +6,8 @@ from datetime import datetime
 
 import pyvisa
 
+from .calibration import get_compiled_calibration
+
 class Thermohygrometer:
     SN: str
     PN: str
@@ -14,29 +16,137 @@ class Thermohygrometer:
     SENSOR_SN: str
     SENSOR_PN: str
     GROUP_NAME: str = ''
+    LIVE_DATA_CHANNELS = ('1', '2')
+    # Comandos da memória interna de registros do 1620A
+    STORED_RECORD_COUNT_COMMAND = 'DATA:RECord:COUNt?'
+    STORED_RECORD_COMMAND = 'DATA:RECord? {index}'
+    # Falhas seguidas de leitura em lote antes de ler um canal por vez até reconectar
+    BATCHED_READ_FAILURE_LIMIT = 3
 
     def __init__(self, ip, port=10001):
         self.ip_address = ip
-        self.port = port
+        self.host, self.port = self._split_address(ip, port)
         self.rm = pyvisa.ResourceManager()
         self.instrument = None
         self._format_data = None
         self.datetime_adjust_made = False
+        self.batched_reads = True  # READ? de todos os canais em uma única troca
+        self.batched_read_failures = 0
+        self.fast_reconnected = False
+        self.clock_check_pending = False
+
+    @staticmethod
+    def _split_address(ip, port):
+        """Accepts "host:port" so instruments (or simulators) can use other ports."""
+        host, separator, custom_port = str(ip).rpartition(':')
+        if separator and custom_port.isdigit() and ':' not in host:
+            return host, int(custom_port)
+        return ip, port
+
+    def connect(self, identity=None):
+        """
+        Opens the socket session and runs the connection handshake.
 
-    def connect(self):
+        Args:
+            identity (dict, optional): PN, SN, instrument name and data format
+                already known for this address (see _fast_reconnect). When it
+                still matches the instrument, the full handshake is skipped.
+        """
+        # Batched reads are tried again on every connection
+        self.batched_reads = True
+        self.batched_read_failures = 0
         try:
-            self.instrument = self.rm.open_resource(f'TCPIP0::{self.ip_address}::{self.port}::SOCKET')
+            self.instrument = self._open_resource()
         except pyvisa.errors.VisaIOError as e:
             print(f"thermohygrometer.connect: Error connecting to DewK 1620A at {self.ip_address}: {e}")
             self.instrument = None
             return False
-        self.instrument.timeout = 2000 # Timeout de 2 segundos
-        self.instrument.read_termination = '\r'
-        self.instrument.write_termination = '\r'
+        if identity:
+            # Re-enabling the timestamp format needs no response, so it costs no round trip
+            self.set_format_data()
+            if self._fast_reconnect(identity, self.send_command('*IDN?')):
+                return True
         self._update_date_time() # Adiciona a atualização de data e hora ao conectar
         self.set_format_data()
         self.get_format_data()
         self.get_instrument_personal_info()
+        return True
+
+    def _open_resource(self):
+        instrument = self.rm.open_resource(f'TCPIP0::{self.host}::{self.port}::SOCKET')
+        instrument.timeout = 2000 # Timeout de 2 segundos
+        instrument.read_termination = '\r'
+        instrument.write_termination = '\r'
+        return instrument
+
+    def _reopen(self):
+        """Replaces the socket session, dropping the responses still on their way."""
+        try:
+            self.instrument.close()
+        except Exception as e:
+            print(f"thermohygrometer._reopen: Error closing the session of {self.ip_address}: {e}")
+        try:
+            self.instrument = self._open_resource()
+        except pyvisa.errors.VisaIOError as e:
+            print(f"thermohygrometer._reopen: Error connecting to DewK 1620A at {self.ip_address}: {e}")
+            self.instrument = None
+
+    def _fast_reconnect(self, identity, idn):
+        """
+        Reuses a cached identity if `*IDN?` shows the same instrument.
+
+        Args:
+            identity (dict): 'pn', 'sn', 'instrument_name' and 'format_data'.
+            idn (str): Response of `*IDN?`, the only round trip of this path.
+
+        Returns:
+            bool: True when the cached identity was applied. The instrument clock
+            is then verified on the first timestamped reading instead of with
+            SYSTem:DATE?/TIME? (see _reading_clock_out_of_sync).
+        """
+        if not idn or identity.get('format_data') is None or not identity.get('instrument_name'):
+            return False
+        try:
+            _, pn, sn, _ = idn.split(',')
+        except ValueError:
+            return False
+        if (pn, sn) != (identity.get('pn'), identity.get('sn')):
+            return False
+
+        self.PN, self.SN = pn, sn
+        self._format_data = identity['format_data']
+        self.INSTRUMENT_NAME = identity['instrument_name']
+        self.GROUP_NAME = f"thermo_{self.PN}_{self.SN}"
+        self.fast_reconnected = True
+        self.clock_check_pending = self._format_data is True
+        print(f'Reconnected to PN: {self.PN}, SN: {self.SN}, Name: {self.INSTRUMENT_NAME}')
+        return True
+
+    def _reading_clock_out_of_sync(self, result):
+        """
+        Checks the instrument clock against the date of a timestamped reading,
+        once after a fast reconnect.
+        """
+        for data in result.values():
+            if 'date' in data:
+                self.clock_check_pending = False
+                instrument_date_time = datetime.strptime(data['date'], '%Y/%m/%d %H:%M:%S')
+                return self._date_time_out_of_sync(instrument_date_time, datetime.now())
+        return False
+
+    def _batched_read_failed(self, error, rejected=False):
+        """
+        Counts a failed batched read, which the caller repeats one channel at
+        a time. Batching is turned off until the next connection when the
+        instrument rejects it, or after BATCHED_READ_FAILURE_LIMIT failures in
+        a row; a transient failure (e.g. a timeout) only affects this read.
+        """
+        self.batched_read_failures += 1
+        if rejected or self.batched_read_failures >= self.BATCHED_READ_FAILURE_LIMIT:
+            self.batched_reads = False
+            print(f"Batched reads turned off for {self.ip_address}: {error}")
+        else:
+            print(f"Batched read failed, reading one channel at a time: {error}")
 
     def disconnect(self):
         if self.instrument is not None:
@@ -55,6 +165,24 @@ class Thermohygrometer:
             print(f"Error sending command '{command}'to DewK 1620A: {e}")
             return None
 
+    def query_pipelined(self, commands):
+        """
+        Sends every command in a single write and then reads one response per
+        command, so N queries cost one network round trip instead of N.
+        When a read fails, the session is reopened before the error is raised,
+        so the responses still pending are not read as the next answers.
+        """
+        if not self.instrument:
+            print("Thermohygrometer not connected.")
+            return None
+        payload = ''.join(f'{command}\r' for command in commands)
+        try:
+            self.instrument.write_raw(payload.encode('ascii'))
+            return [self.instrument.read() for _ in commands]
+        except Exception:
+            self._reopen()
+            raise
+
     def get_format_data(self):
         response = self.send_command('FORMat:TDST:STATe?')
         self._format_data = response == '1'
@@ -95,11 +223,74 @@ class Thermohygrometer:
             result['humidity'] = float(parsed_data[1])
         return result
 
+    def _parse_live_data_all_channels(self, responses, channels):
+        """
+        Parses the responses of a pipelined `READ?` of several channels.
+
+        Args:
+            responses (list): Raw responses, in the same order as channels.
+            channels (iterable): The channel numbers that were queried.
+
+        Returns:
+            dict: Parsed data keyed by channel number (int). Channels whose
+            response cannot be parsed are left out.
+        """
+        result = {}
+        for channel, response in zip(channels, responses):
+            try:
+                result[int(channel)] = self._parse_live_data_one_channel(data=response, channel=channel)
+            except (ValueError, IndexError, AttributeError) as e:
+                print(f"Error parsing data from channel {channel}: {e}")
+        return result
+
+    def get_stored_record_count(self):
+        """Returns how many readings are stored in the instrument memory."""
+        response = self.send_command(self.STORED_RECORD_COUNT_COMMAND)
+        try:
+            return int(response)
+        except (TypeError, ValueError):
+            return 0
+
+    def read_stored_records(self, first_index, count):
+        """
+        Reads `count` stored records starting at `first_index` (1-based) in a
+        single pipelined exchange and returns the raw responses.
+        """
+        commands = [self.STORED_RECORD_COMMAND.format(index=index) for index in range(first_index, first_index + count)]
+        return self.query_pipelined(commands) or []
+
+    @staticmethod
+    def _parse_stored_record(data):
+        """
+        Parses one record of the instrument memory.
+
+        Args:
+            data (str): Raw record, "t1,h1,t2,h2,year,month,day,hour,minute,second".
+
+        Returns:
+            dict: {'date': datetime, 1: {...}, 2: {...}} where each channel holds
+            its temperature and humidity, or None if the record is malformed.
+        """
+        try:
+            values = data.split(',')
+            temperature_1, humidity_1, temperature_2, humidity_2 = map(float, values[:4])
+            year, month, day, hour, minute, second = map(int, values[4:10])
+            return {
+                'date': datetime(year, month, day, hour, minute, second),
+                1: {'temperature': temperature_1, 'humidity': humidity_1},
+                2: {'temperature': temperature_2, 'humidity': humidity_2},
+            }
+        except (AttributeError, ValueError):
+            return None
+
     def get_instrument_personal_info(self):
         idn = self.send_command('*IDN?')
         _,self.PN,self.SN,_ = idn.split(',')
         time.sleep(0.25)
-        self.INSTRUMENT_NAME = self.send_command('SENSor1:IDENtification?').replace('"','')
+        self._set_instrument_name(self.send_command('SENSor1:IDENtification?'))
+
+    def _set_instrument_name(self, identification):
+        self.INSTRUMENT_NAME = identification.replace('"','')
         self.GROUP_NAME = f"thermo_{self.PN}_{self.SN}"
         print(f'Conected to PN: {self.PN}, SN: {self.SN}, Name: {self.INSTRUMENT_NAME}')
         
@@ -115,44 +306,9 @@ class Thermohygrometer:
         if not calibration_certificate:
             return 0  # No correction if no calibration is available
 
-        if measurement_type == 'temperature':
-            points = [
-                (Thermohygrometer.replace_comma(calibration_certificate.temp_indication_point_1), Thermohygrometer.replace_comma(calibration_certificate.temp_correction_1)),
-                (Thermohygrometer.replace_comma(calibration_certificate.temp_indication_point_2), Thermohygrometer.replace_comma(calibration_certificate.temp_correction_2)),
-                (Thermohygrometer.replace_comma(calibration_certificate.temp_indication_point_3), Thermohygrometer.replace_comma(calibration_certificate.temp_correction_3)),
-            ]
-        elif measurement_type == 'humidity':
-            points = [
-                (Thermohygrometer.replace_comma(calibration_certificate.humidity_indication_point_1), Thermohygrometer.replace_comma(calibration_certificate.humidity_correction_1)),
-                (Thermohygrometer.replace_comma(calibration_certificate.humidity_indication_point_2), Thermohygrometer.replace_comma(calibration_certificate.humidity_correction_2)),
-                (Thermohygrometer.replace_comma(calibration_certificate.humidity_indication_point_3), Thermohygrometer.replace_comma(calibration_certificate.humidity_correction_3)),
-            ]
-        else:
-            raise ValueError("measurement_type must be 'temperature' or 'humidity'")
-
-        # Sort points by measurement value
-        points.sort(key=lambda x: x[0])
-        
-        # If measured value is outside the calibration range, use the nearest point
-        if measured_value <= points[0][0]:
-            return points[0][1]
-        elif measured_value >= points[-1][0]:
-            return points[-1][1]
-        
-        # Find the two nearest points for interpolation
-        for i in range(len(points) - 1):
-            if points[i][0] <= measured_value < points[i+1][0]:
-                lower_point, upper_point = points[i], points[i+1]
-                break
-        
-        # Perform linear interpolation
-        slope = (upper_point[1] - lower_point[1]) / (upper_point[0] - lower_point[0])
-        correction = lower_point[1] + slope * (measured_value - lower_point[0])
-        # print(f"""
-        #     thermohygrometer.thermohygrometer.get_correction\n  
-        #     Upper: {upper_point}, Lower: {lower_point}, Slope: {slope}, Correction: {correction}
-        #     """)
-        return correction
+        # Points sorted and slopes computed once per certificate (see calibration.py)
+        curve = get_compiled_calibration(calibration_certificate).curve(measurement_type)
+        return curve.correction(measured_value)
 
     # Usage example
     def apply_correction(self, calibration_certificate, measurement_type, measured_value):
@@ -172,6 +328,11 @@ class Thermohygrometer:
         """Consulta a data e hora atual do instrumento."""
         date_response = self.send_command("SYSTem:DATE?")
         time_response = self.send_command("SYSTem:TIME?")
+        return self._parse_instrument_date_time(date_response, time_response)
+
+    @staticmethod
+    def _parse_instrument_date_time(date_response, time_response):
+        """Converte as respostas de SYSTem:DATE? e SYSTem:TIME? em datetime."""
         if date_response and time_response:
             try:
                 year, month, day = map(int, date_response.split(','))
@@ -206,12 +367,16 @@ class Thermohygrometer:
         now = datetime.now()
 
         if instrument_date_time:
-            delta = now - instrument_date_time
-            diff_seconds = abs(delta.total_seconds())
-            diff_minutes = diff_seconds / 60
-
-            if diff_minutes > 5:
+            if self._date_time_out_of_sync(instrument_date_time, now):
                 self._set_instrument_date_time(now)
                 self.datetime_adjust_made = True
         else:
-            print("Não foi possível obter a data e hora do instrumento.")
\ No newline at end of file
+            print("Não foi possível obter a data e hora do instrumento.")
+
+    @staticmethod
+    def _date_time_out_of_sync(instrument_date_time, now):
+        """Indica se o relógio do instrumento difere mais de 5 minutos do servidor."""
+        delta = now - instrument_date_time
+        diff_seconds = abs(delta.total_seconds())
+        diff_minutes = diff_seconds / 60
+        return diff_minutes > 5
\ No newline at end of file